@@ -1,6 +1,18 @@
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
-from .models import Category, SubCategory, Quiz, Question, QuizHistory, UserAnswer, AIGenerationLog, Profile, CustomUser
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+from myapp.utils import admin_jobs, background
+from myapp.utils.pagination import EstimatedCountChangeList, EstimatedCountPaginator
+from myapp.utils.prompts import estimate_tokens
+from myapp.utils.ratelimit import budget_retry_after
+from .models import (
+    Category, SubCategory, Quiz, Question, QuizHistory, UserAnswer, AIGenerationLog, Profile, CustomUser,
+    ChatSession, QuizActivitySummary, PromptTemplate, AIGenerationRollup, ReviewState, LiveSession,
+    ArchivedAttempt, QuizRecommendation, Topic, ExportMark, QuizTranslation, QuestionTranslation,
+)
 
 # Remove this line - it's causing the duplicate registration
 # admin.site.register(Profile)
@@ -8,6 +20,15 @@ from .models import Category, SubCategory, Quiz, Question, QuizHistory, UserAnsw
 # Register your custom user with UserAdmin
 admin.site.register(CustomUser, UserAdmin)
 
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables too big to count exactly on every page view"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return EstimatedCountChangeList
+
+
 # Register your models here
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -18,38 +39,244 @@ class CategoryAdmin(admin.ModelAdmin):
 class SubCategoryAdmin(admin.ModelAdmin):
     list_display = ['name', 'category', 'created_at']
     list_filter = ['category']
+    list_select_related = ['category']
+    search_fields = ['name']
+
+@admin.register(Topic)
+class TopicAdmin(admin.ModelAdmin):
+    list_display = ['name', 'parent', 'depth', 'path', 'category', 'subcategory']
+    list_select_related = ['parent', 'category', 'subcategory']
+    ordering = ['path']
     search_fields = ['name']
+    autocomplete_fields = ['parent']
+    raw_id_fields = ['category', 'subcategory']
+    readonly_fields = ['path', 'depth']
 
 @admin.register(Quiz)
-class QuizAdmin(admin.ModelAdmin):
-    list_display = ['title', 'category', 'subcategory', 'difficulty', 'is_ai_generated', 'created_at']
+class QuizAdmin(LargeTableAdmin):
+    list_display = ['title', 'category', 'subcategory', 'difficulty', 'draw_count', 'shuffle_options', 'is_ai_generated', 'created_at']
     list_filter = ['category', 'difficulty', 'is_ai_generated']
+    list_select_related = ['category', 'subcategory__category']
     search_fields = ['title']
+    autocomplete_fields = ['category', 'subcategory', 'topic']
+    actions = ['regenerate_questions', 'delete_ai_quizzes']
+
+    @admin.action(description="Regenerate questions of selected AI quizzes (background)")
+    def regenerate_questions(self, request, queryset):
+        if budget_retry_after():
+            self.message_user(request, "Daily AI generation budget exhausted; nothing was queued.", messages.WARNING)
+            return
+        quiz_ids = list(queryset.filter(is_ai_generated=True, subcategory__isnull=False).values_list('pk', flat=True))
+        background.submit(admin_jobs.regenerate_quiz_questions, quiz_ids)
+        self.message_user(request, f"Queued regeneration for {len(quiz_ids)} AI quizzes; quizzes with attempts are skipped.")
+
+    @admin.action(description="Delete selected AI quizzes with their attempts (background)")
+    def delete_ai_quizzes(self, request, queryset):
+        quiz_ids = list(queryset.filter(is_ai_generated=True).values_list('pk', flat=True))
+        background.submit(admin_jobs.delete_quizzes, quiz_ids)
+        self.message_user(request, f"Queued deletion of {len(quiz_ids)} AI quizzes.")
 
 @admin.register(Question)
-class QuestionAdmin(admin.ModelAdmin):
-    list_display = ['text', 'quiz', 'difficulty', 'correct_answer', 'is_ai_generated']
-    list_filter = ['difficulty', 'is_ai_generated']
+class QuestionAdmin(LargeTableAdmin):
+    list_display = ['text', 'quiz', 'difficulty', 'correct_answer', 'is_ai_generated', 'explanation_status']
+    list_filter = ['difficulty', 'is_ai_generated', 'explanation_status']
+    list_select_related = ['quiz']
     search_fields = ['text']
+    autocomplete_fields = ['quiz']
+
+@admin.register(QuizTranslation)
+class QuizTranslationAdmin(LargeTableAdmin):
+    list_display = ['title', 'quiz', 'locale', 'updated_at']
+    list_filter = ['locale']
+    list_select_related = ['quiz']
+    search_fields = ['title']
+    raw_id_fields = ['quiz']
+
+@admin.register(QuestionTranslation)
+class QuestionTranslationAdmin(LargeTableAdmin):
+    list_display = ['text', 'question', 'locale', 'updated_at']
+    list_filter = ['locale']
+    list_select_related = ['question']
+    search_fields = ['text']
+    raw_id_fields = ['question']
 
 @admin.register(QuizHistory)
-class QuizHistoryAdmin(admin.ModelAdmin):
+class QuizHistoryAdmin(LargeTableAdmin):
     list_display = ['user', 'quiz', 'score', 'correct_answers', 'total_questions', 'created_at']
-    list_filter = ['quiz', 'selected_difficulty']
-    search_fields = ['user__username']
+    # No quiz filter: it would list every quiz in the sidebar; search by quiz title instead
+    list_filter = ['selected_difficulty', ('completed_at', admin.EmptyFieldListFilter)]
+    list_select_related = ['user', 'quiz']
+    search_fields = ['user__username', 'quiz__title']
+    autocomplete_fields = ['user', 'quiz']
+    raw_id_fields = ['live_session']
+    actions = ['regrade']
+
+    @admin.action(description="Re-grade selected attempts against current answers (background)")
+    def regrade(self, request, queryset):
+        history_ids = list(queryset.filter(completed_at__isnull=False).values_list('pk', flat=True))
+        background.submit(admin_jobs.regrade_attempts, history_ids)
+        self.message_user(request, f"Queued re-grading of {len(history_ids)} attempts.")
 
 @admin.register(UserAnswer)
-class UserAnswerAdmin(admin.ModelAdmin):
+class UserAnswerAdmin(LargeTableAdmin):
     list_display = ['history', 'question', 'selected_option', 'is_correct']
     list_filter = ['is_correct']
+    list_select_related = ['history__user', 'history__quiz', 'question']
+    raw_id_fields = ['history', 'question']
+
+@admin.register(ArchivedAttempt)
+class ArchivedAttemptAdmin(LargeTableAdmin):
+    list_display = ['history', 'answer_count', 'packed_bytes', 'archived_at']
+    list_select_related = ['history__user', 'history__quiz']
+    raw_id_fields = ['history']
+    readonly_fields = ['answer_count', 'archived_at']
+
+    @admin.display(description="Packed size (bytes)")
+    def packed_bytes(self, obj):
+        return len(obj.answers)
+
+@admin.register(QuizRecommendation)
+class QuizRecommendationAdmin(LargeTableAdmin):
+    list_display = ['user', 'kind', 'rank', 'quiz', 'subcategory', 'score', 'reason']
+    list_filter = ['kind']
+    list_select_related = ['user', 'quiz', 'subcategory']
+    raw_id_fields = ['user', 'quiz', 'subcategory']
+    search_fields = ['user__username']
+
+@admin.register(ReviewState)
+class ReviewStateAdmin(LargeTableAdmin):
+    list_display = ['user', 'question', 'repetitions', 'interval_days', 'ease', 'lapses', 'due_at']
+    list_select_related = ['user', 'question']
+    raw_id_fields = ['user', 'question']
+    search_fields = ['user__username']
+
+@admin.register(LiveSession)
+class LiveSessionAdmin(admin.ModelAdmin):
+    list_display = ['code', 'quiz', 'host', 'status', 'participant_count', 'started_at', 'finished_at']
+    list_filter = ['status']
+    list_select_related = ['quiz', 'host']
+    search_fields = ['code', 'quiz__title', 'host__username']
+    raw_id_fields = ['quiz', 'host']
+
+@admin.register(ExportMark)
+class ExportMarkAdmin(admin.ModelAdmin):
+    list_display = ['name', 'mark', 'last_id', 'rows_exported', 'updated_at']
+    readonly_fields = ['rows_exported']
 
 @admin.register(AIGenerationLog)
-class AIGenerationLogAdmin(admin.ModelAdmin):
-    list_display = ['category', 'subcategory', 'difficulty', 'questions_generated', 'created_at']
-    list_filter = ['difficulty']
+class AIGenerationLogAdmin(LargeTableAdmin):
+    list_display = ['kind', 'category', 'subcategory', 'difficulty', 'questions_requested', 'questions_generated', 'tokens_in', 'tokens_out', 'latency_ms', 'created_at']
+    list_filter = ['kind', 'difficulty']
+    list_select_related = ['category', 'subcategory__category']
+    raw_id_fields = ['generated_by', 'prompt_template']
+
+@admin.register(PromptTemplate)
+class PromptTemplateAdmin(admin.ModelAdmin):
+    """Prompt variants side by side with their rolled-up cost and yield, to pick the cheapest that keeps yield"""
+    list_display = ['__str__', 'is_active', 'weight', 'template_tokens', 'calls', 'yield_percent', 'avg_tokens_in', 'avg_tokens_out', 'avg_latency']
+    list_editable = ['is_active', 'weight']
+    list_filter = ['name', 'is_active']
+    readonly_fields = ['version', 'content_hash']
+
+    def get_readonly_fields(self, request, obj=None):
+        # Logged calls reference a version, so its text is frozen; add a new version instead
+        if obj is not None:
+            return self.readonly_fields + ['name', 'body']
+        return self.readonly_fields
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            total_calls=Sum('rollups__calls'),
+            total_requested=Sum('rollups__questions_requested'),
+            total_generated=Sum('rollups__questions_generated'),
+            total_tokens_in=Sum('rollups__tokens_in'),
+            total_tokens_out=Sum('rollups__tokens_out'),
+            total_latency=Sum('rollups__latency_ms_total'),
+        ).order_by('name', '-version')
+
+    @admin.display(description='Template tokens')
+    def template_tokens(self, obj):
+        return estimate_tokens(obj.body)
+
+    @admin.display(description='Calls', ordering='total_calls')
+    def calls(self, obj):
+        return obj.total_calls or 0
+
+    @admin.display(description='Yield %')
+    def yield_percent(self, obj):
+        return f"{obj.total_generated / obj.total_requested * 100:.0f}" if obj.total_requested else '-'
+
+    @admin.display(description='Avg tokens in')
+    def avg_tokens_in(self, obj):
+        return round(obj.total_tokens_in / obj.total_calls) if obj.total_calls else '-'
+
+    @admin.display(description='Avg tokens out')
+    def avg_tokens_out(self, obj):
+        return round(obj.total_tokens_out / obj.total_calls) if obj.total_calls else '-'
+
+    @admin.display(description='Avg latency (ms)')
+    def avg_latency(self, obj):
+        return round(obj.total_latency / obj.total_calls) if obj.total_calls else '-'
+
+@admin.register(AIGenerationRollup)
+class AIGenerationRollupAdmin(admin.ModelAdmin):
+    """AI usage dashboard; reads only the daily rollups, never the raw log"""
+    change_list_template = 'admin/myapp/aigenerationrollup/change_list.html'
+    list_display = ['day', 'kind', 'category', 'difficulty', 'calls', 'questions_generated', 'yield_percent', 'tokens_in', 'tokens_out', 'avg_latency']
+    list_filter = ['kind', 'difficulty', 'day']
+    list_select_related = ['category']
+    date_hierarchy = 'day'
+
+    @admin.display(description='Yield %')
+    def yield_percent(self, obj):
+        return f"{obj.parse_yield * 100:.0f}" if obj.parse_yield is not None else '-'
+
+    @admin.display(description='Avg latency (ms)')
+    def avg_latency(self, obj):
+        return round(obj.avg_latency_ms)
+
+    def changelist_view(self, request, extra_context=None):
+        since = timezone.localdate() - timedelta(days=30)
+        recent = AIGenerationRollup.objects.filter(day__gte=since)
+        totals = recent.aggregate(
+            calls=Sum('calls'), tokens_in=Sum('tokens_in'), tokens_out=Sum('tokens_out'),
+            requested=Sum('questions_requested'), generated=Sum('questions_generated'),
+            latency=Sum('latency_ms_total'),
+        )
+        totals = {key: value or 0 for key, value in totals.items()}
+        totals['cost'] = (
+            totals['tokens_in'] / 1000 * settings.LLM_INPUT_COST_PER_1K_TOKENS
+            + totals['tokens_out'] / 1000 * settings.LLM_OUTPUT_COST_PER_1K_TOKENS
+        )
+        totals['yield'] = totals['generated'] / totals['requested'] * 100 if totals['requested'] else None
+        totals['avg_latency'] = totals['latency'] / totals['calls'] if totals['calls'] else 0
+        by_category = (
+            recent.filter(kind='quiz')
+            .values('category__name', 'difficulty')
+            .annotate(calls=Sum('calls'), generated=Sum('questions_generated'), requested=Sum('questions_requested'),
+                      tokens=Sum('tokens_out'))
+            .order_by('-calls')[:20]
+        )
+        extra_context = {**(extra_context or {}), 'usage_totals': totals, 'usage_by_category': by_category}
+        return super().changelist_view(request, extra_context=extra_context)
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'display_name']
+    list_display = ['user', 'display_name', 'locale']
+    list_select_related = ['user']
+    search_fields = ['user__username']
+    raw_id_fields = ['user']
+
+@admin.register(ChatSession)
+class ChatSessionAdmin(LargeTableAdmin):
+    list_display = ['user', 'created_at', 'updated_at']
+    list_select_related = ['user']
     search_fields = ['user__username']
+    raw_id_fields = ['user']
 
+@admin.register(QuizActivitySummary)
+class QuizActivitySummaryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'updated_at']
+    list_select_related = ['user']
+    search_fields = ['user__username']
+    raw_id_fields = ['user']
@@ -0,0 +1,297 @@
+import json
+import zlib
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET, require_POST
+
+from .models import Question, Quiz, QuizHistory
+from myapp.utils import attempts, question_bank, translations
+
+# JSON quiz-taking API (v1) for SPA and mobile clients.
+# Payloads are built from values() rows, use short, repeated keys and never include
+# correct answers before an attempt is completed. Quiz content is in the user's locale, or
+# in ?locale= (see myapp.utils.translations).
+# Authentication is the Django session only: clients log in through the login page, keep the
+# sessionid and csrftoken cookies, and send the csrftoken value in an X-CSRFToken header on
+# every POST. There is no token auth; a POST without the header is refused with 403.
+
+
+def api_login_required(view_func):
+    """Like login_required, but answers 401 JSON instead of redirecting to the login page"""
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        return view_func(request, *args, **kwargs)
+    return _wrapped
+
+
+def _quiz_etag(request, quiz_id, *args, **kwargs):
+    """Changes whenever the quiz or any of its questions is edited, added or removed"""
+    row = (
+        Quiz.objects.filter(pk=quiz_id)
+        .annotate(question_count=Count('questions'), questions_updated=Max('questions__updated_at'))
+        .values_list('updated_at', 'question_count', 'questions_updated')
+        .first()
+    )
+    if row is None:
+        return None
+    updated_at, question_count, questions_updated = row
+    questions_stamp = questions_updated.timestamp() if questions_updated else 0
+    locale_stamp = translations.quiz_stamp(quiz_id, translations.request_locale(request))
+    return f"q{quiz_id}-{updated_at.timestamp():.6f}-{question_count}-{questions_stamp:.6f}-{locale_stamp}"
+
+
+def _attempt_etag(request, attempt_id):
+    """Completed attempts never change, so their results can be revalidated cheaply"""
+    completed_at = (
+        QuizHistory.objects.filter(pk=attempt_id, user=request.user, completed_at__isnull=False)
+        .values_list('completed_at', flat=True)
+        .first()
+    )
+    return f"a{attempt_id}-{completed_at.timestamp():.6f}" if completed_at else None
+
+
+def _not_found(what):
+    return JsonResponse({'error': f'{what} not found'}, status=404)
+
+
+def _page_args(request):
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+        size = min(settings.API_MAX_PAGE_SIZE, max(1, int(request.GET.get('size', settings.API_PAGE_SIZE))))
+    except ValueError:
+        return None, None
+    return page, size
+
+
+def _options(row):
+    return [row['option1'], row['option2'], row['option3'], row['option4']]
+
+
+# ---------------- Quiz ----------------
+@require_GET
+@api_login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_quiz_etag)
+def quiz_detail(request, quiz_id):
+    quiz = (
+        Quiz.objects.filter(pk=quiz_id)
+        .annotate(question_count=Count('questions'))
+        .values('id', 'title', 'description', 'difficulty', 'category_id', 'subcategory_id', 'question_count',
+                'draw_count', 'shuffle_options')
+        .first()
+    )
+    if quiz is None:
+        return _not_found('Quiz')
+    translations.localize_quiz_row(quiz, translations.request_locale(request))
+    total = min(quiz['draw_count'], quiz['question_count']) if quiz['draw_count'] else quiz['question_count']
+    return JsonResponse({
+        'id': quiz['id'],
+        'title': quiz['title'],
+        'description': quiz['description'],
+        'difficulty': quiz['difficulty'],
+        'category': quiz['category_id'],
+        'subcategory': quiz['subcategory_id'],
+        'total': total,
+        'time_limit': total * 60,  # one minute per question, as on the HTML page
+        'randomized': bool(quiz['draw_count'] or quiz['shuffle_options']),
+    })
+
+
+# ---------------- Questions (paged) ----------------
+@require_GET
+@api_login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_quiz_etag)
+def quiz_questions(request, quiz_id):
+    page, size = _page_args(request)
+    if page is None:
+        return JsonResponse({'error': 'page and size must be integers'}, status=400)
+    quiz = Quiz.objects.filter(pk=quiz_id).values('draw_count', 'shuffle_options').first()
+    if quiz is None:
+        return _not_found('Quiz')
+    if quiz['draw_count'] or quiz['shuffle_options']:
+        return JsonResponse({'error': 'Questions of this quiz are drawn per attempt; use attempts/<id>/questions/'},
+                            status=409)
+
+    offset = (page - 1) * size
+    rows = list(
+        Question.objects.filter(quiz_id=quiz_id)
+        .order_by('id')
+        .values('id', 'text', 'option1', 'option2', 'option3', 'option4')[offset:offset + size + 1]
+    )
+    has_next = len(rows) > size
+    translations.localize_question_rows(rows[:size], translations.request_locale(request))
+    return JsonResponse({
+        'page': page,
+        'next': page + 1 if has_next else None,
+        'questions': [{'id': row['id'], 'text': row['text'], 'options': _options(row)} for row in rows[:size]],
+    })
+
+
+# ---------------- Attempts ----------------
+@require_POST
+@api_login_required
+def start_attempt(request, quiz_id):
+    quiz = Quiz.objects.filter(pk=quiz_id).first()
+    if quiz is None:
+        return _not_found('Quiz')
+    attempt, questions, created = attempts.start_or_resume_attempt(request.user, quiz)
+    if attempt is None:
+        return JsonResponse({'error': 'This quiz has no questions'}, status=409)
+    return JsonResponse({
+        'attempt': attempt.id,
+        'quiz': quiz.id,
+        'total': attempt.total_questions,
+        'time_limit': attempt.total_questions * 60,
+        'started_at': attempt.started_at,
+        'resumed': not created,
+    }, status=201 if created else 200)
+
+
+@require_GET
+@api_login_required
+@cache_control(private=True, no_cache=True)
+def attempt_questions(request, attempt_id):
+    """The attempt's own questions: its draw and option order for question-bank quizzes"""
+    page, size = _page_args(request)
+    if page is None:
+        return JsonResponse({'error': 'page and size must be integers'}, status=400)
+    quiz_history = QuizHistory.objects.filter(pk=attempt_id, user=request.user).select_related('quiz').first()
+    if quiz_history is None:
+        return _not_found('Attempt')
+
+    questions = attempts.attempt_questions(
+        quiz_history, quiz_history.quiz, offset=(page - 1) * size, limit=size + 1,
+        locale=translations.request_locale(request),
+    )
+    return JsonResponse({
+        'page': page,
+        'next': page + 1 if len(questions) > size else None,
+        'questions': [
+            {'id': question.id, 'text': question.text, 'options': [text for _, text in question.shown_options]}
+            for question in questions[:size]
+        ],
+    })
+
+
+def _answer_errors(answers):
+    """{question id: error} for answers that are neither a letter nor {"selected_option": letter, "time_taken": seconds}"""
+    letters = list(question_bank.OPTION_LETTERS)
+    errors = {}
+    for question_id, answer in answers.items():
+        if isinstance(answer, dict):
+            time_taken = answer.get('time_taken', 0)
+            if 'selected_option' in answer and not question_bank.is_letter(answer['selected_option']):
+                errors[question_id] = f"selected_option must be one of {', '.join(letters)}, or left out"
+            elif isinstance(time_taken, bool) or not isinstance(time_taken, int) or time_taken < 0:
+                errors[question_id] = "time_taken must be a non-negative integer"
+        elif not question_bank.is_letter(answer):
+            errors[question_id] = f"answer must be one of {', '.join(letters)}, or left out"
+    return errors
+
+
+@require_POST
+@api_login_required
+def submit_attempt(request, attempt_id):
+    """
+    Body: {"answers": {"<question id>": "A", ...}}; an answer may also be
+    {"selected_option": "A", "time_taken": <seconds>}. Unanswered questions are left out.
+    """
+    quiz_history = QuizHistory.objects.filter(pk=attempt_id, user=request.user).first()
+    if quiz_history is None:
+        return _not_found('Attempt')
+    try:
+        answers = json.loads(request.body or b'{}').get('answers', {})
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    if not isinstance(answers, dict):
+        return JsonResponse({'error': 'answers must be an object keyed by question id'}, status=400)
+    errors = _answer_errors(answers)
+    if errors:
+        return JsonResponse({'error': 'Invalid answers', 'errors': errors}, status=400)
+
+    if attempts.grade_attempt(quiz_history, answers) is None:
+        return JsonResponse({'error': 'Attempt already submitted'}, status=409)
+    return _results(quiz_history)
+
+
+def _read_body(request):
+    """The request body, gzip-decoded if sent with Content-Encoding: gzip; None if too large or corrupt"""
+    limit = settings.ATTEMPT_SYNC_MAX_BYTES
+    body = request.body
+    if request.headers.get('Content-Encoding', '').lower() == 'gzip':
+        decoder = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        try:
+            body = decoder.decompress(body, limit + 1)
+        except zlib.error:
+            return None
+    return body if len(body) <= limit else None
+
+
+@require_POST
+@api_login_required
+def sync_attempt(request, attempt_id):
+    """
+    Offline-tolerant answer upload. Body (optionally gzip-compressed):
+    {"answers": [{"q": <question id>, "o": "A", "t": <seconds>, "s": <client sequence>}, ...], "submit": false}
+    Safe to retry: a replayed or late batch never overrides a newer answer, and syncing
+    a submitted attempt again just returns its results.
+    """
+    body = _read_body(request)
+    if body is None:
+        return JsonResponse({'error': 'Body too large or not valid gzip'}, status=413)
+    try:
+        data = json.loads(body or b'{}')
+        batch = data.get('answers', [])
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Invalid JSON body'}, status=400)
+    if not isinstance(batch, list) or len(batch) > settings.ATTEMPT_SYNC_MAX_ANSWERS:
+        return JsonResponse({'error': f'answers must be a list of at most {settings.ATTEMPT_SYNC_MAX_ANSWERS}'}, status=400)
+
+    quiz_history, accepted = attempts.sync_answers(attempt_id, request.user, batch, submit=bool(data.get('submit')))
+    if quiz_history is None:
+        return _not_found('Attempt')
+    if quiz_history.completed_at is None:
+        return JsonResponse({'attempt': quiz_history.id, 'accepted': accepted, 'completed': False})
+    return _results(quiz_history)
+
+
+@require_GET
+@api_login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_attempt_etag)
+def attempt_results(request, attempt_id):
+    quiz_history = QuizHistory.objects.filter(pk=attempt_id, user=request.user).first()
+    if quiz_history is None:
+        return _not_found('Attempt')
+    return _results(quiz_history)
+
+
+def _results(quiz_history):
+    payload = {
+        'attempt': quiz_history.id,
+        'quiz': quiz_history.quiz_id,
+        'completed': quiz_history.completed_at is not None,
+        'total': quiz_history.total_questions,
+    }
+    if quiz_history.completed_at is None:
+        return JsonResponse(payload)
+
+    snapshot = attempts.result_snapshot(quiz_history)
+    payload.update({
+        'score': quiz_history.score,
+        'correct': quiz_history.correct_answers,
+        'completed_at': quiz_history.completed_at,
+        # [question id, selected option or null, correct option, is correct], letters as shown in the attempt
+        'answers': [
+            [row['id'], row['selected'], row['correct'], row['is_correct']]
+            for row in sorted(snapshot['questions'], key=lambda row: row['id'])
+        ],
+    })
+    return JsonResponse(payload)
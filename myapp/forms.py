@@ -1,8 +1,10 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from .models import CustomUser, Profile
 from django.contrib.auth.forms import UserCreationForm
 from .models import CustomUser
+from myapp.utils.avatars import validate_avatar
 
 class CustomUserCreationForm(UserCreationForm):
     class Meta:
@@ -19,9 +21,14 @@ class CustomUserCreationForm(UserCreationForm):
 User = get_user_model()
 # ---------------- User Profile Form ----------------
 class ProfileForm(forms.ModelForm):
+    # Quiz language; choices from settings so adding a locale needs no migration
+    locale = forms.ChoiceField(
+        choices=list(settings.QUIZ_LOCALES.items()), required=False, widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+
     class Meta:
         model = Profile
-        fields = ['display_name', 'avatar', 'preferences',]
+        fields = ['display_name', 'avatar', 'preferences', 'locale',]
         widgets = {
             'display_name': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -37,6 +44,13 @@ class ProfileForm(forms.ModelForm):
             }),
         }
 
+    def clean_avatar(self):
+        avatar = self.cleaned_data.get('avatar')
+        # Only new uploads carry a content type; the stored file is left alone
+        if avatar and hasattr(avatar, 'content_type'):
+            validate_avatar(avatar)
+        return avatar
+
 # ---------------- Optional: User Update Form ----------------
 # Use this if you want to allow updating username separately
 class UserUpdateForm(forms.ModelForm):
@@ -0,0 +1,91 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from myapp.models import ArchivedAttempt, UserAnswer
+from myapp.utils import archive
+
+
+def _table_bytes(model):
+    """On-disk size of a model's table and indexes, or None where the database does not report it"""
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT pg_total_relation_size(%s::regclass)", [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT data_length + index_length FROM information_schema.tables "
+                "WHERE table_schema = DATABASE() AND table_name = %s", [table],
+            )
+        elif connection.vendor == 'sqlite':
+            try:
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name = %s OR name IN "
+                    "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)", [table, table],
+                )
+            except Exception:
+                return None  # SQLite built without the dbstat table
+        else:
+            return None
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _megabytes(size):
+    return "n/a" if size is None else f"{size / 1_000_000:.2f} MB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Pack the answers of old completed attempts into one ArchivedAttempt row each and delete their "
+        "UserAnswer rows. Batches commit one by one, so the job can be stopped and re-run at any time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help="Archive attempts completed more than this many days ago")
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE)
+        parser.add_argument('--limit', type=int, help="Stop after this many attempts")
+        parser.add_argument('--dry-run', action='store_true', help="Count what would be archived")
+        parser.add_argument('--vacuum', action='store_true',
+                            help="Reclaim the freed space afterwards (VACUUM; locks the database on SQLite)")
+
+    def handle(self, *args, **options):
+        pending = archive.archivable(options['days'])
+        if options['dry_run']:
+            self.stdout.write(f"Would archive {pending.count()} attempts")
+            return
+
+        sizes_before = _table_bytes(UserAnswer), _table_bytes(ArchivedAttempt)
+        started = time.monotonic()
+        archived = removed = packed = 0
+        last_id = 0
+        while options['limit'] is None or archived < options['limit']:
+            size = options['batch_size'] if options['limit'] is None else min(options['batch_size'], options['limit'] - archived)
+            # Keyset pagination: already-archived attempts drop out of `pending`, so a restart resumes
+            history_ids = list(pending.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:size])
+            if not history_ids:
+                break
+            batch_archived, batch_removed, batch_packed = archive.archive_batch(history_ids)
+            archived += batch_archived
+            removed += batch_removed
+            packed += batch_packed
+            last_id = history_ids[-1]
+            self.stdout.write(f"  ...{archived} attempts archived (up to id {last_id})")
+
+        if options['vacuum'] and connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute("VACUUM" if connection.vendor == 'sqlite' else f"VACUUM ANALYZE {UserAnswer._meta.db_table}")
+        sizes_after = _table_bytes(UserAnswer), _table_bytes(ArchivedAttempt)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {archived} attempts in {time.monotonic() - started:.1f}s: "
+            f"{removed} answer rows replaced by {packed} bytes of packed answers"
+            + (f" ({packed / archived:.0f} bytes per attempt)" if archived else "")
+        ))
+        self.stdout.write(f"UserAnswer table:      {_megabytes(sizes_before[0])} -> {_megabytes(sizes_after[0])}")
+        self.stdout.write(f"ArchivedAttempt table: {_megabytes(sizes_before[1])} -> {_megabytes(sizes_after[1])}")
+        if not options['vacuum']:
+            self.stdout.write("Freed pages are reused by new rows; run with --vacuum to shrink the files.")
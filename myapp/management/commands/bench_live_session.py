@@ -0,0 +1,153 @@
+import asyncio
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY, get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+from importlib import import_module
+
+from myapp.models import Category, LiveSession, Question, Quiz, QuizHistory, UserAnswer
+from myapp.utils import live
+
+
+class _Socket:
+    """One client connection driven against the ASGI app in-process"""
+
+    def __init__(self, cookie):
+        self.cookie = cookie
+        self.incoming = asyncio.Queue()
+        self.opened = asyncio.Event()
+        self.close_code = None
+        self.messages = []  # (arrival time, raw text)
+
+    async def receive(self):
+        return await self.incoming.get()
+
+    async def send(self, event):
+        if event['type'] == 'websocket.send':
+            self.messages.append((time.perf_counter(), event['text']))
+        else:
+            if event['type'] == 'websocket.close':
+                self.close_code = event['code']
+            self.opened.set()
+
+    def say(self, text):
+        self.incoming.put_nowait({'type': 'websocket.receive', 'text': text})
+
+    def arrivals(self, kind):
+        marker = f'"type": "{kind}"'
+        return [arrived for arrived, text in self.messages if marker in text]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark a live session on a throwaway test database: connect many participants to the "
+        "WebSocket app in-process, play a quiz and report fan-out latency and the final save."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--participants', type=int, default=1000)
+        parser.add_argument('--questions', type=int, default=10)
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            cookies, code = self._setup(options['participants'], options['questions'])
+            asyncio.run(self._play(cookies, code, options['questions']))
+            self.stdout.write(
+                f"Saved {QuizHistory.objects.filter(live_session__code=code).count()} attempts and "
+                f"{UserAnswer.objects.filter(history__live_session__code=code).count()} answers"
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _setup(self, participants, questions):
+        User = get_user_model()
+        User.objects.bulk_create([User(username=f'live{i}', email=f'live{i}@example.com') for i in range(participants + 1)])
+        users = list(User.objects.order_by('id'))
+        category = Category.objects.create(name='Benchmark')
+        quiz = Quiz.objects.create(title='Live benchmark', category=category, difficulty='M')
+        Question.objects.bulk_create([
+            Question(quiz=quiz, text=f"Live question {i}", option1='One', option2='Two', option3='Three',
+                     option4='Four', correct_answer='ABCD'[i % 4])
+            for i in range(questions)
+        ])
+        live_session = live.create_session(quiz, users[0])
+
+        SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+        cookies = []
+        for user in users:
+            session = SessionStore()
+            session[SESSION_KEY] = str(user.pk)
+            session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[-1]
+            session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+            session.create()
+            cookies.append(f"{settings.SESSION_COOKIE_NAME}={session.session_key}")
+        return cookies, live_session.code
+
+    async def _connect(self, application, cookie, code):
+        socket = _Socket(cookie)
+        scope = {
+            'type': 'websocket', 'path': f'/ws/live/{code}/',
+            'headers': [(b'host', b'testserver'), (b'origin', b'http://testserver'), (b'cookie', cookie.encode())],
+        }
+        socket.incoming.put_nowait({'type': 'websocket.connect'})
+        socket.task = asyncio.create_task(application(scope, socket.receive, socket.send))
+        await socket.opened.wait()
+        return socket
+
+    async def _until(self, predicate, timeout=60):
+        deadline = time.perf_counter() + timeout
+        while not predicate():
+            if time.perf_counter() > deadline:
+                raise TimeoutError("live benchmark stalled")
+            await asyncio.sleep(0.005)
+
+    async def _play(self, cookies, code, question_count):
+        from quizgen.asgi import application
+
+        started = time.perf_counter()
+        host = await self._connect(application, cookies[0], code)
+        players = await asyncio.gather(*(self._connect(application, cookie, code) for cookie in cookies[1:]))
+        rejected = sum(1 for player in players if player.close_code is not None)
+        runner = live._runners[code]
+        await self._until(lambda: len(runner.participants) == len(players) - rejected)
+        self.stdout.write(f"{len(players)} participants connected and joined in {time.perf_counter() - started:.2f}s"
+                          f" ({rejected} rejected)")
+
+        fanout, acks = [], []
+        for index in range(question_count):
+            sent = time.perf_counter()
+            host.say('{"type": "next"}')
+            await self._until(lambda: all(len(player.arrivals('question')) > index for player in players))
+            fanout.append(max(player.arrivals('question')[index] for player in players) - sent)
+
+            question_id = runner.current.id
+            sent = time.perf_counter()
+            for player in players:
+                player.say(f'{{"type": "answer", "question": {question_id}, "option": "{random.choice("ABCD")}"}}')
+            await self._until(lambda: all(len(player.arrivals('answered')) > index for player in players))
+            acks.append(max(player.arrivals('answered')[index] for player in players) - sent)
+
+        sent = time.perf_counter()
+        host.say('{"type": "end"}')
+        await self._until(lambda: all(player.arrivals('result') for player in players), timeout=300)
+        saved = time.perf_counter() - sent
+
+        for socket in [host, *players]:
+            socket.incoming.put_nowait({'type': 'websocket.disconnect'})
+        await asyncio.gather(host.task, *(player.task for player in players))
+
+        self.stdout.write(f"Question broadcast to all:  median {statistics.median(fanout) * 1000:.1f} ms, "
+                          f"max {max(fanout) * 1000:.1f} ms")
+        self.stdout.write(f"All answers graded + acked: median {statistics.median(acks) * 1000:.1f} ms, "
+                          f"max {max(acks) * 1000:.1f} ms")
+        self.stdout.write(f"End of session to all results (incl. saving): {saved:.2f}s")
+        status = await LiveSession.objects.filter(code=code).values_list('status', flat=True).aget()
+        self.stdout.write(f"Session status: {status}")
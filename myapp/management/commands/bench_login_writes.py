@@ -0,0 +1,78 @@
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+
+def _statement_kinds(queries):
+    return Counter(query['sql'].lstrip().split(None, 1)[0].upper() for query in queries)
+
+
+class Command(BaseCommand):
+    help = (
+        "Count the database statements of logging in and of browsing while logged in, on a "
+        "throwaway test database: writes (INSERT/UPDATE/DELETE) and reads per request."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=10)
+        parser.add_argument('--page-views', type=int, default=10, help="Dashboard views after each login")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self._run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _run(self, options):
+        from myapp.utils import writes
+
+        users = []
+        for i in range(options['logins']):
+            user = get_user_model().objects.create_user(username=f'bench{i}', email=f'bench{i}@example.com')
+            user.set_password('correct horse battery staple')
+            user.save()
+            users.append(user)
+
+        login_kinds, page_kinds = Counter(), Counter()
+        login_seconds = 0.0
+        for user in users:
+            client = Client()
+            client.get('/login/')
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = client.post('/login/', {'username': user.username, 'password': 'correct horse battery staple'})
+                login_seconds += time.perf_counter() - started
+            assert response.status_code == 302 and response.url.endswith('/dashboard/'), "login failed"
+            login_kinds += _statement_kinds(queries.captured_queries)
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(options['page_views']):
+                    client.get('/dashboard/')
+            page_kinds += _statement_kinds(queries.captured_queries)
+
+        # Deferred last_login updates are written in batches, not per login
+        with CaptureQueriesContext(connection) as queries:
+            writes.flush_last_logins()
+        flush_kinds = _statement_kinds(queries.captured_queries)
+
+        logins, views = options['logins'], options['logins'] * options['page_views']
+
+        def report(label, kinds, per, amortized=Counter()):
+            written = sum(kinds[kind] + amortized[kind] for kind in ('INSERT', 'UPDATE', 'DELETE')) / per
+            self.stdout.write(
+                f"{label}: {written:.2f} writes, {kinds['SELECT'] / per:.2f} reads, "
+                f"{sum(kinds.values()) / per:.2f} statements in total"
+            )
+
+        report("Per login", login_kinds, logins, flush_kinds)
+        report("Per logged-in page view", page_kinds, views)
+        self.stdout.write(f"Batched last_login flush: {sum(flush_kinds.values())} statements for {logins} logins "
+                          f"(included in the per-login writes)")
+        self.stdout.write(f"Login time: {login_seconds / logins * 1000:.0f} ms")
@@ -0,0 +1,118 @@
+import contextlib
+import gzip
+import io
+import json
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from myapp.models import Category, Question, Quiz
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark taking a quiz through the HTML views against the JSON API (api/v1/) "
+        "on a throwaway test database: time per attempt and bytes transferred."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--attempts', type=int, default=50, help="Quiz attempts per mode")
+        parser.add_argument('--questions', type=int, default=20, help="Questions in the benchmark quiz")
+        parser.add_argument('--page-size', type=int, default=10, help="API question page size")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # Grading would otherwise queue AI explanations for the wrong answers
+            with override_settings(QUESTION_EXPLANATIONS=False):
+                self._run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _run(self, options):
+        user = get_user_model().objects.create_user(username='bench', email='bench@example.com')
+        category = Category.objects.create(name='Benchmark')
+        quiz = Quiz.objects.create(title='Benchmark quiz', category=category, difficulty='M')
+        Question.objects.bulk_create([
+            Question(
+                quiz=quiz,
+                text=f"Benchmark question {i}: which option is the right one for this fairly typical question?",
+                option1=f"First option {i}", option2=f"Second option {i}",
+                option3=f"Third option {i}", option4=f"Fourth option {i}",
+                correct_answer='ABCD'[i % 4],
+            )
+            for i in range(options['questions'])
+        ])
+        question_ids = list(quiz.questions.values_list('id', flat=True))
+        answers = {str(question_id): 'A' for question_id in question_ids}
+
+        client = Client()
+        client.force_login(user)
+        self.stdout.write(f"{options['attempts']} attempts of a {len(question_ids)}-question quiz per mode")
+        self._report('HTML', [self._html_attempt(client, quiz, answers) for _ in range(options['attempts'])])
+        self._report('API ', [self._api_attempt(client, quiz, answers, options['page_size'], None)
+                              for _ in range(options['attempts'])])
+
+        # Clients that kept the question pages revalidate them with If-None-Match
+        etags = {}
+        self._api_attempt(client, quiz, answers, options['page_size'], etags)
+        self._report('API (cached questions)', [self._api_attempt(client, quiz, answers, options['page_size'], etags)
+                                                for _ in range(options['attempts'])])
+
+    def _html_attempt(self, client, quiz, answers):
+        responses = []
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):  # take_quiz_view prints every question
+            response = client.get(f'/quiz/take/{quiz.id}/')
+            responses.append(response)
+            attempt_id = response.context['quiz_history_id']
+            response = client.post('/api/submit-quiz/', {
+                'quiz_history_id': attempt_id,
+                'answers': json.dumps({qid: {'selected_option': opt} for qid, opt in answers.items()}),
+                'time_taken': 60,
+            })
+            responses.append(response)
+            responses.append(client.get(response['Location']))
+        return time.perf_counter() - started, responses
+
+    def _api_attempt(self, client, quiz, answers, page_size, etags):
+        responses = []
+        started = time.perf_counter()
+        response = client.post(f'/api/v1/quizzes/{quiz.id}/attempts/')
+        responses.append(response)
+        attempt_id = response.json()['attempt']
+
+        page = 1
+        while page:
+            path = f'/api/v1/quizzes/{quiz.id}/questions/?page={page}&size={page_size}'
+            headers = {'HTTP_IF_NONE_MATCH': etags[path]} if etags and path in etags else {}
+            response = client.get(path, **headers)
+            responses.append(response)
+            if response.status_code == 304:
+                page = page + 1 if page * page_size < len(answers) else None
+                continue
+            if etags is not None:
+                etags[path] = response['ETag']
+            page = response.json()['next']
+
+        responses.append(client.post(f'/api/v1/attempts/{attempt_id}/submit/', {'answers': answers},
+                                     content_type='application/json'))
+        return time.perf_counter() - started, responses
+
+    def _report(self, label, results):
+        timings = [elapsed for elapsed, _ in results]
+        bodies = [response.content for _, responses in results for response in responses]
+        raw = sum(len(body) for body in bodies) / len(results)
+        compressed = sum(len(gzip.compress(body)) if body else 0 for body in bodies) / len(results)
+        requests = sum(len(responses) for _, responses in results) / len(results)
+        self.stdout.write(
+            f"{label}: {len(results) / sum(timings):.1f} attempts/s, median {statistics.median(timings) * 1000:.1f} ms, "
+            f"{requests:.0f} requests/attempt, {raw / 1024:.1f} KB/attempt ({compressed / 1024:.1f} KB gzipped)"
+        )
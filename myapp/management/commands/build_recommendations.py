@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp.utils import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute every user's next-quiz and weak-topic suggestions from completed attempts. "
+        "Meant to be scheduled, e.g. nightly; completions update their user's rows in between."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=settings.RECOMMEND_TOP_K, help="Suggestions of each kind per user")
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        users = recommendations.build(options['top_k'])
+        engine = 'numpy' if recommendations.np is not None else 'pure Python'
+        self.stdout.write(self.style.SUCCESS(
+            f"Built recommendations for {users} users in {time.monotonic() - started:.1f}s ({engine})"
+        ))
@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp.utils import recommendations
+
+
+class Command(BaseCommand):
+    help = (
+        "Offline evaluation of next-quiz suggestions: hide each user's most recent quiz, recommend "
+        "from the rest and report hit rate and MRR against a most-popular baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=settings.RECOMMEND_TOP_K)
+        parser.add_argument('--min-history', type=int, default=2,
+                            help="Only evaluate users with at least this many distinct completed quizzes")
+
+    def handle(self, *args, **options):
+        report = recommendations.evaluate(options['top_k'], options['min_history'])
+        if report is None:
+            self.stdout.write("Not enough history to evaluate")
+            return
+        k = report['k']
+        self.stdout.write(f"Users evaluated: {report['users']}")
+        self.stdout.write(f"Hit rate@{k}:  model {report['hit_rate']:.3f}  popular {report['baseline_hit_rate']:.3f}")
+        self.stdout.write(f"MRR@{k}:       model {report['mrr']:.3f}  popular {report['baseline_mrr']:.3f}")
+        self.stdout.write(f"Catalog coverage: {report['coverage']:.1%}")
@@ -0,0 +1,229 @@
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from myapp.models import Question, Quiz, SubCategory
+from myapp.utils.gemini_helper import gemini_generator
+from myapp.utils.ratelimit import budget_retry_after
+
+DIFFICULTIES = ('E', 'M', 'H')
+
+
+def _normalize(text):
+    """Question text reduced for duplicate detection: case, punctuation and spacing ignored"""
+    return ' '.join(re.sub(r'[^\w]+', ' ', text.casefold()).split())
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed AI-generated quizzes offline from a manifest or for every subcategory. Calls run with "
+        "bounded concurrency and retries; finished items are checkpointed so an interrupted run resumes, "
+        "and questions already in the database are skipped."
+    )
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group(required=True)
+        source.add_argument('--manifest', help=(
+            'JSON list of {"category", "subcategory", "difficulty", "num_questions", "quizzes"}; '
+            'difficulty, num_questions and quizzes are optional'
+        ))
+        source.add_argument('--all-subcategories', action='store_true', help="One item per subcategory and difficulty")
+        parser.add_argument('--difficulties', default='E,M,H', help="With --all-subcategories, e.g. 'M,H'")
+        parser.add_argument('--num-questions', type=int, default=10, help="Default questions per quiz")
+        parser.add_argument('--concurrency', type=int, default=4, help="Gemini calls in flight")
+        parser.add_argument('--retries', type=int, default=2, help="Extra attempts per item after a failure")
+        parser.add_argument('--backoff', type=float, default=2.0, help="Base retry delay in seconds, doubled per retry")
+        parser.add_argument('--checkpoint', default='generate_quizzes.checkpoint.jsonl',
+                            help="File recording finished items; items listed there are skipped")
+        parser.add_argument('--dry-run', action='store_true', help="List the pending items without generating")
+
+    def handle(self, *args, **options):
+        items = self._manifest_items(options) if options['manifest'] else self._subcategory_items(options)
+        done = self._read_checkpoint(options['checkpoint'])
+        pending = [item for item in items if item['key'] not in done]
+        self.stdout.write(f"{len(items)} items, {len(items) - len(pending)} already done, {len(pending)} pending")
+        if options['dry_run']:
+            for item in pending:
+                self.stdout.write(f"  {item['key']} ({item['num_questions']} questions)")
+            return
+        if not pending:
+            return
+
+        self.seen = {_normalize(text) for text in Question.objects.values_list('text', flat=True).iterator(chunk_size=2000)}
+        self.stats = dict.fromkeys(
+            ('items', 'failed', 'empty', 'retries', 'requested', 'parsed', 'duplicates', 'saved'), 0,
+        )
+        self.call_seconds = 0.0
+        started = time.monotonic()
+
+        pool = ThreadPoolExecutor(max_workers=max(1, options['concurrency']))
+        try:
+            with open(options['checkpoint'], 'a') as checkpoint:
+                futures = {}
+                for item in pending:
+                    futures[pool.submit(self._generate, item, options['retries'], options['backoff'])] = item
+                for future in as_completed(futures):
+                    item = futures[future]
+                    questions, error, retries, seconds = future.result()
+                    self.stats['requested'] += item['num_questions']
+                    self.stats['retries'] += retries
+                    self.call_seconds += seconds
+                    if error:
+                        # Not checkpointed, so the next run retries it
+                        self.stats['failed'] += 1
+                        self.stderr.write(f"{item['key']}: {error}")
+                        continue
+                    quiz_id = self._persist(item, questions)
+                    checkpoint.write(json.dumps({'key': item['key'], 'quiz_id': quiz_id}) + '\n')
+                    checkpoint.flush()
+        except KeyboardInterrupt:
+            self.stderr.write("Interrupted; finished items are checkpointed, rerun to resume")
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._report(time.monotonic() - started)
+
+    # ---------------- Work items ----------------
+
+    def _item(self, category, subcategory, difficulty, num_questions, n):
+        return {
+            'key': f"{category.name}/{subcategory.name}/{difficulty}/{num_questions}#{n}",
+            'category': category,
+            'subcategory': subcategory,
+            'difficulty': difficulty,
+            'num_questions': num_questions,
+        }
+
+    def _manifest_items(self, options):
+        try:
+            with open(options['manifest']) as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Cannot read manifest: {e}")
+        subcategories = {
+            (s.category.name, s.name): s for s in SubCategory.objects.select_related('category')
+        }
+        items = []
+        for entry in entries:
+            subcategory = subcategories.get((entry.get('category'), entry.get('subcategory')))
+            if subcategory is None:
+                raise CommandError(f"Unknown category/subcategory in manifest: {entry}")
+            difficulty = entry.get('difficulty', 'M')
+            if difficulty not in DIFFICULTIES:
+                raise CommandError(f"Difficulty must be one of {', '.join(DIFFICULTIES)}: {entry}")
+            num_questions = int(entry.get('num_questions', options['num_questions']))
+            for n in range(int(entry.get('quizzes', 1))):
+                items.append(self._item(subcategory.category, subcategory, difficulty, num_questions, n))
+        return items
+
+    def _subcategory_items(self, options):
+        difficulties = [d.strip().upper() for d in options['difficulties'].split(',') if d.strip()]
+        if not set(difficulties) <= set(DIFFICULTIES):
+            raise CommandError(f"Difficulties must be among {', '.join(DIFFICULTIES)}")
+        return [
+            self._item(subcategory.category, subcategory, difficulty, options['num_questions'], 0)
+            for subcategory in SubCategory.objects.select_related('category').order_by('category__name', 'name')
+            for difficulty in difficulties
+        ]
+
+    def _read_checkpoint(self, path):
+        try:
+            with open(path) as f:
+                return {json.loads(line)['key'] for line in f if line.strip()}
+        except FileNotFoundError:
+            return set()
+
+    # ---------------- Generation ----------------
+
+    def _generate(self, item, retries, backoff):
+        """
+        Runs in a worker thread: (questions, error, retries used, seconds spent in calls);
+        error is set and questions empty once retries are used up.
+        """
+        error, seconds = None, 0.0
+        try:
+            for attempt in range(retries + 1):
+                if attempt:
+                    time.sleep(backoff * 2 ** (attempt - 1))
+                if budget_retry_after():
+                    return [], "daily AI budget exhausted", attempt, seconds
+                started = time.monotonic()
+                try:
+                    questions = gemini_generator.request_quiz_questions(
+                        item['category'].name, item['subcategory'].name, item['difficulty'], item['num_questions'],
+                        category_id=item['category'].id, subcategory_id=item['subcategory'].id,
+                    )
+                except Exception as e:
+                    error = e
+                    continue
+                finally:
+                    seconds += time.monotonic() - started
+                if questions:
+                    return questions, None, attempt, seconds
+                error = "no questions could be parsed"
+            return [], error, retries, seconds
+        finally:
+            connection.close()
+
+    # ---------------- Persistence ----------------
+
+    def _persist(self, item, questions):
+        """Save the item's new questions as one quiz; returns its id, or None if every question was a duplicate"""
+        self.stats['items'] += 1
+        self.stats['parsed'] += len(questions)
+        fresh = []
+        for q_data in questions:
+            normalized = _normalize(q_data['text'])
+            if not normalized or normalized in self.seen:
+                self.stats['duplicates'] += 1
+                continue
+            self.seen.add(normalized)
+            fresh.append(q_data)
+        if not fresh:
+            self.stats['empty'] += 1
+            return None
+
+        subcategory = item['subcategory']
+        with transaction.atomic():
+            quiz = Quiz.objects.create(
+                title=f"AI Generated Quiz - {subcategory.name}",
+                description=f"Automatically generated quiz about {subcategory.name}",
+                category=item['category'],
+                subcategory=subcategory,
+                difficulty=item['difficulty'],
+                is_ai_generated=True,
+            )
+            Question.objects.bulk_create([
+                Question(
+                    quiz=quiz,
+                    text=q_data['text'],
+                    option1=q_data.get('option1', ''),
+                    option2=q_data.get('option2', ''),
+                    option3=q_data.get('option3', ''),
+                    option4=q_data.get('option4', ''),
+                    correct_answer=q_data.get('correct_answer', ''),
+                    difficulty=item['difficulty'],
+                    is_ai_generated=True,
+                )
+                for q_data in fresh
+            ])
+        self.stats['saved'] += len(fresh)
+        return quiz.id
+
+    def _report(self, elapsed):
+        s = self.stats
+        calls = s['items'] + s['failed'] + s['retries']
+        self.stdout.write(
+            f"{s['items']} items done ({s['empty']} all duplicates), {s['failed']} failed, {s['retries']} retries "
+            f"in {elapsed:.1f}s ({s['items'] / elapsed * 60 if elapsed else 0:.1f} items/min, "
+            f"mean call {self.call_seconds / calls if calls else 0:.2f}s)"
+        )
+        self.stdout.write(
+            f"Questions: {s['requested']} requested, {s['parsed']} parsed, {s['duplicates']} duplicates, "
+            f"{s['saved']} saved ({s['saved'] / elapsed if elapsed else 0:.2f}/s); "
+            f"yield {s['saved'] / s['requested'] * 100 if s['requested'] else 0:.0f}%"
+        )
+        self.stdout.write(self.style.SUCCESS(f"Saved {s['saved']} questions"))
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from myapp.models import Category, SubCategory
+from myapp.utils.gemini_helper import gemini_generator
+
+FAKE_QUIZ_TEXT = """Question: What is 2 + 2?
+A) 3
+B) 4
+C) 5
+D) 22
+Correct: B
+"""
+
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class _FakeStream:
+    def __init__(self, text):
+        self.text = text
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        yield _FakeResponse(self.text)
+
+
+class _FakeModel:
+    """Stands in for the Gemini model with a fixed latency, so no API key or quota is used"""
+
+    def __init__(self, latency, text):
+        self.latency = latency
+        self.text = text
+
+    def generate_content(self, prompt, **kwargs):
+        time.sleep(self.latency)
+        return _FakeResponse(self.text)
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        await asyncio.sleep(self.latency)
+        return _FakeStream(self.text) if stream else _FakeResponse(self.text)
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test the LLM-bound endpoints against a throwaway test database, comparing "
+        "WSGI-style thread-per-request serving with ASGI concurrency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=['chat', 'quiz'], default='chat')
+        parser.add_argument('--requests', type=int, default=200, help="Total requests per mode")
+        parser.add_argument('--threads', type=int, default=8, help="WSGI worker threads")
+        parser.add_argument('--latency', type=float, default=1.0, help="Simulated Gemini latency in seconds")
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        if connection.vendor == 'sqlite':
+            # A file-backed test DB lets WSGI worker threads wait on locks instead of failing
+            fd, path = tempfile.mkstemp(suffix='.sqlite3')
+            os.close(fd)
+            connection.settings_dict['TEST']['NAME'] = path
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        real_model = gemini_generator.model
+        gemini_generator.model = _FakeModel(options['latency'], FAKE_QUIZ_TEXT)
+        try:
+            with override_settings(
+                SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+                RATE_LIMITS={},
+                LLM_MAX_CONCURRENCY_PER_PROCESS=None,
+                LLM_DAILY_TOKEN_BUDGET=None,
+                LLM_DAILY_COST_BUDGET=None,
+            ):
+                self._run(options)
+        finally:
+            gemini_generator.model = real_model
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def _run(self, options):
+        user = get_user_model().objects.create_user(username='loadtest', email='loadtest@example.com')
+        category = Category.objects.create(name='Load Test')
+        subcategory = SubCategory.objects.create(name='Concurrency', category=category)
+
+        if options['endpoint'] == 'chat':
+            path, payload = '/chatbot-response/', {'message': 'hello'}
+        else:
+            path = '/api/generate-quiz/'
+            payload = {'category_id': category.id, 'subcategory_id': subcategory.id, 'num_questions': 1}
+
+        login_client = Client()
+        login_client.force_login(user)
+        cookies = login_client.cookies
+
+        n = options['requests']
+        self.stdout.write(
+            f"{n} requests to {path}, simulated LLM latency {options['latency']:.2f}s, "
+            f"{options['threads']} WSGI threads"
+        )
+        self._report('WSGI', *self._run_wsgi(path, payload, cookies, n, options['threads']))
+        self._report('ASGI', *self._run_asgi(path, payload, cookies, n))
+
+    def _run_wsgi(self, path, payload, cookies, n, threads):
+        local = threading.local()
+
+        def one(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.cookies = cookies
+            started = time.perf_counter()
+            response = local.client.post(path, payload, content_type='application/json')
+            if response.streaming:
+                b''.join(response)
+            return response.status_code, time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(one, range(n)))
+        elapsed = time.perf_counter() - started
+        connection.close()
+        return results, elapsed
+
+    def _run_asgi(self, path, payload, cookies, n):
+        async def one(client):
+            started = time.perf_counter()
+            response = await client.post(path, payload, content_type='application/json')
+            if response.streaming:
+                async for _ in response.streaming_content:
+                    pass
+            return response.status_code, time.perf_counter() - started
+
+        async def run_all():
+            client = AsyncClient()
+            client.cookies = cookies
+            return await asyncio.gather(*(one(client) for _ in range(n)))
+
+        started = time.perf_counter()
+        results = asyncio.run(run_all())
+        return results, time.perf_counter() - started
+
+    def _report(self, label, results, elapsed):
+        latencies = sorted(latency for _, latency in results)
+        ok = sum(1 for status, _ in results if status == 200)
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(
+            f"{label}: {ok}/{len(results)} OK in {elapsed:.2f}s "
+            f"({len(results) / elapsed:.1f} req/s, median {statistics.median(latencies):.2f}s, p95 {p95:.2f}s)"
+        )
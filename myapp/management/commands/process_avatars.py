@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from myapp.models import CustomUser, Profile
+from myapp.utils.avatars import process_avatar
+
+
+class Command(BaseCommand):
+    help = "Process avatars uploaded before the avatar pipeline existed (thumbnails, dedupe, cleanup)"
+
+    def handle(self, *args, **options):
+        processed = 0
+        for model in (Profile, CustomUser):
+            pks = model.objects.exclude(avatar='').exclude(avatar__isnull=True).filter(avatar_hash='').values_list('pk', flat=True)
+            for pk in pks.iterator():
+                try:
+                    process_avatar(model._meta.label, pk)
+                    processed += 1
+                except Exception as e:
+                    self.stderr.write(f"{model.__name__} {pk}: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} avatars"))
@@ -0,0 +1,93 @@
+from datetime import datetime, time, timedelta
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from myapp.models import AIGenerationLog, AIGenerationRollup
+
+
+def _day_start(day):
+    """Midnight starting `day` in the current time zone"""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class Command(BaseCommand):
+    help = (
+        "Roll AIGenerationLog rows up into daily AIGenerationRollup rows, then delete raw rows "
+        "past the retention window. Safe to re-run; meant to be scheduled daily."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2,
+                            help="Recompute rollups for this many most recent days (late rows land here)")
+        parser.add_argument('--retain-days', type=int, default=settings.AI_LOG_RETENTION_DAYS,
+                            help="Delete raw log rows older than this many days once rolled up")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing")
+
+    def handle(self, *args, **options):
+        if options['retain_days'] <= options['days']:
+            raise CommandError("--retain-days must be larger than --days, or rolled-up days would lose raw rows")
+
+        today = timezone.localdate()
+        window_start = today - timedelta(days=options['days'] - 1)
+
+        # Days outside the window that have raw rows but were never rolled up (first run, missed runs)
+        rolled_days = set(AIGenerationRollup.objects.filter(day__lt=window_start).values_list('day', flat=True).distinct())
+        raw_days = set(
+            AIGenerationLog.objects.filter(created_at__lt=_day_start(window_start)).dates('created_at', 'day')
+        )
+        days = sorted(raw_days - rolled_days)
+        days += [window_start + timedelta(days=i) for i in range(options['days'])]
+
+        rollups = self._build_rollups(days)
+        cutoff = timezone.now() - timedelta(days=options['retain_days'])
+        expired = AIGenerationLog.objects.filter(created_at__lt=cutoff)
+
+        if options['dry_run']:
+            self.stdout.write(f"Would write {len(rollups)} rollup rows for {len(days)} days "
+                              f"and delete {expired.count()} raw rows older than {options['retain_days']} days")
+            return
+
+        with transaction.atomic():
+            AIGenerationRollup.objects.filter(day__in=days).delete()
+            AIGenerationRollup.objects.bulk_create(rollups, batch_size=500)
+        deleted, _ = expired.delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {len(rollups)} rollup rows for {len(days)} days; deleted {deleted} raw rows"
+        ))
+
+    def _build_rollups(self, days):
+        if not days:
+            return []
+        # Half-open created_at ranges, one per run of consecutive days, so the index is used
+        spans = []
+        for day in days:
+            if spans and spans[-1][1] == day:
+                spans[-1][1] = day + timedelta(days=1)
+            else:
+                spans.append([day, day + timedelta(days=1)])
+        in_days = reduce(or_, (Q(created_at__gte=_day_start(start), created_at__lt=_day_start(end)) for start, end in spans))
+        rows = (
+            AIGenerationLog.objects
+            .filter(in_days)
+            .annotate(day=TruncDate('created_at'))
+            .values('day', 'kind', 'category_id', 'difficulty', 'prompt_template_id')
+            .annotate(
+                calls=Count('id'),
+                questions_requested=Sum('questions_requested'),
+                questions_generated=Sum('questions_generated'),
+                tokens_in=Sum('tokens_in'),
+                tokens_out=Sum('tokens_out'),
+                latency_ms_total=Sum('latency_ms'),
+                latency_ms_max=Max('latency_ms'),
+            )
+            .order_by()
+        )
+        return [AIGenerationRollup(**row) for row in rows]
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from myapp.utils.attempts import sweep_abandoned_attempts
+
+
+class Command(BaseCommand):
+    help = "Delete quiz attempts that were started but never submitted. Meant to be scheduled, e.g. hourly."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.ATTEMPT_ABANDON_HOURS,
+                            help="Treat unsubmitted attempts started more than this many hours ago as abandoned")
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be deleted without deleting")
+
+    def handle(self, *args, **options):
+        count = sweep_abandoned_attempts(options['hours'], dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f"Would delete {count} abandoned attempts")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Deleted {count} abandoned attempts"))
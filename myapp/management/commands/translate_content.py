@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.utils import translations
+from myapp.utils.gemini_helper import gemini_generator
+from myapp.utils.ratelimit import budget_retry_after
+
+
+class Command(BaseCommand):
+    help = (
+        "Translate quizzes and questions into the other QUIZ_LOCALES in batches, one Gemini call per "
+        "batch. Only content without a current translation is sent, so reruns pick up new and edited "
+        "content and retry failed batches; meant to be scheduled after quiz generation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locale', action='append', help="Translate into this locale only (repeatable); default all")
+        parser.add_argument('--quiz', type=int, action='append', help="Only this quiz and its questions (repeatable)")
+        parser.add_argument('--batch-size', type=int, default=settings.TRANSLATION_BATCH_SIZE,
+                            help="Objects per Gemini call")
+        parser.add_argument('--limit', type=int, help="Translate at most this many objects per locale and kind")
+        parser.add_argument('--dry-run', action='store_true', help="Count what would be translated without calling Gemini")
+
+    def handle(self, *args, **options):
+        locales = options['locale'] or [locale for locale in settings.QUIZ_LOCALES if translations.is_translated(locale)]
+        unknown = [locale for locale in locales if not translations.is_translated(locale)]
+        if unknown:
+            raise CommandError(
+                f"Not a translated locale: {', '.join(unknown)} "
+                f"(QUIZ_LOCALES other than QUIZ_SOURCE_LOCALE '{settings.QUIZ_SOURCE_LOCALE}')"
+            )
+        batch_size = max(1, options['batch_size'])
+
+        for locale in locales:
+            for name, kind in translations.KINDS.items():
+                queryset = kind.model.objects.all()
+                if options['quiz']:
+                    queryset = queryset.filter(**{'pk__in' if name == 'quiz' else 'quiz_id__in': options['quiz']})
+                started = time.monotonic()
+                pending = done = failed = 0
+                batch = []
+                for obj in translations.pending(kind, locale, queryset):
+                    if options['limit'] is not None and pending >= options['limit']:
+                        break
+                    pending += 1
+                    if options['dry_run']:
+                        continue
+                    batch.append(obj)
+                    if len(batch) == batch_size:
+                        saved, ok = self._translate(kind, locale, batch)
+                        done, failed, batch = done + saved, failed + len(batch) - saved, []
+                        if not ok:
+                            break
+                if batch:
+                    saved, _ = self._translate(kind, locale, batch)
+                    done, failed = done + saved, failed + len(batch) - saved
+                if options['dry_run']:
+                    self.stdout.write(f"{locale} {name}: {pending} to translate")
+                else:
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{locale} {name}: {done} translated, {failed} failed in {time.monotonic() - started:.1f}s"
+                    ))
+
+    def _translate(self, kind, locale, objects):
+        """(translations saved, whether to go on); stops the locale when the daily AI budget is spent"""
+        if budget_retry_after():
+            self.stderr.write("Daily AI budget exhausted; rerun later to continue")
+            return 0, False
+        items = [{'id': obj.pk, **{field: getattr(obj, field) for field in kind.fields}} for obj in objects]
+        try:
+            translated = gemini_generator.translate_items(items, locale)
+        except Exception as e:
+            # Left untranslated, so the next run retries them
+            self.stderr.write(f"{locale}: batch of {len(objects)} failed: {e}")
+            return 0, True
+        return translations.store(kind, locale, objects, translated), True
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp.utils import warmup
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the deploy warm-up stages once and report how long each took. The servers run it "
+        "themselves at startup; this is for measuring it, or for warming the database's cache "
+        "before switching traffic."
+    )
+
+    def handle(self, *args, **options):
+        warmup.reset()
+        results = warmup.run()
+        for result in results:
+            line = f"{result.name:<10} {result.seconds * 1000:8.0f} ms"
+            if result.error:
+                self.stdout.write(self.style.ERROR(f"{line}  {result.error}"))
+            else:
+                self.stdout.write(line)
+        self.stdout.write(f"{'total':<10} {sum(result.seconds for result in results) * 1000:8.0f} ms")
+        if warmup.status()[0] != warmup.READY:
+            raise CommandError("Warm-up failed; the worker would report not ready")
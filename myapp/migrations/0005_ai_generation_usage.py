@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0004_chat_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aigenerationlog',
+            name='kind',
+            field=models.CharField(choices=[('quiz', 'Quiz generation'), ('chat', 'Chatbot')], default='quiz', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='aigenerationlog',
+            name='latency_ms',
+            field=models.PositiveIntegerField(default=0, help_text='Wall time of the LLM call in milliseconds'),
+        ),
+        migrations.AddField(
+            model_name='aigenerationlog',
+            name='tokens_in',
+            field=models.PositiveIntegerField(default=0, help_text='Prompt tokens billed'),
+        ),
+        migrations.AddField(
+            model_name='aigenerationlog',
+            name='tokens_out',
+            field=models.PositiveIntegerField(default=0, help_text='Output tokens billed'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_questions_requested(apps, schema_editor):
+    # Earlier rows recorded the requested count in questions_generated
+    AIGenerationLog = apps.get_model('myapp', 'AIGenerationLog')
+    AIGenerationLog.objects.filter(kind='quiz', questions_requested=0).update(
+        questions_requested=models.F('questions_generated')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0005_ai_generation_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PromptTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('content_hash', models.CharField(help_text='SHA-256 of body', max_length=64, unique=True)),
+                ('body', models.TextField()),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='aigenerationlog',
+            name='questions_requested',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='aigenerationlog',
+            name='prompt_used',
+            field=models.TextField(blank=True, help_text='Legacy full prompt text; new rows reference prompt_template'),
+        ),
+        migrations.AddField(
+            model_name='aigenerationlog',
+            name='prompt_template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='myapp.prompttemplate'),
+        ),
+        migrations.CreateModel(
+            name='AIGenerationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('kind', models.CharField(choices=[('quiz', 'Quiz generation'), ('chat', 'Chatbot')], max_length=10)),
+                ('difficulty', models.CharField(choices=[('E', 'Easy'), ('M', 'Medium'), ('H', 'Hard')], max_length=1)),
+                ('calls', models.PositiveIntegerField(default=0)),
+                ('questions_requested', models.PositiveIntegerField(default=0)),
+                ('questions_generated', models.PositiveIntegerField(default=0)),
+                ('tokens_in', models.PositiveBigIntegerField(default=0)),
+                ('tokens_out', models.PositiveBigIntegerField(default=0)),
+                ('latency_ms_total', models.PositiveBigIntegerField(default=0)),
+                ('latency_ms_max', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='myapp.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'kind'], name='myapp_aigen_day_66074e_idx')],
+            },
+        ),
+        migrations.RunPython(backfill_questions_requested, migrations.RunPython.noop),
+    ]
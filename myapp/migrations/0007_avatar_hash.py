@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0006_ai_generation_analytics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='avatar_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='Content hash of the processed avatar', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_hash',
+            field=models.CharField(blank=True, db_index=True, help_text='Content hash of the processed avatar', max_length=64),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0007_avatar_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='draw_count',
+            field=models.PositiveIntegerField(blank=True, help_text='Question-bank mode: serve this many randomly drawn questions per attempt (empty serves all)', null=True),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='question_ids',
+            field=models.JSONField(blank=True, editable=False, help_text="Cached ids of this quiz's questions, used for drawing; rebuilt when empty", null=True),
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='shuffle_options',
+            field=models.BooleanField(default=False, help_text="Shuffle the order of each question's options per attempt"),
+        ),
+        migrations.AddField(
+            model_name='quizhistory',
+            name='options_shuffled',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='quizhistory',
+            name='seed',
+            field=models.BigIntegerField(blank=True, help_text="Seed of this attempt's question draw and option order (see myapp.utils.question_bank)", null=True),
+        ),
+    ]
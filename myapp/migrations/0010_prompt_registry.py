@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0009_review_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aigenerationrollup',
+            name='prompt_template',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rollups', to='myapp.prompttemplate'),
+        ),
+        migrations.AddField(
+            model_name='prompttemplate',
+            name='is_active',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='prompttemplate',
+            name='name',
+            field=models.CharField(blank=True, db_index=True, help_text="Registry name, e.g. 'quiz'; blank for legacy rows", max_length=50),
+        ),
+        migrations.AddField(
+            model_name='prompttemplate',
+            name='variant',
+            field=models.CharField(blank=True, help_text="Short label for reports, e.g. 'compact'", max_length=50),
+        ),
+        migrations.AddField(
+            model_name='prompttemplate',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='prompttemplate',
+            name='weight',
+            field=models.PositiveIntegerField(default=100, help_text="Share of the name's traffic relative to its other active variants"),
+        ),
+        migrations.AlterField(
+            model_name='prompttemplate',
+            name='content_hash',
+            field=models.CharField(editable=False, help_text='SHA-256 of body', max_length=64, unique=True),
+        ),
+        migrations.AddConstraint(
+            model_name='prompttemplate',
+            constraint=models.UniqueConstraint(condition=models.Q(('name', ''), _negated=True), fields=('name', 'version'), name='unique_prompt_version'),
+        ),
+    ]
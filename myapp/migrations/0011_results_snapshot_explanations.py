@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0010_prompt_registry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='explanation',
+            field=models.TextField(blank=True, help_text='Why the correct answer is right; shown on results pages'),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='explanation_attempted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='explanation_status',
+            field=models.CharField(blank=True, choices=[('', 'Not requested'), ('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='quizhistory',
+            name='result_snapshot',
+            field=models.JSONField(blank=True, editable=False, help_text='Graded questions as shown in the attempt, written at grading (see myapp.utils.attempts)', null=True),
+        ),
+        migrations.AlterField(
+            model_name='aigenerationlog',
+            name='kind',
+            field=models.CharField(choices=[('quiz', 'Quiz generation'), ('chat', 'Chatbot'), ('explanation', 'Answer explanation')], default='quiz', max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='aigenerationrollup',
+            name='kind',
+            field=models.CharField(choices=[('quiz', 'Quiz generation'), ('chat', 'Chatbot'), ('explanation', 'Answer explanation')], max_length=12),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0014_quiz_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizhistory',
+            name='pending_answers',
+            field=models.JSONField(blank=True, editable=False, help_text='Answers synced before submission: {question id: [shown letter, seconds, client sequence]}', null=True),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def remove_duplicate_answers(apps, schema_editor):
+    # Keep the first answer recorded for each question of an attempt (grading writes them
+    # in one batch, so duplicates only come from old double submits)
+    UserAnswer = apps.get_model('myapp', 'UserAnswer')
+    duplicated = (
+        UserAnswer.objects.values('history_id', 'question_id')
+        .annotate(rows=models.Count('id'), keep=models.Min('id'))
+        .filter(rows__gt=1)
+    )
+    for group in duplicated.iterator():
+        UserAnswer.objects.filter(history_id=group['history_id'], question_id=group['question_id']).exclude(
+            pk=group['keep']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0015_attempt_pending_answers'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_answers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='aigenerationlog',
+            index=models.Index(fields=['created_at'], name='myapp_aigen_created_1ecb58_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['quiz', 'id'], name='myapp_quest_quiz_id_f256b7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['category', 'subcategory', 'difficulty'], name='myapp_quiz_categor_7d7aa9_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='subcategory',
+            constraint=models.UniqueConstraint(fields=('category', 'name'), name='unique_subcategory_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='useranswer',
+            constraint=models.UniqueConstraint(fields=('history', 'question'), name='unique_answer_per_question'),
+        ),
+        # The new composite indexes lead with these columns, so their own indexes are redundant
+        migrations.AlterUniqueTogether(
+            name='subcategory',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='question',
+            name='quiz',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='questions', to='myapp.quiz'),
+        ),
+        migrations.AlterField(
+            model_name='quiz',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='quizzes', to='myapp.category'),
+        ),
+        migrations.AlterField(
+            model_name='subcategory',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='subcategories', to='myapp.category'),
+        ),
+        migrations.AlterField(
+            model_name='useranswer',
+            name='history',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='user_answers', to='myapp.quizhistory'),
+        ),
+    ]
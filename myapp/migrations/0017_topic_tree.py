@@ -0,0 +1,70 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_topics(apps, schema_editor):
+    # One root topic per category and a child per subcategory; quizzes get the most specific one.
+    # Historical models have no custom save(), so paths are written here.
+    Category = apps.get_model('myapp', 'Category')
+    SubCategory = apps.get_model('myapp', 'SubCategory')
+    Topic = apps.get_model('myapp', 'Topic')
+    Quiz = apps.get_model('myapp', 'Quiz')
+
+    def segment(pk):
+        return f"{pk:06d}/"
+
+    roots = {}
+    for category in Category.objects.order_by('pk'):
+        topic = Topic.objects.create(name=category.name, category=category, path=f"new-{category.pk}", depth=0)
+        topic.path = segment(topic.pk)
+        topic.save(update_fields=['path'])
+        roots[category.pk] = topic
+    children = {}
+    for subcategory in SubCategory.objects.order_by('pk'):
+        parent = roots[subcategory.category_id]
+        topic = Topic.objects.create(name=subcategory.name, parent=parent, subcategory=subcategory,
+                                     path=f"new-sub-{subcategory.pk}", depth=1)
+        topic.path = parent.path + segment(topic.pk)
+        topic.save(update_fields=['path'])
+        children[subcategory.pk] = topic
+
+    quizzes = list(Quiz.objects.only('pk', 'category_id', 'subcategory_id'))
+    for quiz in quizzes:
+        quiz.topic = children.get(quiz.subcategory_id) or roots.get(quiz.category_id)
+    Quiz.objects.bulk_update(quizzes, ['topic'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0016_index_coverage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Topic',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=100)),
+                ('path', models.CharField(editable=False, max_length=255, unique=True)),
+                ('depth', models.PositiveSmallIntegerField(default=0, editable=False)),
+                ('category', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='topic', to='myapp.category')),
+                ('parent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='myapp.topic')),
+                ('subcategory', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='topic', to='myapp.subcategory')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='quiz',
+            name='topic',
+            field=models.ForeignKey(blank=True, help_text="Most specific topic; defaults to the subcategory's (or category's) topic", null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='quizzes', to='myapp.topic'),
+        ),
+        migrations.AddConstraint(
+            model_name='topic',
+            constraint=models.UniqueConstraint(fields=('parent', 'name'), name='unique_topic_name'),
+        ),
+        migrations.RunPython(build_topics, migrations.RunPython.noop),
+    ]
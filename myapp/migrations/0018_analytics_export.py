@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0017_topic_tree'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportMark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('mark', models.DateTimeField(blank=True, help_text='updated_at of the last exported row', null=True)),
+                ('last_id', models.BigIntegerField(default=0, help_text='id of the last exported row, breaking updated_at ties')),
+                ('rows_exported', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='quizhistory',
+            index=models.Index(fields=['updated_at', 'id'], name='myapp_quizh_updated_f60ef6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='useranswer',
+            index=models.Index(fields=['updated_at', 'id'], name='myapp_usera_updated_5950b7_idx'),
+        ),
+    ]
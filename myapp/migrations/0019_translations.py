@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:26
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0018_analytics_export'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='locale',
+            field=models.CharField(blank=True, help_text='Language quizzes are shown in (one of QUIZ_LOCALES); empty for the source language', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='aigenerationlog',
+            name='kind',
+            field=models.CharField(choices=[('quiz', 'Quiz generation'), ('chat', 'Chatbot'), ('explanation', 'Answer explanation'), ('translation', 'Content translation')], default='quiz', max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='aigenerationrollup',
+            name='kind',
+            field=models.CharField(choices=[('quiz', 'Quiz generation'), ('chat', 'Chatbot'), ('explanation', 'Answer explanation'), ('translation', 'Content translation')], max_length=12),
+        ),
+        migrations.CreateModel(
+            name='QuestionTranslation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('locale', models.CharField(max_length=10)),
+                ('text', models.TextField()),
+                ('option1', models.TextField()),
+                ('option2', models.TextField()),
+                ('option3', models.TextField()),
+                ('option4', models.TextField()),
+                ('source_hash', models.CharField(help_text='Hash of the source text it was translated from; stale once the source changes', max_length=64)),
+                ('question', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='translations', to='myapp.question')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('question', 'locale'), name='unique_question_translation')],
+            },
+        ),
+        migrations.CreateModel(
+            name='QuizTranslation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('locale', models.CharField(max_length=10)),
+                ('title', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('source_hash', models.CharField(help_text='Hash of the source text it was translated from; stale once the source changes', max_length=64)),
+                ('quiz', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='translations', to='myapp.quiz')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('quiz', 'locale'), name='unique_quiz_translation')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0019_translations'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='topic',
+            constraint=models.UniqueConstraint(condition=models.Q(('parent__isnull', True)), fields=('name',), name='unique_root_topic_name'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0020_unique_root_topic_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedattempt',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Last archived or re-graded'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedattempt',
+            index=models.Index(fields=['updated_at', 'history'], name='myapp_archi_updated_87cee3_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 19:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0021_archived_attempt_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizhistory',
+            name='drawn_ids',
+            field=models.JSONField(blank=True, editable=False, help_text='Ids of the questions drawn for this attempt, in serving order; fixed at start', null=True),
+        ),
+    ]
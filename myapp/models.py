@@ -1,12 +1,94 @@
+import hashlib
+import uuid
+
 from django.db import models
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.fields.files import FieldFile
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 # ---------------- Custom User ----------------
-class CustomUser(AbstractUser):
+class AvatarMixin:
+    """URLs of the processed avatar renditions (see myapp.utils.avatars)"""
+
+    @property
+    def avatar_sm_url(self):
+        from myapp.utils.avatars import avatar_url
+        return avatar_url(self, 'sm')
+
+    @property
+    def avatar_md_url(self):
+        from myapp.utils.avatars import avatar_url
+        return avatar_url(self, 'md')
+
+    @property
+    def avatar_lg_url(self):
+        from myapp.utils.avatars import avatar_url
+        return avatar_url(self, 'lg')
+
+class DirtyFieldsMixin:
+    """
+    Remembers the column values loaded from the database so that save() writes only the
+    columns that changed, and skips the UPDATE (and its signals) when none did.
+    Explicit update_fields and new instances save as usual.
+    """
+
+    def _tracked_values(self):
+        deferred = self.get_deferred_fields()
+        values = {}
+        for field in self._meta.concrete_fields:
+            if field.primary_key or field.attname in deferred:
+                continue
+            value = getattr(self, field.attname)
+            if isinstance(value, FieldFile):
+                # An uncommitted upload is always a change, even under the old name
+                value = value.name if value._committed else value
+            values[field.attname] = value
+        return values
+
+    def _mark_clean(self, fields=None):
+        current = self._tracked_values()
+        if fields is None or getattr(self, '_loaded_values', None) is None:
+            self._loaded_values = current
+        else:
+            for name in fields:
+                attname = self._meta.get_field(name).attname
+                if attname in current:
+                    self._loaded_values[attname] = current[attname]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._mark_clean()
+        return instance
+
+    def dirty_fields(self):
+        """Attnames changed since load or the last save; None if unknown (not loaded from the database)"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return [name for name, value in self._tracked_values().items() if name not in loaded or loaded[name] != value]
+
+    def save(self, *args, **kwargs):
+        if kwargs.get('update_fields') is None and not args and not kwargs.get('force_insert') and not self._state.adding:
+            dirty = self.dirty_fields()
+            if dirty is not None:
+                if not dirty:
+                    return
+                kwargs['update_fields'] = dirty
+        super().save(*args, **kwargs)
+        self._mark_clean(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._mark_clean(fields)
+
+class CustomUser(DirtyFieldsMixin, AvatarMixin, AbstractUser):
     avatar = models.ImageField(upload_to="avatars/", blank=True, null=True)
+    avatar_hash = models.CharField(max_length=64, blank=True, db_index=True, help_text="Content hash of the processed avatar")
     preferences = models.TextField(blank=True, null=True)
     email = models.EmailField(unique=True)  
 
@@ -14,11 +96,13 @@ class CustomUser(AbstractUser):
         return self.username
 
 # ---------------- Profile ----------------
-class Profile(models.Model):
+class Profile(DirtyFieldsMixin, AvatarMixin, models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     display_name = models.CharField(max_length=50, blank=True)
     avatar = models.ImageField(upload_to='avatars/', blank=True, null=True)
+    avatar_hash = models.CharField(max_length=64, blank=True, db_index=True, help_text="Content hash of the processed avatar")
     preferences = models.TextField(blank=True)
+    locale = models.CharField(max_length=10, blank=True, help_text="Language quizzes are shown in (one of QUIZ_LOCALES); empty for the source language")
 
     def __str__(self):
         return self.user.username
@@ -39,14 +123,80 @@ class Category(BaseModel):
 
 class SubCategory(BaseModel):
     name = models.CharField(max_length=100)
-    category = models.ForeignKey(Category, related_name='subcategories', on_delete=models.CASCADE)
+    # Indexed by the unique constraint, which leads with category
+    category = models.ForeignKey(Category, related_name='subcategories', on_delete=models.CASCADE, db_index=False)
 
     class Meta:
-        unique_together = ['name', 'category']
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'name'], name='unique_subcategory_name'),
+        ]
 
     def __str__(self):
         return f"{self.category.name} - {self.name}"
 
+class Topic(BaseModel):
+    """
+    A node of the topic tree, any depth ("Science > Physics > Optics"). `path` is the
+    materialized path of zero-padded ids ("000001/000007/000042/"), so a subtree is one
+    indexed prefix query and the ancestors are the ids in the path (see myapp.utils.topics).
+    The first two levels mirror Category and SubCategory, which existing quizzes,
+    analytics and prompts still use.
+    """
+    PATH_SEGMENT_DIGITS = 6
+
+    name = models.CharField(max_length=100)
+    parent = models.ForeignKey('self', related_name='children', on_delete=models.CASCADE, null=True, blank=True)
+    path = models.CharField(max_length=255, unique=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    category = models.OneToOneField(Category, related_name='topic', on_delete=models.CASCADE, null=True, blank=True)
+    subcategory = models.OneToOneField(SubCategory, related_name='topic', on_delete=models.CASCADE, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['parent', 'name'], name='unique_topic_name'),
+            # NULL parents never collide in the constraint above, so roots need their own
+            models.UniqueConstraint(
+                fields=['name'], condition=models.Q(parent__isnull=True), name='unique_root_topic_name',
+            ),
+        ]
+
+    @classmethod
+    def path_segment(cls, pk):
+        return f"{pk:0{cls.PATH_SEGMENT_DIGITS}d}/"
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        if self.pk and self.parent_id and self.parent.path.startswith(self.path):
+            raise ValidationError("A topic cannot be moved under itself or one of its descendants")
+
+    def save(self, *args, **kwargs):
+        if self.pk is None:
+            # The path needs the id: insert with a placeholder, then fill it in
+            self.path = f"new-{uuid.uuid4().hex}"
+            super().save(*args, **kwargs)
+            kwargs.pop('force_insert', None)
+        expected = (self.parent.path if self.parent_id else '') + self.path_segment(self.pk)
+        if self.path != expected:
+            self.clean()
+            old_path, self.path = self.path, expected
+            self.depth = expected.count('/') - 1
+            super().save(*args, **kwargs)
+            if not old_path.startswith('new-'):
+                # Moved: re-root the descendants' paths under the new one
+                Topic.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(expected), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (expected.count('/') - old_path.count('/')),
+                )
+        else:
+            super().save(*args, **kwargs)
+
+    def ancestor_ids(self):
+        """Ids from the root down to the parent, read from the path"""
+        return [int(segment) for segment in self.path.split('/')[:-2]]
+
+    def __str__(self):
+        return self.name
+
 class Quiz(BaseModel):
     DIFFICULTY_CHOICES = [
         ('E', 'Easy'),
@@ -56,11 +206,25 @@ class Quiz(BaseModel):
     
     title = models.CharField(max_length=255)
     description = models.TextField(blank=True)
-    category = models.ForeignKey(Category, related_name='quizzes', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, related_name='quizzes', on_delete=models.CASCADE, db_index=False)
     subcategory = models.ForeignKey(SubCategory, related_name='quizzes', on_delete=models.CASCADE, null=True, blank=True)
+    topic = models.ForeignKey(Topic, related_name='quizzes', on_delete=models.SET_NULL, null=True, blank=True, help_text="Most specific topic; defaults to the subcategory's (or category's) topic")
     difficulty = models.CharField(max_length=1, choices=DIFFICULTY_CHOICES, default='M')
     time_limit_minutes = models.PositiveIntegerField(default=30, help_text="Time limit in minutes")
     is_ai_generated = models.BooleanField(default=False, help_text="Whether this quiz was generated by AI")
+    draw_count = models.PositiveIntegerField(null=True, blank=True, help_text="Question-bank mode: serve this many randomly drawn questions per attempt (empty serves all)")
+    shuffle_options = models.BooleanField(default=False, help_text="Shuffle the order of each question's options per attempt")
+    question_ids = models.JSONField(null=True, blank=True, editable=False, help_text="Cached ids of this quiz's questions, used for drawing; rebuilt when empty")
+
+    class Meta:
+        indexes = [
+            # Browsing and filtering by category > subcategory > difficulty; also serves category lookups
+            models.Index(fields=['category', 'subcategory', 'difficulty']),
+        ]
+
+    @property
+    def is_randomized(self):
+        return bool(self.draw_count) or self.shuffle_options
 
     def clean(self):
         from django.core.exceptions import ValidationError
@@ -69,6 +233,11 @@ class Quiz(BaseModel):
 
     def save(self, *args, **kwargs):
         self.full_clean()
+        if self.topic_id is None:
+            if self.subcategory_id:
+                self.topic = Topic.objects.filter(subcategory_id=self.subcategory_id).first()
+            else:
+                self.topic = Topic.objects.filter(category_id=self.category_id).first()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -88,7 +257,7 @@ class Question(BaseModel):
         ("D", "Option D"),
     ]
 
-    quiz = models.ForeignKey(Quiz, related_name='questions', on_delete=models.CASCADE)
+    quiz = models.ForeignKey(Quiz, related_name='questions', on_delete=models.CASCADE, db_index=False)
     text = models.TextField()
     difficulty = models.CharField(max_length=1, choices=DIFFICULTY_CHOICES, default='M')
     is_ai_generated = models.BooleanField(default=False, help_text="Whether this question was generated by AI")
@@ -98,7 +267,27 @@ class Question(BaseModel):
     option3 = models.CharField(max_length=255)
     option4 = models.CharField(max_length=255)
 
+    EXPLANATION_NONE = ''
+    EXPLANATION_PENDING = 'pending'
+    EXPLANATION_READY = 'ready'
+    EXPLANATION_FAILED = 'failed'
+    EXPLANATION_STATUS_CHOICES = [
+        (EXPLANATION_NONE, 'Not requested'),
+        (EXPLANATION_PENDING, 'Pending'),
+        (EXPLANATION_READY, 'Ready'),
+        (EXPLANATION_FAILED, 'Failed'),
+    ]
+
     correct_answer = models.CharField(choices=ANSWER_CHOICES, max_length=1)
+    explanation = models.TextField(blank=True, help_text="Why the correct answer is right; shown on results pages")
+    explanation_status = models.CharField(max_length=10, choices=EXPLANATION_STATUS_CHOICES, default=EXPLANATION_NONE, blank=True)
+    explanation_attempted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # A quiz's questions in id order (attempts, grading, the API) without a sort
+            models.Index(fields=['quiz', 'id']),
+        ]
 
     def get_correct_option(self):
         """Return the correct option text"""
@@ -122,6 +311,45 @@ class Question(BaseModel):
     def __str__(self):
         return f"{self.text[:50]}... ({self.get_difficulty_display()})"
 
+# ---------------- Translations ----------------
+class QuizTranslation(BaseModel):
+    """A quiz's title and description in another locale (see myapp.utils.translations)"""
+    quiz = models.ForeignKey(Quiz, related_name='translations', on_delete=models.CASCADE, db_index=False)
+    locale = models.CharField(max_length=10)
+    title = models.CharField(max_length=255)
+    description = models.TextField(blank=True)
+    source_hash = models.CharField(max_length=64, help_text="Hash of the source text it was translated from; stale once the source changes")
+
+    class Meta:
+        constraints = [
+            # One per quiz and locale; also serves the per-locale lookups
+            models.UniqueConstraint(fields=['quiz', 'locale'], name='unique_quiz_translation'),
+        ]
+
+    def __str__(self):
+        return f"{self.title} [{self.locale}]"
+
+class QuestionTranslation(BaseModel):
+    """A question and its options in another locale; options keep their positions, so the answer key still applies"""
+    question = models.ForeignKey(Question, related_name='translations', on_delete=models.CASCADE, db_index=False)
+    locale = models.CharField(max_length=10)
+    text = models.TextField()
+    # Translations can run longer than the source's 255 characters
+    option1 = models.TextField()
+    option2 = models.TextField()
+    option3 = models.TextField()
+    option4 = models.TextField()
+    source_hash = models.CharField(max_length=64, help_text="Hash of the source text it was translated from; stale once the source changes")
+
+    class Meta:
+        constraints = [
+            # One per question and locale; also serves the per-locale prefetch of a page's questions
+            models.UniqueConstraint(fields=['question', 'locale'], name='unique_question_translation'),
+        ]
+
+    def __str__(self):
+        return f"{self.text[:50]} [{self.locale}]"
+
 class QuizHistory(BaseModel):
     # Use string reference to avoid circular dependency
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quiz_histories')
@@ -132,11 +360,18 @@ class QuizHistory(BaseModel):
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     selected_difficulty = models.CharField(max_length=1, choices=Quiz.DIFFICULTY_CHOICES, default='M')
+    seed = models.BigIntegerField(null=True, blank=True, help_text="Seed of this attempt's question draw and option order (see myapp.utils.question_bank)")
+    options_shuffled = models.BooleanField(default=False)
+    drawn_ids = models.JSONField(null=True, blank=True, editable=False, help_text="Ids of the questions drawn for this attempt, in serving order; fixed at start")
+    result_snapshot = models.JSONField(null=True, blank=True, editable=False, help_text="Graded questions as shown in the attempt, written at grading (see myapp.utils.attempts)")
+    pending_answers = models.JSONField(null=True, blank=True, editable=False, help_text="Answers synced before submission: {question id: [shown letter, seconds, client sequence]}")
+    live_session = models.ForeignKey('LiveSession', on_delete=models.SET_NULL, null=True, blank=True, related_name='attempts')
 
     class Meta:
         indexes = [
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['quiz', '-score']),
+            models.Index(fields=['updated_at', 'id']),  # incremental exports (myapp.utils.exports)
         ]
 
     @property
@@ -165,36 +400,275 @@ class UserAnswer(BaseModel):
         ("D", "Option D"),
     ]
 
-    history = models.ForeignKey(QuizHistory, related_name='user_answers', on_delete=models.CASCADE)
+    history = models.ForeignKey(QuizHistory, related_name='user_answers', on_delete=models.CASCADE, db_index=False)
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     selected_option = models.CharField(choices=ANSWER_CHOICES, max_length=1)
     is_correct = models.BooleanField(default=False)
     time_taken = models.FloatField(default=0, help_text="Time taken to answer in seconds")
 
+    class Meta:
+        constraints = [
+            # One answer per question per attempt; also the index for an attempt's answers
+            models.UniqueConstraint(fields=['history', 'question'], name='unique_answer_per_question'),
+        ]
+        indexes = [
+            # Incremental exports page through changed rows in this order
+            models.Index(fields=['updated_at', 'id']),
+        ]
+
     def __str__(self):
         return f"{self.history.user.username} - {self.question.text[:50]}"
 
+class ArchivedAttempt(models.Model):
+    """
+    The answers of an archived attempt packed into one row, replacing its UserAnswer rows
+    (see myapp.utils.archive). No BaseModel timestamps: the attempt has its own.
+    """
+    history = models.OneToOneField(QuizHistory, on_delete=models.CASCADE, primary_key=True, related_name='archive')
+    answer_count = models.PositiveIntegerField()
+    answers = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, help_text="Last archived or re-graded")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'history']),  # incremental exports (myapp.utils.exports)
+        ]
+
+    def __str__(self):
+        return f"Archive of attempt {self.history_id} ({self.answer_count} answers)"
+
+class ExportMark(BaseModel):
+    """High-water mark of an incremental export (see myapp.utils.exports): rows up to (mark, last_id) are out"""
+    name = models.CharField(max_length=50, unique=True)
+    mark = models.DateTimeField(null=True, blank=True, help_text="updated_at of the last exported row")
+    last_id = models.BigIntegerField(default=0, help_text="id of the last exported row, breaking updated_at ties")
+    rows_exported = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} up to {self.mark}"
+
+class LiveSession(BaseModel):
+    """A hosted, live-paced run of a quiz; play state lives in memory (see myapp.utils.live)"""
+    STATUS_LOBBY = 'lobby'
+    STATUS_RUNNING = 'running'
+    STATUS_FINISHED = 'finished'
+    STATUS_CHOICES = [
+        (STATUS_LOBBY, 'Lobby'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_FINISHED, 'Finished'),
+    ]
+
+    code = models.CharField(max_length=8, unique=True, help_text="Join code participants enter")
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='live_sessions')
+    host = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='hosted_live_sessions')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_LOBBY)
+    participant_count = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Live {self.code} - {self.quiz.title}"
+
+class QuizRecommendation(BaseModel):
+    """A precomputed dashboard suggestion for one user (see myapp.utils.recommendations)"""
+    KIND_NEXT_QUIZ = 'next'
+    KIND_WEAK_TOPIC = 'weak'
+    KIND_CHOICES = [
+        (KIND_NEXT_QUIZ, 'Next quiz'),
+        (KIND_WEAK_TOPIC, 'Weak topic'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quiz_recommendations')
+    kind = models.CharField(max_length=4, choices=KIND_CHOICES)
+    rank = models.PositiveSmallIntegerField()
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    subcategory = models.ForeignKey(SubCategory, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    score = models.FloatField(default=0)
+    reason = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        constraints = [
+            # Also the index the dashboard reads through
+            models.UniqueConstraint(fields=['user', 'kind', 'rank'], name='unique_recommendation_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.kind} #{self.rank}"
+
+class ReviewState(BaseModel):
+    """Spaced-repetition (SM-2) schedule of one question for one user, updated as answers are graded"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='review_states')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='review_states')
+    repetitions = models.PositiveIntegerField(default=0, help_text="Correct reviews in a row")
+    interval_days = models.PositiveIntegerField(default=0)
+    ease = models.FloatField(default=2.5)
+    lapses = models.PositiveIntegerField(default=0, help_text="Times the question was forgotten")
+    due_at = models.DateTimeField()
+    last_reviewed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'question'], name='unique_review_state'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'due_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - question {self.question_id} due {self.due_at:%Y-%m-%d}"
+
+class PromptTemplate(BaseModel):
+    """
+    A versioned prompt template, referenced from AIGenerationLog. The active versions of a
+    name are A/B variants sharing its traffic by weight (see myapp.utils.prompts).
+    """
+    name = models.CharField(max_length=50, blank=True, db_index=True, help_text="Registry name, e.g. 'quiz'; blank for legacy rows")
+    version = models.PositiveIntegerField(default=1, editable=False)
+    variant = models.CharField(max_length=50, blank=True, help_text="Short label for reports, e.g. 'compact'")
+    content_hash = models.CharField(max_length=64, unique=True, editable=False, help_text="SHA-256 of body")
+    body = models.TextField()
+    weight = models.PositiveIntegerField(default=100, help_text="Share of the name's traffic relative to its other active variants")
+    is_active = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'version'], condition=~models.Q(name=''), name='unique_prompt_version'),
+        ]
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+        super().clean()
+        content_hash = hashlib.sha256(self.body.encode()).hexdigest()
+        if PromptTemplate.objects.filter(content_hash=content_hash).exclude(pk=self.pk).exists():
+            raise ValidationError({'body': "A template with this exact body already exists."})
+
+    def save(self, *args, **kwargs):
+        self.content_hash = hashlib.sha256(self.body.encode()).hexdigest()
+        if self._state.adding and self.name:
+            latest = PromptTemplate.objects.filter(name=self.name).aggregate(models.Max('version'))['version__max']
+            self.version = (latest or 0) + 1
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        if self.name:
+            return f"{self.name} v{self.version}" + (f" ({self.variant})" if self.variant else "")
+        return f"Prompt {self.content_hash[:12]}"
+
 class AIGenerationLog(BaseModel):
     """Track AI-generated content for analytics"""
+    KIND_CHOICES = [
+        ('quiz', 'Quiz generation'),
+        ('chat', 'Chatbot'),
+        ('explanation', 'Answer explanation'),
+        ('translation', 'Content translation'),
+    ]
+
+    kind = models.CharField(max_length=12, choices=KIND_CHOICES, default='quiz')
     category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
     subcategory = models.ForeignKey(SubCategory, on_delete=models.CASCADE, null=True, blank=True)
     difficulty = models.CharField(max_length=1, choices=Quiz.DIFFICULTY_CHOICES, default='M')
+    questions_requested = models.PositiveIntegerField(default=0)
     questions_generated = models.PositiveIntegerField(default=0)
     # Use string reference to avoid circular dependency
     generated_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
-    prompt_used = models.TextField(help_text="The prompt used for AI generation")
+    prompt_template = models.ForeignKey(PromptTemplate, on_delete=models.SET_NULL, null=True, blank=True)
+    prompt_used = models.TextField(blank=True, help_text="Legacy full prompt text; new rows reference prompt_template")
+    tokens_in = models.PositiveIntegerField(default=0, help_text="Prompt tokens billed")
+    tokens_out = models.PositiveIntegerField(default=0, help_text="Output tokens billed")
+    latency_ms = models.PositiveIntegerField(default=0, help_text="Wall time of the LLM call in milliseconds")
+
+    class Meta:
+        indexes = [
+            # Today's usage for the LLM budget, and rollup/retention by date
+            models.Index(fields=['created_at']),
+        ]
+
+    @property
+    def parse_yield(self):
+        """Share of requested questions that parsed into usable questions"""
+        if self.questions_requested:
+            return self.questions_generated / self.questions_requested
+        return None
 
     def __str__(self):
         return f"AI Generation - {self.category} - {self.difficulty}"
 
-# ---------------- Signals for Profile Creation ----------------
+class AIGenerationRollup(models.Model):
+    """Daily AIGenerationLog totals per kind x category x difficulty x prompt template, rebuilt by `rollup_ai_logs`"""
+    day = models.DateField()
+    kind = models.CharField(max_length=12, choices=AIGenerationLog.KIND_CHOICES)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    difficulty = models.CharField(max_length=1, choices=Quiz.DIFFICULTY_CHOICES)
+    calls = models.PositiveIntegerField(default=0)
+    questions_requested = models.PositiveIntegerField(default=0)
+    questions_generated = models.PositiveIntegerField(default=0)
+    tokens_in = models.PositiveBigIntegerField(default=0)
+    tokens_out = models.PositiveBigIntegerField(default=0)
+    latency_ms_total = models.PositiveBigIntegerField(default=0)
+    latency_ms_max = models.PositiveIntegerField(default=0)
+    prompt_template = models.ForeignKey(PromptTemplate, related_name='rollups', on_delete=models.SET_NULL, null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day', 'kind']),
+        ]
+
+    @property
+    def avg_latency_ms(self):
+        return self.latency_ms_total / self.calls if self.calls else 0
+
+    @property
+    def parse_yield(self):
+        if self.questions_requested:
+            return self.questions_generated / self.questions_requested
+        return None
+
+    def __str__(self):
+        return f"{self.day} {self.kind} {self.category} {self.difficulty}"
+
+class ChatSession(BaseModel):
+    """Server-side chatbot conversation; older turns are folded into `summary`"""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chat_sessions')
+    summary = models.TextField(blank=True, help_text="Rolling summary of turns outside the context window")
+    summarized_upto = models.PositiveBigIntegerField(default=0, help_text="Id of the last message folded into the summary")
+
+    def __str__(self):
+        return f"Chat {self.id} - {self.user}"
+
+class ChatMessage(BaseModel):
+    ROLE_CHOICES = [
+        ('user', 'User'),
+        ('model', 'Assistant'),
+    ]
+
+    session = models.ForeignKey(ChatSession, related_name='messages', on_delete=models.CASCADE)
+    role = models.CharField(max_length=5, choices=ROLE_CHOICES)
+    content = models.TextField()
+    tokens = models.PositiveIntegerField(default=0, help_text="Estimated token count of content")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['session', '-id']),
+        ]
+
+    def __str__(self):
+        return f"{self.role}: {self.content[:50]}"
+
+class QuizActivitySummary(BaseModel):
+    """Precomputed digest of a user's recent QuizHistory, refreshed at grading time for the chatbot"""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='quiz_activity_summary')
+    text = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Quiz activity - {self.user}"
+
+# Profile creation signals live in myapp/signals.py
 
-@receiver(post_save, sender=CustomUser)
-def create_user_profile(sender, instance, created, **kwargs):
-    if created:
-        Profile.objects.create(user=instance)
+# ---------------- Question bank cache ----------------
 
-@receiver(post_save, sender=CustomUser)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
\ No newline at end of file
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def reset_quiz_question_ids(sender, instance, **kwargs):
+    # bulk_create skips signals; it is only used for brand-new quizzes, whose cache is still empty
+    Quiz.objects.filter(pk=instance.quiz_id, question_ids__isnull=False).update(question_ids=None)
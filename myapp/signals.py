@@ -1,13 +1,56 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in
 from django.db.models.signals import post_save
-from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Profile
 
-@receiver(post_save, sender=User)
+from .models import Category, CustomUser, Profile, SubCategory, Topic
+from myapp.utils import writes
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    instance.profile.save()
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def save_user_profile(sender, instance, created, update_fields=None, **kwargs):
+    # Only a profile loaded and edited through user.profile needs saving with its user, and
+    # dirty-field tracking then writes just the columns that changed. Targeted user saves
+    # (update_fields) never carry profile edits.
+    if created or update_fields is not None:
+        return
+    if CustomUser.profile.is_cached(instance):
+        instance.profile.save()
+
+
+# Categories and subcategories are the first two levels of the topic tree (see Topic)
+@receiver(post_save, sender=Category)
+def sync_category_topic(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    topic = None if created else Topic.objects.filter(category=instance).first()
+    if topic is None:
+        Topic.objects.create(name=instance.name, category=instance)
+    elif topic.name != instance.name:
+        topic.name = instance.name
+        topic.save(update_fields=['name', 'updated_at'])
+
+
+@receiver(post_save, sender=SubCategory)
+def sync_subcategory_topic(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    parent = Topic.objects.filter(category_id=instance.category_id).first()
+    topic = None if created else Topic.objects.filter(subcategory=instance).first()
+    if topic is None:
+        Topic.objects.create(name=instance.name, parent=parent, subcategory=instance)
+    elif (topic.name, topic.parent_id) != (instance.name, parent and parent.pk):
+        topic.name, topic.parent = instance.name, parent
+        topic.save()
+
+
+if settings.LAST_LOGIN_DEFERRED:
+    # Replace django.contrib.auth's per-login UPDATE with batched writes
+    user_logged_in.disconnect(dispatch_uid='update_last_login')
+    user_logged_in.connect(writes.defer_last_login, dispatch_uid='defer_last_login')
@@ -0,0 +1,106 @@
+// ---------------- Performance Chart ----------------
+const chartCanvas = document.getElementById('performanceChart');
+const correctAnswers = Number(chartCanvas.dataset.correct);
+const wrongAnswers = Number(chartCanvas.dataset.wrong);
+const skipped = Number(chartCanvas.dataset.skipped);
+
+new Chart(chartCanvas.getContext('2d'), {
+    type: 'pie',
+    data: {
+        labels: ['Correct', 'Wrong', 'Skipped'],
+        datasets: [{
+            data: [correctAnswers, wrongAnswers, skipped],
+            backgroundColor: ['#16a34a', '#dc2626', '#facc15'],
+            borderWidth: 1
+        }]
+    },
+    options: {
+        responsive: true,
+        plugins: {
+            legend: { position: 'bottom' },
+            tooltip: { enabled: true }
+        }
+    }
+});
+
+// ---------------- Chatbot ----------------
+const chatbotBtn = document.getElementById("chatbotBtn");
+const chatContainer = document.getElementById("chatContainer");
+const closeChat = document.getElementById("closeChat");
+const sendBtn = document.getElementById("sendBtn");
+const chatInput = document.getElementById("chatInput");
+const chatMessages = document.getElementById("chatMessages");
+const chatbotUrl = document.getElementById("chatbot").dataset.url;
+let chatSessionId = null;
+
+chatbotBtn.addEventListener("click", () => {
+    chatContainer.classList.toggle("hidden");
+});
+closeChat.addEventListener("click", () => {
+    chatContainer.classList.add("hidden");
+});
+
+function sendMessage() {
+    const msg = chatInput.value.trim();
+    if (!msg) return;
+    const userDiv = document.createElement("div");
+    userDiv.className = "bg-gray-100 text-gray-800 p-2 rounded-lg max-w-[75%] ml-auto";
+    userDiv.innerText = msg;
+    chatMessages.appendChild(userDiv);
+    chatInput.value = "";
+    chatMessages.scrollTop = chatMessages.scrollHeight;
+
+    const botDiv = document.createElement("div");
+    botDiv.className = "bg-red-100 text-red-800 p-2 rounded-lg max-w-[75%]";
+    botDiv.innerText = "🤖 ";
+    chatMessages.appendChild(botDiv);
+
+    fetch(chatbotUrl, {
+        method: "POST",
+        headers: {
+            "Content-Type": "application/json",
+            "X-CSRFToken": getCookie("csrftoken")
+        },
+        body: JSON.stringify({ message: msg, session_id: chatSessionId })
+    })
+    .then(async res => {
+        // Errors come back as JSON, replies as a plain-text stream
+        if ((res.headers.get("Content-Type") || "").startsWith("application/json")) {
+            const data = await res.json();
+            botDiv.innerText = "🤖 " + (data.reply || data.error || "Sorry, I couldn’t respond.");
+            return;
+        }
+        chatSessionId = res.headers.get("X-Chat-Session") || chatSessionId;
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            botDiv.innerText += decoder.decode(value, { stream: true });
+            chatMessages.scrollTop = chatMessages.scrollHeight;
+        }
+    })
+    .catch(err => {
+        botDiv.innerText = "⚠️ Error: " + err.message;
+    });
+}
+
+sendBtn.addEventListener("click", sendMessage);
+chatInput.addEventListener("keypress", e => {
+    if (e.key === "Enter") sendMessage();
+});
+
+function getCookie(name) {
+    let cookieValue = null;
+    if (document.cookie && document.cookie !== "") {
+        const cookies = document.cookie.split(";");
+        for (let cookie of cookies) {
+            cookie = cookie.trim();
+            if (cookie.startsWith(name + "=")) {
+                cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
+                break;
+            }
+        }
+    }
+    return cookieValue;
+}
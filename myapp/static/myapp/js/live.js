@@ -0,0 +1,110 @@
+// Live session page: one WebSocket per tab, reconnecting after drops.
+// The server sends JSON messages: question, answered, reveal, leaderboard, result, ended.
+
+var root = document.getElementById('live');
+var isHost = root.dataset.host === '1';
+var statusBox = document.getElementById('live-status');
+var questionBox = document.getElementById('live-question');
+var questionText = document.getElementById('live-question-text');
+var optionsBox = document.getElementById('live-options');
+var participantsSpan = document.getElementById('live-participants');
+var leaderboard = document.getElementById('live-leaderboard');
+
+var socket = null;
+var currentQuestion = null;
+var ended = false;
+
+function connect() {
+    var scheme = location.protocol === 'https:' ? 'wss://' : 'ws://';
+    socket = new WebSocket(scheme + location.host + root.dataset.socketPath);
+    socket.onmessage = function (event) { handle(JSON.parse(event.data)); };
+    socket.onclose = function (event) {
+        if (ended || event.code === 4403) {
+            if (!ended) statusBox.textContent = 'This session is not available.';
+            return;
+        }
+        statusBox.textContent = 'Reconnecting…';
+        setTimeout(connect, 1000 + Math.random() * 2000);
+    };
+}
+
+function send(action) {
+    if (socket && socket.readyState === WebSocket.OPEN) socket.send(JSON.stringify(action));
+}
+
+function renderBoard(top) {
+    leaderboard.innerHTML = '';
+    top.forEach(function (row) {
+        var item = document.createElement('li');
+        item.textContent = row[0] + ' — ' + row[1];
+        leaderboard.appendChild(item);
+    });
+}
+
+function markOption(letter, className) {
+    var button = optionsBox.querySelector('[data-option="' + letter + '"]');
+    if (button) button.classList.add(className);
+}
+
+function showQuestion(message) {
+    currentQuestion = message.question;
+    questionBox.hidden = false;
+    statusBox.textContent = 'Question ' + (message.index + 1) + ' of ' + message.total;
+    questionText.textContent = message.text;
+    optionsBox.innerHTML = '';
+    message.options.forEach(function (option) {
+        var button = document.createElement('button');
+        button.type = 'button';
+        button.className = 'option';
+        button.dataset.option = option[0];
+        button.textContent = option[0] + '. ' + option[1];
+        button.disabled = isHost || message.answered;
+        button.onclick = function () {
+            send({type: 'answer', question: currentQuestion, option: option[0]});
+            optionsBox.querySelectorAll('button').forEach(function (b) { b.disabled = true; });
+        };
+        optionsBox.appendChild(button);
+    });
+}
+
+function handle(message) {
+    switch (message.type) {
+    case 'question':
+        showQuestion(message);
+        break;
+    case 'answered':
+        markOption(message.option, 'selected');
+        break;
+    case 'reveal':
+        optionsBox.querySelectorAll('button').forEach(function (b) { b.disabled = true; });
+        markOption(message.correct, 'correct');
+        statusBox.textContent = message.answered + ' answered';
+        break;
+    case 'leaderboard':
+        participantsSpan.textContent = message.participants;
+        renderBoard(message.top);
+        break;
+    case 'result':
+        statusBox.textContent = 'You placed #' + message.rank + ' with ' + message.score + '/' + message.total + '.';
+        if (message.attempt) {
+            var link = document.createElement('a');
+            link.href = '/quiz/results/' + message.attempt + '/';
+            link.textContent = ' See your results';
+            statusBox.appendChild(link);
+        }
+        break;
+    case 'ended':
+        ended = true;
+        questionBox.hidden = true;
+        participantsSpan.textContent = message.participants;
+        renderBoard(message.top);
+        if (isHost) statusBox.textContent = 'Session ended.';
+        break;
+    }
+}
+
+document.querySelectorAll('[data-action]').forEach(function (button) {
+    button.onclick = function () { send({type: button.dataset.action}); };
+});
+
+connect();
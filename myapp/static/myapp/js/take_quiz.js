@@ -0,0 +1,226 @@
+var totalQuestions = document.querySelectorAll('.question-panel').length;
+
+// Always 1 min per question
+var timeLimit = totalQuestions * 60;
+
+var current = 0;
+var answers = {};
+var timeRemaining = timeLimit;
+var timer;
+var shownAt = Date.now();
+
+var prevBtn = document.getElementById('prevBtn');
+var nextBtn = document.getElementById('nextBtn');
+var submitBtn = document.getElementById('submitBtn');
+var progress = document.getElementById('progress');
+var currentQuestionSpan = document.getElementById('current-question');
+var totalQuestionsSpan = document.getElementById('total-questions');
+var timeDisplay = document.getElementById('time-display');
+var syncStatus = document.getElementById('sync-status');
+
+var quizForm = document.getElementById('quiz-form');
+var formAnswers = document.getElementById('form-answers');
+var formTimeTaken = document.getElementById('form-time-taken');
+
+// Offline-tolerant attempts: answers are kept in localStorage and uploaded in one batch on
+// submit (plus a backup when the tab is hidden), to api/v1/attempts/<id>/sync/. The server
+// merges batches idempotently, so failed uploads are simply retried until one succeeds.
+// Without a sync URL (the review page) the form is posted as before.
+var container = document.querySelector('.quiz-container');
+var syncUrl = container.dataset.syncUrl;
+var storageKey = syncUrl ? 'quiz-attempt-' + container.dataset.attempt : null;
+var state = {answers: {}, unsynced: {}, deadline: null};
+var submitting = false;
+var retryDelay = 2000;
+
+function loadState() {
+    try {
+        var saved = JSON.parse(localStorage.getItem(storageKey));
+        if (saved) state = saved;
+    } catch (e) {}
+    // Answers the server already holds (synced from this or another device)
+    var serverAnswers = document.getElementById('pending-answers');
+    var pending = serverAnswers ? JSON.parse(serverAnswers.textContent) || {} : {};
+    Object.keys(pending).forEach(function(questionId){
+        var known = state.answers[questionId];
+        if (!known || known.s < pending[questionId][2]) {
+            state.answers[questionId] = {o: pending[questionId][0], t: pending[questionId][1], s: pending[questionId][2]};
+        }
+    });
+    if (!state.deadline) state.deadline = Date.now() + timeLimit * 1000;
+    timeRemaining = Math.max(0, Math.ceil((state.deadline - Date.now()) / 1000));
+
+    Object.keys(state.answers).forEach(function(questionId){
+        answers[questionId] = { 'selected_option': state.answers[questionId].o };
+        var radio = document.querySelector('input[name="question-' + questionId + '"][value="' + state.answers[questionId].o + '"]');
+        if (radio) radio.checked = true;
+    });
+}
+
+function storeState() {
+    try { localStorage.setItem(storageKey, JSON.stringify(state)); } catch (e) {}
+}
+
+function showSyncStatus(message) {
+    if (!syncStatus) return;
+    syncStatus.hidden = !message;
+    syncStatus.textContent = message || '';
+}
+
+function gzipBody(text) {
+    if (!window.CompressionStream) return Promise.resolve({body: text, gzip: false});
+    var stream = new Blob([text]).stream().pipeThrough(new CompressionStream('gzip'));
+    return new Response(stream).arrayBuffer().then(function(buffer){ return {body: buffer, gzip: true}; });
+}
+
+function syncAnswers(questionIds, submit, keepalive) {
+    var batch = questionIds.map(function(questionId){
+        var answer = state.answers[questionId];
+        return {q: Number(questionId), o: answer.o, t: answer.t, s: answer.s};
+    });
+    return gzipBody(JSON.stringify({answers: batch, submit: submit})).then(function(encoded){
+        var headers = {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': quizForm.querySelector('[name=csrfmiddlewaretoken]').value
+        };
+        if (encoded.gzip) headers['Content-Encoding'] = 'gzip';
+        return fetch(syncUrl, {method: 'POST', headers: headers, body: encoded.body, credentials: 'same-origin', keepalive: !!keepalive});
+    }).then(function(response){
+        if (response.ok) {
+            batch.forEach(function(item){
+                if (state.unsynced[item.q] && state.answers[item.q].s <= item.s) delete state.unsynced[item.q];
+            });
+            storeState();
+        }
+        return response;
+    });
+}
+
+function backupAnswers() {
+    var questionIds = Object.keys(state.unsynced);
+    if (questionIds.length && !submitting) syncAnswers(questionIds, false, true).catch(function(){});
+}
+
+function recordAnswer(radio) {
+    var questionId = radio.name.replace('question-','');
+    answers[questionId] = { 'selected_option': radio.value };
+    if (!syncUrl) return;
+    state.answers[questionId] = {o: radio.value, t: Math.round((Date.now() - shownAt) / 100) / 10, s: Date.now()};
+    state.unsynced[questionId] = true;
+    storeState();
+}
+
+function updateTimeDisplay() {
+    var minutes = Math.floor(timeRemaining / 60);
+    var seconds = timeRemaining % 60;
+    timeDisplay.textContent = minutes + ":" + (seconds < 10 ? "0" : "") + seconds;
+}
+
+function startTimer() {
+    updateTimeDisplay();
+    if(timeRemaining <= 0){
+        submitQuiz();
+        return;
+    }
+    timer = setInterval(function(){
+        timeRemaining--;
+        updateTimeDisplay();
+        if(timeRemaining <= 0){
+            clearInterval(timer);
+            submitQuiz();
+        }
+    }, 1000);
+}
+
+function showQuestion(index){
+    if(index < 0 || index >= totalQuestions) return;
+
+    document.querySelectorAll('.question-panel').forEach(function(panel){
+        panel.style.display = 'none';
+    });
+
+    var currentPanel = document.querySelector('.question-panel[data-index="'+index+'"]');
+    if(currentPanel) currentPanel.style.display = 'block';
+
+    currentQuestionSpan.textContent = index + 1;
+    totalQuestionsSpan.textContent = totalQuestions;
+
+    progress.style.width = ((index + 1) / totalQuestions) * 100 + '%';
+
+    prevBtn.disabled = index === 0;
+    nextBtn.style.display = index === totalQuestions - 1 ? 'none':'inline-block';
+    submitBtn.style.display = index === totalQuestions - 1 ? 'inline-block':'none';
+
+    current = index;
+    shownAt = Date.now();
+}
+
+function saveAnswer(){
+    var currentPanel = document.querySelector('.question-panel[data-index="'+current+'"]');
+    if(!currentPanel) return;
+
+    var selectedRadio = currentPanel.querySelector('input[type="radio"]:checked');
+    if(selectedRadio){
+        var questionId = selectedRadio.name.replace('question-','');
+        answers[questionId] = { 'selected_option': selectedRadio.value };
+    }
+}
+
+function nextQuestion(){ saveAnswer(); showQuestion(current + 1); }
+function prevQuestion(){ saveAnswer(); showQuestion(current - 1); }
+
+function submitViaForm(){
+    formAnswers.value = JSON.stringify(answers);
+    formTimeTaken.value = timeLimit - timeRemaining;
+    quizForm.submit();
+}
+
+function submitQuiz(){
+    saveAnswer();
+    clearInterval(timer);
+    if (!syncUrl || !window.fetch) {
+        submitViaForm();
+        return;
+    }
+    if (submitting) return;
+    submitting = true;
+    submitBtn.disabled = true;
+    showSyncStatus('Submitting…');
+    syncAnswers(Object.keys(state.answers), true).then(function(response){
+        if (response.ok) {
+            localStorage.removeItem(storageKey);
+            window.location.href = container.dataset.resultsUrl;
+        } else if (response.status < 500) {
+            submitViaForm();  // not retryable; let the regular submit report it
+        } else {
+            throw new Error('HTTP ' + response.status);
+        }
+    }).catch(function(){
+        // Offline or server trouble: answers stay on this device and are retried
+        submitting = false;
+        showSyncStatus('You appear to be offline. Your answers are saved on this device and will be submitted automatically.');
+        setTimeout(submitQuiz, retryDelay);
+        retryDelay = Math.min(retryDelay * 2, 30000);
+    });
+}
+
+document.addEventListener("DOMContentLoaded", function(){
+    if (syncUrl) {
+        loadState();
+        document.querySelectorAll('.question-panel input[type="radio"]').forEach(function(radio){
+            radio.addEventListener('change', function(){ recordAnswer(radio); });
+        });
+        document.addEventListener('visibilitychange', function(){
+            if (document.visibilityState === 'hidden') backupAnswers();
+        });
+        window.addEventListener('online', function(){
+            if (submitting || timeRemaining <= 0) { retryDelay = 2000; submitting = false; submitQuiz(); }
+        });
+        if ('serviceWorker' in navigator) navigator.serviceWorker.register(container.dataset.serviceWorker);
+    }
+    showQuestion(0);
+    startTimer();
+    prevBtn.addEventListener("click", prevQuestion);
+    nextBtn.addEventListener("click", nextQuestion);
+    submitBtn.addEventListener("click", submitQuiz);
+});
@@ -0,0 +1,48 @@
+// Keeps quiz pages working through flaky connections (see myapp/static/myapp/js/take_quiz.js).
+// Quiz pages: network first, falling back to the last copy so a reload offline still shows
+// the attempt. Static files: served from the cache and refreshed in the background.
+var CACHE = 'quiz-{{ version }}';
+var PRECACHE = {{ precache|safe }};
+var STATIC_PREFIX = '{{ static_prefix|escapejs }}';
+
+self.addEventListener('install', function(event){
+    event.waitUntil(caches.open(CACHE).then(function(cache){ return cache.addAll(PRECACHE); }));
+    self.skipWaiting();
+});
+
+self.addEventListener('activate', function(event){
+    event.waitUntil(caches.keys().then(function(names){
+        return Promise.all(names.filter(function(name){
+            return name.indexOf('quiz-') === 0 && name !== CACHE;
+        }).map(function(name){ return caches.delete(name); }));
+    }).then(function(){ return self.clients.claim(); }));
+});
+
+self.addEventListener('fetch', function(event){
+    var request = event.request;
+    if (request.method !== 'GET') return;
+    var url = new URL(request.url);
+    if (url.origin !== self.location.origin) return;
+
+    if (request.mode === 'navigate' && url.pathname.indexOf('/quiz/take/') === 0) {
+        event.respondWith(fetch(request).then(function(response){
+            if (response.ok) {
+                var copy = response.clone();
+                caches.open(CACHE).then(function(cache){ cache.put(request, copy); });
+            }
+            return response;
+        }).catch(function(){
+            return caches.match(request).then(function(cached){ return cached || Response.error(); });
+        }));
+    } else if (url.pathname.indexOf(STATIC_PREFIX) === 0) {
+        event.respondWith(caches.open(CACHE).then(function(cache){
+            return cache.match(request).then(function(cached){
+                var refresh = fetch(request).then(function(response){
+                    if (response.ok) cache.put(request, response.clone());
+                    return response;
+                });
+                return cached || refresh;
+            });
+        }));
+    }
+});
@@ -1,3 +1,1167 @@
-from django.test import TestCase
+import asyncio
+import csv
+import glob
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+from io import BytesIO, StringIO
+from unittest import mock
+from datetime import datetime, timedelta
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage, storages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.paginator import EmptyPage
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from .models import (
+    AIGenerationLog, AIGenerationRollup, Category, ChatMessage, ChatSession, LiveSession, Profile, PromptTemplate,
+    Question, QuestionTranslation, Quiz, QuizHistory, QuizRecommendation, ReviewState, SubCategory, Topic, UserAnswer,
+)
+from myapp import views
+from myapp.management.commands.loadtest_llm import FAKE_QUIZ_TEXT, _FakeModel, _FakeResponse
+from myapp.utils import (
+    archive, attempts, avatars, background, chat, explanations, exports, live, prompts, query_audit, question_bank,
+    ratelimit, recommendations, reviews, static_assets, topics, translations, warmup, writes,
+)
+from myapp.utils.circuit_breaker import CircuitBreaker
+from myapp.utils.gemini_helper import gemini_generator
+from myapp.utils.pagination import EstimatedCountPaginator
+
+
+class GenerateQuizViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='generator', email='generator@example.com')
+        cls.category = Category.objects.create(name='Science')
+        cls.subcategory = SubCategory.objects.create(category=cls.category, name='Physics')
+
+    def setUp(self):
+        real_model = gemini_generator.model
+        gemini_generator.model = _FakeModel(0, FAKE_QUIZ_TEXT * 3)
+        self.addCleanup(setattr, gemini_generator, 'model', real_model)
+        self.client.force_login(self.user)
+
+    def test_generated_questions_are_saved_as_a_quiz(self):
+        response = self.client.post(reverse('generate_quiz'), {
+            'category_id': self.category.id, 'subcategory_id': self.subcategory.id, 'num_questions': 3,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        quiz = Quiz.objects.get(pk=response.json()['quiz_id'])
+        self.assertEqual((quiz.is_ai_generated, quiz.subcategory_id), (True, self.subcategory.id))
+        self.assertEqual(quiz.questions.count(), 3)
+
+    def test_errors_are_logged(self):
+        with self.assertLogs('myapp.views', 'ERROR'):
+            response = self.client.post(reverse('generate_quiz'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 500)
+
+
+class ChatMemoryTests(TestCase):
+    async def test_every_message_outside_the_window_is_summarized(self):
+        user = await get_user_model().objects.acreate(username='talker', email='talker@example.com')
+        session = await ChatSession.objects.acreate(user=user)
+        messages = await ChatMessage.objects.abulk_create([
+            ChatMessage(session=session, role='user', content=f"message {i}", tokens=10) for i in range(130)
+        ])
+
+        class Summarizer:
+            transcripts = []
+
+            async def summarize_text_async(self, prompt, user_id, template_id):
+                self.transcripts.append(prompt)
+                return f"summary {len(self.transcripts)}"
+
+        with self.settings(CHAT_CONTEXT_TOKENS=100):
+            window = await chat.load_window(session)
+        self.assertEqual([row['content'] for row in window], [f"message {i}" for i in range(120, 130)])
+        await chat.summarize_overflow(session, window, Summarizer())
+        # 120 older messages, more than the 50 the window read sees, in three calls
+        self.assertEqual(len(Summarizer.transcripts), 3)
+        self.assertIn("user: message 0\n", Summarizer.transcripts[0])
+        await session.arefresh_from_db()
+        self.assertEqual((session.summary, session.summarized_upto), ("summary 3", messages[119].id))
+
+    async def test_summary_runs_after_the_reply_stream_ends(self):
+        user = await get_user_model().objects.acreate(username='streamer', email='streamer@example.com')
+        session = await ChatSession.objects.acreate(user=user)
+
+        async def reply(contents, user_id, template_id):
+            yield "Hello"
+
+        with mock.patch.object(gemini_generator, 'stream_chat_response', reply), \
+                mock.patch.object(background, 'submit') as submit, \
+                mock.patch.object(chat, 'summarize_overflow') as summarize:
+            chunks = [chunk async for chunk in views._stream_chat_reply(session, [], [{'id': 1}], None)]
+        self.assertEqual(chunks, ["Hello"])
+        summarize.assert_not_called()  # not inline: queued
+        self.assertEqual(submit.call_args.args[:3], (chat._summarize_overflow_job, session, [{'id': 1}]))
+        self.assertEqual(await ChatMessage.objects.filter(session=session, role='model').acount(), 1)
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='limited', email='limited@example.com')
+        self.client.force_login(self.user)
+        # Fresh buckets and no cached daily usage: user ids are reused between tests
+        ratelimit._backend = None
+        ratelimit._usage_cache.update(expires=0)
+        self.addCleanup(setattr, ratelimit, '_backend', None)
+        self.addCleanup(ratelimit._usage_cache.update, expires=0)
+
+    def chat(self, message=''):
+        return self.client.post(reverse('chatbot_response'), {'message': message}, content_type='application/json')
+
+    @override_settings(RATE_LIMITS={'chatbot': (1, 2)})
+    def test_burst_then_429_with_retry_after(self):
+        self.assertEqual([self.chat().status_code for _ in range(2)], [200, 200])
+        response = self.chat()
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        self.assertEqual(response.json()['retry_after'], int(response['Retry-After']))
+
+    @override_settings(LLM_MAX_CONCURRENCY_PER_PROCESS=1)
+    def test_busy_when_the_process_slots_are_taken(self):
+        slot = ratelimit.llm_slots.acquire()
+        self.addCleanup(slot.release)
+        response = self.chat("hello")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '5')
+
+    @override_settings(LLM_DAILY_TOKEN_BUDGET=100)
+    def test_exhausted_daily_budget(self):
+        AIGenerationLog.objects.create(kind='chat', tokens_in=80, tokens_out=40)
+        response = self.chat("hello")
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+
+    @override_settings(
+        RATE_LIMITS={'chatbot': (1, 2)}, RATE_LIMIT_BACKEND='cache',
+        CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'test_ratelimit'}},
+    )
+    async def test_async_views_use_the_shared_cache_without_blocking(self):
+        await sync_to_async(call_command)('createcachetable', stdout=StringIO())
+        await self.async_client.aforce_login(self.user)
+        statuses = []
+        for _ in range(3):
+            response = await self.async_client.post(
+                reverse('chatbot_response'), {'message': ''}, content_type='application/json',
+            )
+            statuses.append(response.status_code)
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertIsInstance(ratelimit._backend, ratelimit.CacheBackend)
+
+    def test_shared_backend_refuses_a_per_process_cache(self):
+        with self.assertRaises(ImproperlyConfigured):
+            ratelimit.CacheBackend()
+
+
+class AIRollupTests(TestCase):
+    def test_rollup_counts_each_day_by_created_at_range(self):
+        today = timezone.localdate()
+        midnight = timezone.make_aware(datetime.combine(today, datetime.min.time()))
+        for created_at in [
+            midnight - timedelta(days=5), midnight - timedelta(seconds=1), midnight, midnight + timedelta(hours=1),
+        ]:
+            log = AIGenerationLog.objects.create(kind='chat', tokens_in=10)
+            AIGenerationLog.objects.filter(pk=log.pk).update(created_at=created_at)
+
+        with query_audit.audit() as result:
+            call_command('rollup_ai_logs', days=2, stdout=StringIO())
+        calls = dict(AIGenerationRollup.objects.values_list('day', 'calls'))
+        self.assertEqual(calls, {
+            today - timedelta(days=5): 1, today - timedelta(days=1): 1, today: 2,
+        })
+        self.assertNotIn('myapp_aigenerationlog', [scan.table for scan in result.full_scans])
+
+
+class GeminiResilienceTests(TestCase):
+    def test_breaker_opens_then_half_opens_for_one_trial(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=30)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+        breaker.opened_at -= 30
+        self.assertTrue(breaker.allow())  # the trial call
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow())  # only one at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        breaker.opened_at -= 30
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual((breaker.state, breaker.failures), (CircuitBreaker.CLOSED, 0))
+        self.assertTrue(breaker.allow())
+
+    def hedge_model(self, slow_calls):
+        """A model whose calls numbered in `slow_calls` hang; records which calls were cancelled"""
+        class Model:
+            calls, cancelled = 0, []
+
+            async def generate_content_async(self, contents, **kwargs):
+                Model.calls += 1
+                call = Model.calls
+                try:
+                    await asyncio.sleep(30 if call in slow_calls else 0)
+                except asyncio.CancelledError:
+                    Model.cancelled.append(call)
+                    raise
+                return _FakeResponse(f"call {call}")
+
+        real_model = gemini_generator.model
+        gemini_generator.model = Model()
+        self.addCleanup(setattr, gemini_generator, 'model', real_model)
+        return Model
+
+    @override_settings(GEMINI_HEDGE_REQUESTS=True, GEMINI_HEDGE_MIN_DELAY_SECONDS=0.01)
+    async def test_hedge_winner_is_returned_and_the_loser_cancelled(self):
+        model = self.hedge_model(slow_calls={1})
+        response = await gemini_generator._ahedged_call("prompt")
+        await asyncio.sleep(0.05)  # the cancellation reaches the model through wait_for
+        self.assertEqual((response.text, model.cancelled), ("call 2", [1]))
+
+    @override_settings(GEMINI_HEDGE_REQUESTS=True, GEMINI_HEDGE_MIN_DELAY_SECONDS=10)
+    async def test_cancelled_caller_cancels_the_call_in_flight(self):
+        model = self.hedge_model(slow_calls={1})
+        caller = asyncio.ensure_future(gemini_generator._ahedged_call("prompt"))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await caller
+        await asyncio.sleep(0.05)
+        self.assertEqual((model.calls, model.cancelled), (1, [1]))
+
+
+class AvatarTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        override = override_settings(MEDIA_ROOT=media, AVATAR_FORMAT='JPEG')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def upload(self, username, color='red'):
+        buffer = BytesIO()
+        Image.new('RGB', (600, 300), color).save(buffer, 'PNG')
+        user = get_user_model().objects.create_user(username=username, email=f'{username}@example.com')
+        user.avatar = SimpleUploadedFile(f'{username}.png', buffer.getvalue(), content_type='image/png')
+        user.save()
+        return user
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), default_storage.location).replace(os.sep, '/')
+            for root, _, names in os.walk(default_storage.location) for name in names
+        )
+
+    def test_identical_uploads_share_one_set_of_renditions(self):
+        first, second = self.upload('ada'), self.upload('bob')
+        for user in (first, second):
+            avatars.process_avatar(user._meta.label, user.pk)
+            user.refresh_from_db()
+        self.assertEqual(first.avatar_hash, second.avatar_hash)
+        content_hash = first.avatar_hash
+        # The raw uploads are gone; one rendition per size is left, shared by both users
+        self.assertEqual(self.stored_files(), sorted(
+            avatars.rendition_name(content_hash, size) for size in ['lg', 'md', 'sm']
+        ))
+        self.assertEqual(first.avatar.name, avatars.rendition_name(content_hash, 'lg'))
+        with Image.open(default_storage.path(avatars.rendition_name(content_hash, 'sm'))) as image:
+            self.assertEqual(image.size, (64, 64))
+
+    def test_orphans_are_deleted_but_protected_and_referenced_files_survive(self):
+        user = self.upload('cy')
+        avatars.process_avatar(user._meta.label, user.pk)
+        user.refresh_from_db()
+        for name in ['avatars/orphan.png', 'avatars/logo.png']:
+            default_storage.save(name, ContentFile(b'x'))
+
+        avatars.delete_orphans(names=['avatars/orphan.png', 'avatars/logo.png', user.avatar.name],
+                               hashes=[user.avatar_hash, 'f' * 64])
+        files = self.stored_files()
+        self.assertNotIn('avatars/orphan.png', files)
+        self.assertIn('avatars/logo.png', files)
+        self.assertEqual(len([name for name in files if user.avatar_hash in name]), 3)
+
+        # Once nothing references the hash, its renditions go too
+        get_user_model().objects.filter(pk=user.pk).update(avatar=None, avatar_hash='')
+        avatars.delete_orphans(names=[user.avatar.name], hashes=[user.avatar_hash])
+        self.assertEqual(self.stored_files(), ['avatars/logo.png'])
+
+
+class StaticAssetTests(TestCase):
+    def setUp(self):
+        source, root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, source)
+        self.addCleanup(shutil.rmtree, root)
+        os.makedirs(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'site.css'), 'w') as f:
+            f.write('body { color: black; }\n' * 50)
+        override = override_settings(STATICFILES_DIRS=[source], STATIC_ROOT=root)
+        override.enable()
+        self.addCleanup(override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        self.hashed = storages['staticfiles'].stored_name('css/site.css')
+        self.middleware = static_assets.StaticFilesMiddleware(lambda request: HttpResponse('not static'))
+
+    def get(self, name, **headers):
+        return self.middleware(RequestFactory().get('/static/' + name, headers=headers))
+
+    def test_hashed_names_are_immutable_and_gzip_is_negotiated(self):
+        self.assertRegex(self.hashed, r'^css/site\.[0-9a-f]{12}\.css$')
+        response = self.get(self.hashed, accept_encoding='br, gzip;q=0.8')
+        self.assertEqual(response['Cache-Control'], static_assets.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual((response['Content-Encoding'], response['Vary']), ('gzip', 'Accept-Encoding'))
+        self.assertEqual(gzip.decompress(response.content).decode(), 'body { color: black; }\n' * 50)
+
+        plain = self.get('css/site.css')
+        self.assertEqual(plain['Cache-Control'], 'public, max-age=60')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEqual(plain['Vary'], 'Accept-Encoding')
+        self.assertEqual(self.get('missing.css').content, b'not static')
+
+    def test_refused_encodings_are_not_sent(self):
+        for header in ['gzip;q=0', 'identity', 'GZIP; q=0.0, deflate', '*;q=0']:
+            with self.subTest(header=header):
+                self.assertFalse(self.get(self.hashed, accept_encoding=header).has_header('Content-Encoding'))
+        self.assertEqual(self.get(self.hashed, accept_encoding='*')['Content-Encoding'], 'gzip')
+
+    def test_matching_etag_gets_304(self):
+        etag = self.get(self.hashed, accept_encoding='gzip')['ETag']
+        response = self.get(self.hashed, accept_encoding='gzip', if_none_match=f'"other", {etag}')
+        self.assertEqual((response.status_code, response['ETag']), (304, etag))
+        # The gzip variant's ETag does not validate the plain body
+        self.assertEqual(self.get(self.hashed, if_none_match=etag).status_code, 200)
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='mobile', email='mobile@example.com', password='pw')
+        category = Category.objects.create(name='API')
+        cls.quiz = Quiz.objects.create(title='API quiz', category=category)
+        cls.question = Question.objects.create(quiz=cls.quiz, text="Pick A", option1='a', option2='b', option3='c',
+                                               option4='d', correct_answer='A')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.attempt, _, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        self.submit_url = reverse('api_submit_attempt', args=[self.attempt.id])
+
+    def submit(self, body, client=None):
+        return (client or self.client).post(self.submit_url, body, content_type='application/json')
+
+    def test_valid_answers_are_graded_once(self):
+        qid = str(self.question.id)
+        response = self.submit({'answers': {qid: {'selected_option': 'A', 'time_taken': 4}}})
+        self.assertEqual((response.status_code, response.json()['correct']), (200, 1))
+        self.assertEqual(self.submit({'answers': {qid: 'A'}}).status_code, 409)
+
+    def test_invalid_answers_are_refused_per_field(self):
+        qid = str(self.question.id)
+        for answer in [None, 1, ['A'], 'E', {'selected_option': 'a'}, {'selected_option': 'A', 'time_taken': 'abc'},
+                       {'time_taken': -1}, {'time_taken': True}]:
+            with self.subTest(answer=answer):
+                response = self.submit({'answers': {qid: answer}})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(list(response.json()['errors']), [qid])
+        self.assertFalse(QuizHistory.objects.filter(pk=self.attempt.pk, completed_at__isnull=False).exists())
+
+    def test_error_paths(self):
+        self.assertEqual(self.submit('{not json').status_code, 400)
+        self.assertEqual(self.submit({'answers': ['A']}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('api_quiz_detail', args=[0])).status_code, 404)
+        self.assertEqual(self.client.post(reverse('api_submit_attempt', args=[0]), {}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_quiz_questions', args=[self.quiz.id]), {'page': 'x'}).status_code, 400)
+        self.client.logout()
+        response = self.client.get(reverse('api_quiz_detail', args=[self.quiz.id]))
+        self.assertEqual((response.status_code, response.json()), (401, {'error': 'Authentication required'}))
+
+    def test_posts_need_the_csrf_header(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        client.get(reverse('login'))  # sets the csrftoken cookie
+        self.assertEqual(self.submit({'answers': {}}, client).status_code, 403)
+        response = client.post(self.submit_url, {'answers': {}}, content_type='application/json',
+                               HTTP_X_CSRFTOKEN=client.cookies['csrftoken'].value)
+        self.assertEqual(response.status_code, 200)
+
+
+class AttemptLifecycleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='taker', email='taker@example.com')
+        category = Category.objects.create(name='General')
+        cls.quiz = Quiz.objects.create(title='Budget quiz', category=category)
+        Question.objects.bulk_create([
+            Question(quiz=cls.quiz, text=f"Question {i}", option1='a', option2='b', option3='c', option4='d',
+                     correct_answer='A')
+            for i in range(10)
+        ])
+
+    def test_start_fetches_questions_once(self):
+        # questions, open-attempt lookup, insert
+        with self.assertNumQueries(3):
+            attempt, questions, created = attempts.start_or_resume_attempt(self.user, self.quiz)
+        self.assertTrue(created)
+        self.assertEqual(attempt.total_questions, 10)
+        self.assertEqual(len(questions), 10)
+
+    def test_resume_reuses_open_attempt(self):
+        first, _, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        with self.assertNumQueries(2):
+            second, _, created = attempts.start_or_resume_attempt(self.user, self.quiz)
+        self.assertFalse(created)
+        self.assertEqual(first.pk, second.pk)
+
+    def test_completed_or_stale_attempts_are_not_resumed(self):
+        first, _, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        attempts.grade_attempt(first, {})
+        second, _, created = attempts.start_or_resume_attempt(self.user, self.quiz)
+        self.assertTrue(created)
+
+        QuizHistory.objects.filter(pk=second.pk).update(started_at=timezone.now() - timedelta(days=2))
+        third, _, created = attempts.start_or_resume_attempt(self.user, self.quiz)
+        self.assertTrue(created)
+        self.assertNotEqual(second.pk, third.pk)
+
+    def test_take_quiz_view_query_budget(self):
+        self.client.force_login(self.user)
+        url = reverse('take_quiz', args=[self.quiz.id])
+        # session, user, quiz, questions, open-attempt lookup, insert, profile (base.html avatar),
+        # plus savepoint/update/release: the session's first sliding-expiry refresh
+        with self.assertNumQueries(10):
+            self.client.get(url)
+        # A reload resumes the attempt (no insert) and the session was refreshed just now
+        with self.assertNumQueries(6):
+            self.client.get(url)
+        self.assertEqual(QuizHistory.objects.filter(user=self.user, quiz=self.quiz).count(), 1)
+
+    def test_regrade_follows_corrected_answer_key(self):
+        attempt, questions, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        attempts.grade_attempt(attempt, {str(question.id): 'B' for question in questions[:2]})
+        self.assertEqual(attempt.correct_answers, 0)
+
+        Question.objects.filter(pk=questions[0].pk).update(correct_answer='B')
+        attempt = QuizHistory.objects.get(pk=attempt.pk)
+        self.assertEqual(attempts.regrade_attempt(attempt), 1)
+        attempt.refresh_from_db()
+        self.assertEqual((attempt.correct_answers, attempt.score), (1, 10))
+        self.assertTrue(attempt.result_snapshot['questions'][0]['is_correct'])
+
+    def test_sync_merges_retried_batches_and_submits(self):
+        attempt, questions, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        first, second = str(questions[0].id), str(questions[1].id)
+        self.client.force_login(self.user)
+        url = reverse('api_sync_attempt', args=[attempt.id])
+
+        newer = [{'q': first, 'o': 'A', 't': 4, 's': 20}, {'q': second, 'o': 'C', 't': 2, 's': 21}]
+        response = self.client.post(url, {'answers': newer}, content_type='application/json')
+        self.assertEqual(response.json(), {'attempt': attempt.id, 'accepted': 2, 'completed': False})
+        # A stale batch arriving late, and a replay of the latest one, change nothing
+        stale = [{'q': first, 'o': 'B', 't': 1, 's': 10}]
+        response = self.client.post(url, {'answers': stale + newer}, content_type='application/json')
+        self.assertEqual(response.json()['accepted'], 2)
+        self.assertEqual(QuizHistory.objects.get(pk=attempt.pk).pending_answers[first], ['A', 4.0, 20])
+
+        body = gzip.compress(json.dumps({'answers': [{'q': second, 'o': 'A', 't': 3, 's': 30}], 'submit': True}).encode())
+        response = self.client.post(url, body, content_type='application/json', headers={'Content-Encoding': 'gzip'})
+        self.assertEqual(response.json()['correct'], 2)
+        attempt.refresh_from_db()
+        self.assertIsNone(attempt.pending_answers)
+        # Retrying the submit returns the same results
+        response = self.client.post(url, body, content_type='application/json', headers={'Content-Encoding': 'gzip'})
+        self.assertEqual(response.json()['correct'], 2)
+
+    def test_sync_stores_only_finite_times(self):
+        attempt, questions, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        self.client.force_login(self.user)
+        batch = [
+            {'q': question.id, 'o': 'A', 't': t, 's': 1} for question, t in zip(questions, ['nan', 'inf', -3, '2.5'])
+        ] + [{'q': questions[4].id, 'o': 'A', 't': 1, 's': 1e400}]
+        response = self.client.post(reverse('api_sync_attempt', args=[attempt.id]), json.dumps({'answers': batch}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['accepted'], 4)
+        pending = QuizHistory.objects.get(pk=attempt.pk).pending_answers
+        self.assertEqual([pending[str(question.id)][1] for question in questions[:4]], [0, 0, 0, 2.5])
+
+    def test_archived_attempt_reads_and_regrades_like_a_live_one(self):
+        attempt, questions, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        attempts.grade_attempt(attempt, {str(question.id): 'B' for question in questions[:3]})
+        QuizHistory.objects.filter(pk=attempt.pk).update(
+            completed_at=timezone.now() - timedelta(days=400), result_snapshot=None)
+
+        self.assertEqual(archive.archive_batch(list(archive.archivable().values_list('pk', flat=True)))[:2], (1, 3))
+        self.assertFalse(attempt.user_answers.exists())
+        attempt = QuizHistory.objects.get(pk=attempt.pk)
+        self.assertEqual([answer.selected_option for answer in archive.answers_for(attempt)], ['B', 'B', 'B'])
+        self.assertEqual(attempts.result_snapshot(attempt)['questions'][0]['selected'], 'B')
+
+        Question.objects.filter(pk=questions[0].pk).update(correct_answer='B')
+        self.assertEqual(attempts.regrade_attempt(attempt), 1)
+        self.assertEqual(attempt.correct_answers, 1)
+        self.assertTrue(archive.answers_for(attempt)[0].is_correct)
+
+    def test_sweep_deletes_only_abandoned_attempts(self):
+        stale, _, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        QuizHistory.objects.filter(pk=stale.pk).update(started_at=timezone.now() - timedelta(days=2))
+        open_attempt, _, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        done = QuizHistory.objects.create(user=self.user, quiz=self.quiz, total_questions=10,
+                                          started_at=timezone.now() - timedelta(days=2),
+                                          completed_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(attempts.sweep_abandoned_attempts(), 1)
+        self.assertQuerySetEqual(
+            QuizHistory.objects.order_by('pk').values_list('pk', flat=True),
+            sorted([open_attempt.pk, done.pk]),
+        )
+
+
+class QuestionBankTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='banker', email='banker@example.com')
+        category = Category.objects.create(name='Bank')
+        cls.quiz = Quiz.objects.create(title='Bank quiz', category=category, draw_count=5, shuffle_options=True)
+        Question.objects.bulk_create([
+            Question(quiz=cls.quiz, text=f"Question {i}", option1=f'a{i}', option2=f'b{i}', option3=f'c{i}',
+                     option4=f'd{i}', correct_answer='A')
+            for i in range(20)
+        ])
+
+    def test_attempt_draws_a_reproducible_subset(self):
+        attempt, questions, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        self.assertEqual(attempt.total_questions, 5)
+        drawn = [question.id for question in questions]
+        self.assertEqual(drawn, question_bank.draw_ids(self.quiz, attempt.seed))
+        _, resumed, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        self.assertEqual([question.id for question in resumed], drawn)
+        self.assertEqual([q.shown_options for q in resumed], [q.shown_options for q in questions])
+
+    def test_bank_edits_do_not_change_an_attempt_in_progress(self):
+        attempt, questions, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        drawn = [question.id for question in questions]
+        Question.objects.filter(quiz=self.quiz).exclude(id__in=drawn).order_by('id').first().delete()
+        Question.objects.create(quiz=self.quiz, text="New", option1='a', option2='b', option3='c', option4='d',
+                                correct_answer='A')
+        self.quiz.refresh_from_db()
+        resumed_attempt, resumed, created = attempts.start_or_resume_attempt(self.user, self.quiz)
+        self.assertEqual((resumed_attempt.pk, created), (attempt.pk, False))
+        self.assertEqual([question.id for question in resumed], drawn)
+
+        attempts.grade_attempt(resumed_attempt, {str(question_id): 'A' for question_id in drawn})
+        attempt.refresh_from_db()
+        self.assertEqual([row['id'] for row in attempt.result_snapshot['questions']], drawn)
+        self.assertEqual(attempt.user_answers.count(), 5)
+        self.assertEqual(attempts.regrade_attempt(attempt), 0)
+
+    def test_grading_maps_shown_letters_back(self):
+        attempt, questions, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        # Pick whichever shown letter carries the correct option (always option1, 'a<i>')
+        answers = {
+            str(question.id): next(letter for letter, text in question.shown_options if text.startswith('a'))
+            for question in questions
+        }
+        other = Question.objects.filter(quiz=self.quiz).exclude(id__in=[q.id for q in questions]).first()
+        answers[str(other.id)] = 'A'  # not drawn for this attempt: ignored
+        self.assertEqual(attempts.grade_attempt(attempt, answers), 5)
+        self.assertEqual(set(attempt.user_answers.values_list('selected_option', flat=True)), {'A'})
+
+    def test_letters_that_are_not_options_are_left_unanswered(self):
+        order = (2, 0, 3, 1)
+        for value in [None, 1, ['A'], {'A': 1}, '', 'AB', 'E', 'a']:
+            self.assertIsNone(question_bank.to_stored_letter(order, value), value)
+        self.assertEqual(question_bank.to_stored_letter(order, 'A'), 'C')
+
+        attempt, questions, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        junk = [['A'], None, 'AB', {'selected_option': 'A', 'time_taken': 'slow'}, {'selected_option': ''}]
+        answers = {str(question.id): value for question, value in zip(questions, junk)}
+        attempts.grade_attempt(attempt, answers)
+        self.assertEqual(list(attempt.user_answers.values_list('question_id', 'time_taken')), [(questions[3].id, 0)])
+
+    def test_new_question_resets_id_cache(self):
+        question_bank.bank_ids(self.quiz)
+        Question.objects.create(quiz=self.quiz, text="Late question", option1='a', option2='b', option3='c',
+                                option4='d', correct_answer='B')
+        self.quiz.refresh_from_db()
+        self.assertIsNone(self.quiz.question_ids)
+        self.assertEqual(len(question_bank.bank_ids(self.quiz)), 21)
+
+
+class ReviewSchedulerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='reviewer', email='reviewer@example.com')
+        category = Category.objects.create(name='Review')
+        cls.quiz = Quiz.objects.create(title='Review quiz', category=category)
+        Question.objects.bulk_create([
+            Question(quiz=cls.quiz, text=f"Question {i}", option1='a', option2='b', option3='c', option4='d',
+                     correct_answer='A')
+            for i in range(4)
+        ])
+        cls.question_ids = list(cls.quiz.questions.order_by('id').values_list('id', flat=True))
+
+    def test_intervals_grow_and_reset_on_lapse(self):
+        now = timezone.now()
+        qid = self.question_ids[0]
+        intervals = []
+        for day, is_correct in [(0, True), (1, True), (7, True), (22, False)]:  # each on its due day
+            reviews.record_answers(self.user.id, [(qid, is_correct, 0)], now + timedelta(days=day))
+            intervals.append(ReviewState.objects.get(user=self.user, question_id=qid).interval_days)
+        self.assertEqual(intervals, [1, 6, 15, 1])
+        self.assertEqual(ReviewState.objects.get(user=self.user, question_id=qid).lapses, 1)
+
+    def test_correct_answers_before_due_only_record_the_attempt(self):
+        now = timezone.now()
+        qid = self.question_ids[0]
+        reviews.record_answers(self.user.id, [(qid, True, 0), (qid, True, 0)], now)
+        reviews.record_answers(self.user.id, [(qid, True, 0)], now + timedelta(hours=1))
+        state = ReviewState.objects.get(user=self.user, question_id=qid)
+        self.assertEqual((state.repetitions, state.lapses, state.interval_days), (1, 0, 1))
+        self.assertEqual((state.due_at, state.last_reviewed_at), (now + timedelta(days=1), now + timedelta(hours=1)))
+
+    def test_a_failure_before_due_resets_the_card(self):
+        now = timezone.now()
+        qid = self.question_ids[0]
+        for day in [0, 1, 7]:
+            reviews.record_answers(self.user.id, [(qid, True, 0)], now + timedelta(days=day))
+        self.assertEqual(ReviewState.objects.get(user=self.user, question_id=qid).interval_days, 15)
+        failed_at = now + timedelta(days=8)  # due on day 22
+        reviews.record_answers(self.user.id, [(qid, False, 0)], failed_at)
+        state = ReviewState.objects.get(user=self.user, question_id=qid)
+        self.assertEqual((state.repetitions, state.lapses, state.interval_days), (0, 1, 1))
+        self.assertEqual(state.due_at, failed_at + timedelta(days=1))
+
+    def test_intervals_are_capped(self):
+        when = timezone.now()
+        qid = self.question_ids[0]
+        for _ in range(30):
+            reviews.record_answers(self.user.id, [(qid, True, 1)], when)
+            when = ReviewState.objects.get(user=self.user, question_id=qid).due_at
+        self.assertEqual(ReviewState.objects.get(user=self.user, question_id=qid).interval_days, 365)
+
+    def test_grading_schedules_and_review_picks_due_items(self):
+        attempt, _, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        attempts.grade_attempt(attempt, {str(self.question_ids[0]): 'A', str(self.question_ids[1]): 'B'})
+        self.assertEqual(ReviewState.objects.filter(user=self.user).count(), 2)
+
+        self.assertEqual(reviews.build_review(self.user), [])
+        tomorrow = timezone.now() + timedelta(days=1, minutes=1)
+        with self.assertNumQueries(2):
+            due = reviews.build_review(self.user, now=tomorrow)
+        self.assertEqual(sorted(q.id for q in due), self.question_ids[:2])
+
+
+class GenerateQuizzesCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Science')
+        cls.physics = SubCategory.objects.create(category=category, name='Physics')
+        quiz = Quiz.objects.create(title='Existing', category=category, subcategory=cls.physics)
+        Question.objects.create(quiz=quiz, text='What is the unit of force?', correct_answer='A')
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.manifest = os.path.join(directory, 'manifest.json')
+        with open(self.manifest, 'w') as f:
+            json.dump([
+                {'category': 'Science', 'subcategory': 'Physics', 'difficulty': d, 'num_questions': 2}
+                for d in 'EMH'
+            ], f)
+        self.checkpoint = os.path.join(directory, 'checkpoint.jsonl')
+        with open(self.checkpoint, 'w') as f:
+            f.write(json.dumps({'key': 'Science/Physics/E/2#0', 'quiz_id': None}) + '\n')
+
+    def run_command(self, generate):
+        with mock.patch.object(gemini_generator, 'request_quiz_questions', side_effect=generate) as stub, \
+                mock.patch('myapp.management.commands.generate_quizzes.budget_retry_after', return_value=None):
+            call_command(
+                'generate_quizzes', manifest=self.manifest, checkpoint=self.checkpoint, concurrency=1,
+                backoff=0, stdout=StringIO(), stderr=StringIO(),
+            )
+        return [call.args[2] for call in stub.call_args_list]
+
+    def test_resumes_retries_and_skips_duplicates(self):
+        failures = {'M': 1}
+
+        def generate(category, subcategory, difficulty, num_questions, **kwargs):
+            if failures.get(difficulty):
+                failures[difficulty] -= 1
+                raise TimeoutError("transient")
+            return [
+                {'text': 'What is the UNIT of force', 'correct_answer': 'A'},  # already in the database
+                {'text': f'Question {difficulty}', 'correct_answer': 'B'},
+            ]
+
+        calls = self.run_command(generate)
+        self.assertEqual(sorted(calls), ['H', 'M', 'M'])  # E was checkpointed; M failed once and was retried
+        generated = Question.objects.filter(is_ai_generated=True)
+        self.assertEqual(sorted(generated.values_list('text', flat=True)), ['Question H', 'Question M'])
+        self.assertEqual(Quiz.objects.filter(is_ai_generated=True).count(), 2)
+        with open(self.checkpoint) as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+        self.assertEqual(self.run_command(generate), [])  # a rerun finds everything done
+        self.assertEqual(generated.count(), 2)
+
+
+class PromptRegistryTests(TestCase):
+    def setUp(self):
+        prompts.clear_cache()
+        self.addCleanup(prompts.clear_cache)
+
+    def test_default_is_registered_once_and_cached(self):
+        prompt = prompts.select('quiz')
+        self.assertEqual((prompt.name, prompt.version), ('quiz', 1))
+        self.assertTrue(PromptTemplate.objects.get(pk=prompt.id).is_active)
+        with self.assertNumQueries(0):
+            self.assertEqual(prompts.select('quiz'), prompt)
+
+    def test_variants_split_traffic_and_stick_per_key(self):
+        default = prompts.select('quiz')
+        compact = PromptTemplate.objects.create(name='quiz', variant='compact', is_active=True, weight=300,
+                                                body="{num_questions} questions on {subcategory}")
+        self.assertEqual(compact.version, 2)
+        picks = [prompts.select('quiz', key=user_id).id for user_id in range(400)]
+        self.assertEqual(picks, [prompts.select('quiz', key=user_id).id for user_id in range(400)])
+        self.assertTrue(250 < picks.count(compact.id) < 350)
+        self.assertEqual(set(picks), {default.id, compact.id})
+
+    def test_generation_log_records_the_template_used(self):
+        real_model = gemini_generator.model
+        gemini_generator.model = _FakeModel(0, FAKE_QUIZ_TEXT)
+        self.addCleanup(setattr, gemini_generator, 'model', real_model)
+        questions = gemini_generator.request_quiz_questions('Maths', 'Arithmetic', 'E', 1)
+        self.assertEqual(len(questions), 1)
+        log = AIGenerationLog.objects.get()
+        self.assertEqual(log.prompt_template_id, prompts.select('quiz').id)
+        self.assertEqual(log.parse_yield, 1)
+
+
+class ResultsSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='scorer', email='scorer@example.com')
+        category = Category.objects.create(name='Results')
+        cls.quiz = Quiz.objects.create(title='Results quiz', category=category, shuffle_options=True)
+        Question.objects.bulk_create([
+            Question(quiz=cls.quiz, text=f"Question {i}", option1=f'a{i}', option2=f'b{i}', option3=f'c{i}',
+                     option4=f'd{i}', correct_answer='A')
+            for i in range(3)
+        ])
+
+    def test_results_page_reads_the_snapshot(self):
+        attempt, questions, _ = attempts.start_or_resume_attempt(self.user, self.quiz)
+        right = next(letter for letter, text in questions[0].shown_options if text == questions[0].option1)
+        wrong = next(letter for letter, text in questions[1].shown_options if text == questions[1].option2)
+        attempts.grade_attempt(attempt, {str(questions[0].id): right, str(questions[1].id): wrong})
+        rows = QuizHistory.objects.get(pk=attempt.pk).result_snapshot['questions']
+        self.assertEqual([(row['selected'], row['is_correct']) for row in rows],
+                         [(right, True), (wrong, False), (None, False)])
+        self.assertEqual(rows[1]['correct'], next(letter for letter, text in rows[1]['options'] if text == questions[1].option1))
+
+        Question.objects.filter(pk=questions[1].pk).update(explanation="Because a1.", explanation_status='ready')
+        self.client.force_login(self.user)
+        # session, user, attempt, explanations, profile, plus the session save
+        with self.assertNumQueries(8):
+            response = self.client.get(reverse('quiz_results', args=[attempt.id]))
+        self.assertContains(response, "Because a1.")
+
+    def test_explanation_is_generated_once_per_question(self):
+        question = self.quiz.questions.first()
+        real_model = gemini_generator.model
+        gemini_generator.model = _FakeModel(0, "Because it is.")
+        self.addCleanup(setattr, gemini_generator, 'model', real_model)
+        calls = []
+        original = gemini_generator.generate_explanation
+        gemini_generator.generate_explanation = lambda q: calls.append(q.id) or original(q)
+        self.addCleanup(delattr, gemini_generator, 'generate_explanation')
+
+        explanations.generate_explanations([question.id])
+        explanations.generate_explanations([question.id])
+        self.assertEqual(calls, [question.id])
+        question.refresh_from_db()
+        self.assertEqual((question.explanation, question.explanation_status), ("Because it is.", 'ready'))
+
+
+class WriteCoalescingTests(TestCase):
+    def test_login_defers_last_login_and_leaves_profile_alone(self):
+        user = get_user_model().objects.create_user(username='writer', email='writer@example.com', password='pw-123456789')
+        with self.assertNumQueries(0):
+            user.save()  # nothing changed
+        with self.assertNumQueries(1):
+            user.first_name = 'Wren'
+            user.save()
+
+        self.client.post(reverse('login'), {'username': 'writer', 'password': 'pw-123456789'})
+        user.refresh_from_db()
+        self.assertIsNone(user.last_login)
+        self.assertEqual(writes.flush_last_logins(), 1)
+        user.refresh_from_db()
+        self.assertIsNotNone(user.last_login)
+
+
+    @override_settings(LAST_LOGIN_FLUSH_SECONDS=0.05)
+    def test_a_timer_flushes_without_another_login(self):
+        user = get_user_model().objects.create_user(username='once', email='once@example.com')
+        writes.flush_last_logins()  # drop the timer earlier tests' logins armed
+        flushed = threading.Event()
+        with mock.patch.object(writes, 'flush_last_logins', side_effect=lambda: flushed.set()):
+            self.client.force_login(user)
+            self.client.force_login(user)  # the timer is armed once, by the first buffered login
+            self.assertTrue(flushed.wait(2))
+        self.assertEqual(writes.flush_last_logins(), 1)
+        self.assertIsNone(writes._timer)
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.users = [User.objects.create_user(username=f'learner{i}', email=f'learner{i}@example.com') for i in range(3)]
+        category = Category.objects.create(name='Science')
+        cls.physics = SubCategory.objects.create(name='Physics', category=category)
+        cls.quizzes = [
+            Quiz.objects.create(title=f'Physics {i}', category=category, subcategory=cls.physics) for i in range(3)
+        ]
+        now = timezone.now()
+        # Both other learners took quiz 0 and then quiz 1; the first learner has only taken quiz 0, badly
+        taken = [(0, 0, 40), (1, 0, 90), (1, 1, 90), (2, 0, 80), (2, 1, 80), (2, 2, 80)]
+        QuizHistory.objects.bulk_create([
+            QuizHistory(user=cls.users[user], quiz=cls.quizzes[quiz], score=score, total_questions=10,
+                        completed_at=now - timedelta(minutes=10 - i))
+            for i, (user, quiz, score) in enumerate(taken)
+        ])
+
+    def test_build_suggests_co_taken_quizzes_and_weak_topics(self):
+        self.assertEqual(recommendations.build(k=2), 3)
+        learner = self.users[0]
+        with self.assertNumQueries(1):
+            next_quizzes, weak_topics = recommendations.for_user(learner)
+        self.assertEqual([row.quiz_id for row in next_quizzes], [self.quizzes[1].id, self.quizzes[2].id])
+        self.assertEqual([row.subcategory_id for row in weak_topics], [self.physics.id])
+
+        QuizHistory.objects.create(user=learner, quiz=self.quizzes[1], score=100, total_questions=10,
+                                   completed_at=timezone.now())
+        recommendations.update_for_user(learner.id, self.quizzes[1].id)
+        next_quizzes, weak_topics = recommendations.for_user(learner)
+        self.assertEqual([row.quiz_id for row in next_quizzes], [self.quizzes[2].id])
+        self.assertEqual(weak_topics, [])
+
+    def test_build_drops_users_without_attempts_in_one_bounded_query(self):
+        recommendations.build(k=2)
+        gone = self.users[2]
+        QuizHistory.objects.filter(user=gone).delete()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(recommendations.build(k=2), 2)
+        self.assertFalse(QuizRecommendation.objects.filter(user=gone).exists())
+        self.assertTrue(QuizRecommendation.objects.filter(user=self.users[0]).exists())
+        stale = [
+            query['sql'] for query in queries.captured_queries
+            if 'myapp_quizrecommendation' in query['sql'] and 'NOT (' in query['sql']
+        ]
+        self.assertTrue(stale)
+        for sql in stale:  # the ids come from a subquery, not one parameter per user
+            self.assertIn('IN (SELECT U0."user_id"', sql)
+
+
+class LiveSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.host = User.objects.create_user(username='host', email='host@example.com')
+        cls.players = [User.objects.create_user(username=f'player{i}', email=f'player{i}@example.com') for i in range(2)]
+        category = Category.objects.create(name='General')
+        cls.quiz = Quiz.objects.create(title='Live quiz', category=category)
+        Question.objects.bulk_create([
+            Question(quiz=cls.quiz, text=f"Question {i}", option1='a', option2='b', option3='c', option4='d',
+                     correct_answer='B')
+            for i in range(2)
+        ])
+
+    async def test_answers_are_graded_in_memory_and_saved_at_the_end(self):
+        live_session = await LiveSession.objects.select_related('quiz').aget(
+            pk=(await sync_to_async(live.create_session)(self.quiz, self.host)).pk)
+        questions = [question async for question in self.quiz.questions.order_by('id')]
+        runner = live.LiveRunner(live_session, questions)
+        first, second = self.players
+
+        for player in self.players:
+            await runner.handle({'type': 'join', 'user': player.id, 'name': player.username})
+        await runner.handle({'type': 'start', 'user': first.id})  # only the host may advance
+        self.assertEqual(runner.index, -1)
+
+        await runner.handle({'type': 'start', 'user': self.host.id})
+        await runner.handle({'type': 'answer', 'user': first.id, 'question': questions[0].id, 'option': 'B'})
+        await runner.handle({'type': 'answer', 'user': first.id, 'question': questions[0].id, 'option': 'A'})  # ignored
+        await runner.handle({'type': 'answer', 'user': second.id, 'question': questions[0].id, 'option': 'C'})
+        await runner.handle({'type': 'next', 'user': self.host.id})
+        await runner.handle({'type': 'answer', 'user': second.id, 'question': questions[1].id, 'option': 'B'})
+        await runner.handle({'type': 'end', 'user': self.host.id})
+
+        histories = {h.user_id: h async for h in QuizHistory.objects.filter(live_session=live_session)}
+        self.assertEqual(histories[first.id].correct_answers, 1)
+        self.assertEqual(histories[second.id].correct_answers, 1)
+        self.assertEqual(histories[first.id].result_snapshot['questions'][1]['selected'], None)
+        self.assertEqual(await UserAnswer.objects.filter(history__live_session=live_session).acount(), 3)
+        await live_session.arefresh_from_db()
+        self.assertEqual((live_session.status, live_session.participant_count), (LiveSession.STATUS_FINISHED, 2))
+
+
+class LargeTableAdminTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = get_user_model().objects.create_superuser(username='root', email='root@example.com', password='pw')
+        categories = Category.objects.bulk_create([Category(name=f"Category {i}") for i in range(30)])
+        Category.objects.filter(pk__in=[category.pk for category in categories[5:17]]).delete()  # 18 left
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=5)
+    def test_estimate_is_clamped_on_the_short_last_page(self):
+        paginator = EstimatedCountPaginator(Category.objects.order_by('pk'), 10)
+        self.assertGreaterEqual(paginator.count, 30)  # highest id
+        with self.assertRaises(EmptyPage):
+            paginator.page(3)
+        self.assertEqual(len(paginator.page(2)), 8)
+        self.assertEqual((paginator.count, paginator.num_pages), (18, 2))
+
+    @override_settings(LLM_DAILY_TOKEN_BUDGET=100)
+    def test_regenerate_refuses_when_the_budget_is_spent(self):
+        ratelimit._usage_cache.update(expires=0)
+        self.addCleanup(ratelimit._usage_cache.update, expires=0)
+        AIGenerationLog.objects.create(kind='quiz', tokens_in=80, tokens_out=40)
+        quiz = Quiz.objects.create(title='AI quiz', category=Category.objects.first(), is_ai_generated=True)
+        self.client.force_login(self.admin)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse('admin:myapp_quiz_changelist'), {
+                'action': 'regenerate_questions', '_selected_action': [quiz.pk],
+            }, follow=True)
+        self.assertEqual(callbacks, [])
+        self.assertContains(response, "budget exhausted")
+
+
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='planner', email='planner@example.com')
+        category = Category.objects.create(name='Plans')
+        cls.subcategory = SubCategory.objects.create(name='Indexes', category=category)
+        cls.quiz = Quiz.objects.create(title='Plan quiz', category=category, subcategory=cls.subcategory)
+        Question.objects.bulk_create([
+            Question(quiz=cls.quiz, text=f"Question {i}", option1='a', option2='b', option3='c', option4='d',
+                     correct_answer='A')
+            for i in range(5)
+        ])
+
+    def test_views_do_not_scan_large_tables(self):
+        self.client.force_login(self.user)
+        with query_audit.audit() as result:
+            self.client.get(reverse('take_quiz', args=[self.quiz.id]))
+            attempt = QuizHistory.objects.get(user=self.user)
+            self.client.post(reverse('submit_quiz'), {'quiz_history_id': attempt.id, 'answers': '{}', 'time_taken': 5})
+            for url in [
+                reverse('dashboard'), reverse('profile'), reverse('quiz_selection'), reverse('quiz_history'),
+                reverse('quiz_results', args=[attempt.id]), reverse('review'),
+                reverse('get_subcategories', args=[self.subcategory.category_id]),
+                reverse('api_quiz_detail', args=[self.quiz.id]), reverse('api_quiz_questions', args=[self.quiz.id]),
+                reverse('api_attempt_results', args=[attempt.id]),
+            ]:
+                self.client.get(url)
+        self.assertGreater(len(result.queries), 20)
+        self.assertEqual([str(scan) for scan in result.full_scans], [])
+
+    def test_full_scans_are_reported(self):
+        with query_audit.audit() as result:
+            list(UserAnswer.objects.filter(is_correct=False))
+            list(Quiz.objects.filter(pk__in=Question.objects.filter(text='x').values('quiz_id')))
+        self.assertEqual(sorted(scan.table for scan in result.full_scans), ['myapp_question', 'myapp_useranswer'])
+
+
+class TopicTreeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='curator', email='curator@example.com')
+        cls.science = Category.objects.create(name='Science')
+        cls.physics = SubCategory.objects.create(name='Physics', category=cls.science)
+        cls.physics_topic = cls.physics.topic
+        cls.optics = Topic.objects.create(name='Optics', parent=cls.physics_topic)
+        cls.lasers = Topic.objects.create(name='Lasers', parent=cls.optics)
+        cls.quiz = Quiz.objects.create(title='Light', category=cls.science, subcategory=cls.physics, topic=cls.lasers)
+
+    def setUp(self):
+        topics.clear_cache()
+
+    def test_subtree_and_ancestors_are_single_queries(self):
+        self.assertEqual(self.lasers.depth, 3)
+        with self.assertNumQueries(1):
+            self.assertEqual([t.name for t in topics.subtree(self.physics_topic)], ['Physics', 'Optics', 'Lasers'])
+        with self.assertNumQueries(1):
+            self.assertEqual([t.name for t in topics.ancestors(self.lasers)], ['Science', 'Physics', 'Optics'])
+        self.assertEqual(list(topics.quizzes_under(self.physics_topic.pk)), [self.quiz])
+
+    def test_subtree_is_an_index_range_scan(self):
+        with query_audit.audit(tables=[Topic._meta.db_table]) as result:
+            list(topics.subtree(self.optics))
+        self.assertEqual([str(scan) for scan in result.full_scans], [])
+
+    def test_root_names_are_unique(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Topic.objects.create(name='Science')
+        Topic.objects.create(name='Science', parent=self.physics_topic)  # fine below the root
+
+    def test_moving_a_topic_moves_its_subtree(self):
+        chemistry = SubCategory.objects.create(name='Chemistry', category=self.science).topic
+        self.optics.parent = chemistry
+        self.optics.save()
+        self.lasers.refresh_from_db()
+        self.assertTrue(self.lasers.path.startswith(chemistry.path))
+        self.assertEqual(self.lasers.ancestor_ids(), [self.science.topic.pk, chemistry.pk, self.optics.pk])
+
+        self.assertEqual(topics.get_tree().legacy_ids(self.lasers.pk), (self.science.pk, chemistry.subcategory_id))
+        self.optics.parent = self.lasers
+        with self.assertRaises(ValidationError):
+            self.optics.save()
+
+    def test_selection_views_read_the_cached_tree(self):
+        self.client.force_login(self.user)
+        url = reverse('get_subcategories', args=[self.science.pk])
+        self.client.get(url)  # loads the tree (and refreshes the new session)
+        # session, user
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual([row['name'] for row in response.json()], ['Physics', 'Physics › Optics', 'Physics › Optics › Lasers'])
+
+        # Any topic change bumps the version, so the next read reloads
+        Topic.objects.create(name='Mechanics', parent=self.physics_topic)
+        self.assertIn('Physics › Mechanics', [row['name'] for row in self.client.get(url).json()])
+
+
+@override_settings(EXPORT_SAFETY_LAG_SECONDS=0)
+class AnalyticsExportTests(TestCase):
+    def test_incremental_export_writes_changed_rows_once(self):
+        user = get_user_model().objects.create_user(username='analyst', email='analyst@example.com')
+        quiz = Quiz.objects.create(title='Export quiz', category=Category.objects.create(name='Exports'))
+        Question.objects.bulk_create([
+            Question(quiz=quiz, text=f"Question {i}", option1='a', option2='b', option3='c', option4='d', correct_answer='A')
+            for i in range(3)
+        ])
+        attempt, questions, _ = attempts.start_or_resume_attempt(user, quiz)
+        attempts.grade_attempt(attempt, {str(question.id): 'B' for question in questions})
+        output = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, output)
+
+        def exported_rows(name):
+            rows = []
+            for path in sorted(glob.glob(os.path.join(output, name, 'date=*', '*.csv'))):
+                with open(path, newline='') as f:
+                    rows.extend(csv.DictReader(f))
+            return rows
+
+        self.assertEqual(exports.export('attempts', output, 'csv', chunk_size=1), (1, 1))
+        self.assertEqual(exports.export('answers', output, 'csv', chunk_size=2), (3, 2))
+        self.assertEqual(exports.export('answers', output, 'csv'), (0, 0))
+        self.assertEqual({row['quiz_title'] for row in exported_rows('attempts')}, {'Export quiz'})
+
+        # A regrade changes one answer: only it (and the attempt) are exported again
+        Question.objects.filter(pk=questions[0].pk).update(correct_answer='B')
+        attempts.regrade_attempt(QuizHistory.objects.get(pk=attempt.pk))
+        self.assertEqual(exports.export('answers', output, 'csv'), (1, 1))
+        self.assertEqual(exports.export('attempts', output, 'csv'), (1, 1))
+        latest = {}
+        for row in sorted(exported_rows('answers'), key=lambda row: datetime.fromisoformat(row['updated_at'])):
+            latest[row['id']] = row
+        self.assertEqual(sorted(row['is_correct'] for row in latest.values()), ['False', 'False', 'True'])
+
+        # Archived answers are unpacked into their own dataset, and exported again after a regrade
+        self.assertEqual(archive.archive_batch([attempt.pk])[:2], (1, 3))
+        self.assertEqual(exports.export('archived_answers', output, 'csv'), (3, 1))
+        Question.objects.filter(pk=questions[1].pk).update(correct_answer='B')
+        attempts.regrade_attempt(QuizHistory.objects.get(pk=attempt.pk))
+        self.assertEqual(exports.export('archived_answers', output, 'csv'), (3, 1))
+        self.assertEqual(exports.export('archived_answers', output, 'csv', full=True), (3, 1))
+        rows = exported_rows('archived_answers')[-3:]
+        self.assertEqual(
+            sorted((int(row['question_id']), row['is_correct'], row['correct_option']) for row in rows),
+            [(questions[0].id, 'True', 'B'), (questions[1].id, 'True', 'B'), (questions[2].id, 'False', 'A')],
+        )
+
+
+class TranslationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='lector', email='lector@example.com')
+        category = Category.objects.create(name='Languages')
+        cls.quiz = Quiz.objects.create(title='Translated quiz', category=category)
+        Question.objects.bulk_create([
+            Question(quiz=cls.quiz, text=f"Question {i}", option1='a', option2='b', option3='c', option4='d',
+                     correct_answer='A')
+            for i in range(3)
+        ])
+
+    def test_translated_once_and_rendered_in_the_users_locale(self):
+        calls = []
+
+        def translate_items(items, locale):
+            calls.append([item['id'] for item in items])
+            return {item['id']: {k: f"[{locale}] {v}" for k, v in item.items() if k != 'id'} for item in items}
+        gemini_generator.translate_items = translate_items
+        self.addCleanup(delattr, gemini_generator, 'translate_items')
+
+        call_command('translate_content', locale=['es'], batch_size=2, stdout=StringIO())
+        self.assertEqual(len(calls), 3)  # the quiz, then its questions in two batches
+        call_command('translate_content', locale=['es'], stdout=StringIO())
+        self.assertEqual(len(calls), 3)
+        edited = self.quiz.questions.order_by('id').last()
+        Question.objects.filter(pk=edited.pk).update(text="Edited question")
+
+        Profile.objects.filter(user=self.user).update(locale='es')
+        self.client.force_login(self.user)
+        url = reverse('take_quiz', args=[self.quiz.id])
+        self.client.get(url)
+        # As for the source locale (see AttemptLifecycleTests) plus one prefetch each for the quiz and its questions
+        with self.assertNumQueries(8):
+            response = self.client.get(url)
+        self.assertContains(response, "[es] Translated quiz")
+        self.assertContains(response, "[es] Question 0")
+        # A translation of text that has since changed is not shown, and the next run replaces it
+        self.assertContains(response, "Edited question")
+        call_command('translate_content', locale=['es'], stdout=StringIO())
+        self.assertEqual(calls[-1], [edited.pk])
+        self.assertEqual(QuestionTranslation.objects.get(question=edited, locale='es').text, "[es] Edited question")
+        self.assertContains(self.client.get(url, {'locale': 'en'}), "Edited question")
+
+
+class WarmupTests(TestCase):
+    def test_ready_only_after_warmup(self):
+        warmup.reset()
+        self.addCleanup(warmup.reset)
+        # In tests the probe must not start warm-up in a thread of its own
+        self.addCleanup(setattr, warmup, 'start_background', warmup.start_background)
+        warmup.start_background = lambda: None
+
+        self.assertEqual(self.client.get(reverse('health')).status_code, 200)
+        response = self.client.get(reverse('ready'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['status'], warmup.IDLE)
+
+        warmup.run()
+        response = self.client.get(reverse('ready'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([stage['name'] for stage in response.json()['stages']], [name for name, _ in warmup.STAGES])
+        self.assertIsNone(response.json()['stages'][0]['error'])
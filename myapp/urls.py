@@ -1,11 +1,14 @@
 from django.urls import path
-from . import views
+from . import api, views
 from .views import dashboard_view
 from .views import GenerateQuizView, get_subcategories, submit_quiz_view
 
 urlpatterns = [
     # Authentication URLs
     path('', views.landing_view, name='landing'),
+    path('sw.js', views.service_worker, name='service_worker'),
+    path('healthz', views.health_view, name='health'),
+    path('readyz', views.ready_view, name='ready'),
     path('register/', views.register_view, name='register'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
@@ -16,6 +19,9 @@ urlpatterns = [
     path('profile/', views.profile_view, name='profile'),
     path('profile/edit/', views.edit_profile, name='edit_profile'),
 
+    # Metrics (staff only)
+    path('metrics/', views.metrics_view, name='metrics'),
+
     # Chatbot URL
     path("chatbot-response/", views.chatbot_response, name="chatbot_response"),
     
@@ -28,4 +34,19 @@ urlpatterns = [
     path('api/submit-quiz/', submit_quiz_view, name='submit_quiz'),
     path('quiz/results/<int:quiz_history_id>/', views.quiz_results_view, name='quiz_results'),
     path('quiz/history/', views.quiz_history_view, name='quiz_history'),
+    path('review/', views.review_view, name='review'),
+    path('review/submit/', views.submit_review_view, name='submit_review'),
+    path('live/', views.live_join_view, name='live_join'),
+    path('live/create/<int:quiz_id>/', views.live_create_view, name='live_create'),
+    path('live/<str:code>/host/', views.live_host_view, name='live_host'),
+    path('live/<str:code>/', views.live_play_view, name='live_play'),
+
+    # JSON quiz-taking API (v1)
+    path('api/v1/quizzes/<int:quiz_id>/', api.quiz_detail, name='api_quiz_detail'),
+    path('api/v1/quizzes/<int:quiz_id>/questions/', api.quiz_questions, name='api_quiz_questions'),
+    path('api/v1/quizzes/<int:quiz_id>/attempts/', api.start_attempt, name='api_start_attempt'),
+    path('api/v1/attempts/<int:attempt_id>/questions/', api.attempt_questions, name='api_attempt_questions'),
+    path('api/v1/attempts/<int:attempt_id>/submit/', api.submit_attempt, name='api_submit_attempt'),
+    path('api/v1/attempts/<int:attempt_id>/sync/', api.sync_attempt, name='api_sync_attempt'),
+    path('api/v1/attempts/<int:attempt_id>/', api.attempt_results, name='api_attempt_results'),
 ]
@@ -0,0 +1,80 @@
+from django.db import transaction
+
+from myapp.models import Question, Quiz, QuizHistory
+from myapp.utils import attempts
+from myapp.utils.gemini_helper import gemini_generator
+from myapp.utils.ratelimit import budget_retry_after
+
+# Bulk admin actions, run through myapp.utils.background so a large selection does not
+# hold the admin request open. Each job works in chunks with short transactions.
+
+CHUNK_SIZE = 50
+
+
+def _chunks(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def regenerate_quiz_questions(quiz_ids):
+    """Replace the questions of AI quizzes with freshly generated ones; quizzes with attempts are left alone"""
+    replaced = 0
+    quizzes = Quiz.objects.filter(pk__in=quiz_ids, subcategory__isnull=False).select_related('category', 'subcategory')
+    for quiz in quizzes:
+        if budget_retry_after():
+            print("Regenerate: daily AI budget exhausted, stopping")
+            break
+        if quiz.quiz_histories.exists():
+            # Deleting the questions would cascade to the attempts' answers
+            print(f"Regenerate: skipping quiz {quiz.pk}, it has attempts")
+            continue
+        num_questions = quiz.questions.count() or 10
+        try:
+            questions = gemini_generator.request_quiz_questions(
+                quiz.category.name, quiz.subcategory.name, quiz.difficulty, num_questions,
+                category_id=quiz.category_id, subcategory_id=quiz.subcategory_id,
+            )
+        except Exception as e:
+            print(f"Regenerate: quiz {quiz.pk} failed: {e}")
+            continue
+        if not questions:
+            continue
+        with transaction.atomic():
+            quiz.questions.all().delete()
+            Question.objects.bulk_create([
+                Question(
+                    quiz=quiz,
+                    text=q_data['text'],
+                    option1=q_data.get('option1', ''),
+                    option2=q_data.get('option2', ''),
+                    option3=q_data.get('option3', ''),
+                    option4=q_data.get('option4', ''),
+                    correct_answer=q_data.get('correct_answer', ''),
+                    difficulty=quiz.difficulty,
+                    is_ai_generated=True,
+                )
+                for q_data in questions
+            ])
+            Quiz.objects.filter(pk=quiz.pk).update(question_ids=None)
+        replaced += 1
+    print(f"Regenerate: replaced the questions of {replaced} of {len(quiz_ids)} quizzes")
+
+
+def regrade_attempts(history_ids):
+    """Re-mark completed attempts against the current answer keys"""
+    changed = 0
+    for chunk in _chunks(history_ids):
+        for quiz_history in QuizHistory.objects.filter(pk__in=chunk, completed_at__isnull=False).select_related('quiz'):
+            changed += attempts.regrade_attempt(quiz_history)
+    print(f"Regrade: {len(history_ids)} attempts checked, {changed} answers changed")
+
+
+def delete_quizzes(quiz_ids):
+    """Delete AI-generated quizzes with their questions and attempts, a chunk per transaction"""
+    deleted = 0
+    for chunk in _chunks(quiz_ids):
+        with transaction.atomic():
+            _, per_model = Quiz.objects.filter(pk__in=chunk, is_ai_generated=True).delete()
+        deleted += per_model.get(Quiz._meta.label, 0)
+    print(f"Delete: removed {deleted} AI-generated quizzes")
@@ -0,0 +1,141 @@
+import struct
+import sys
+import zlib
+from array import array
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from myapp.models import ArchivedAttempt, Question, QuizHistory, UserAnswer
+
+# Archival of old completed attempts. The UserAnswer rows of an attempt (one per question,
+# each with its own id, timestamps and indexes) are replaced by one ArchivedAttempt row
+# holding them packed: question ids delta-encoded, selected letters, correctness and
+# timings as arrays, zlib-compressed. answers_for() reads either form, so callers do not
+# need to know whether an attempt has been archived.
+
+AnswerRecord = namedtuple('AnswerRecord', 'question_id selected_option is_correct time_taken')
+
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<BI')  # format version, answer count
+
+
+def _little_endian(values):
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+
+def pack(records):
+    """Packed, compressed form of a list of AnswerRecords (order is kept)"""
+    ids = array('q', (record.question_id for record in records))
+    deltas = array('q', [ids[0]] + [ids[i] - ids[i - 1] for i in range(1, len(ids))]) if ids else array('q')
+    payload = b''.join([
+        _HEADER.pack(FORMAT_VERSION, len(records)),
+        _little_endian(deltas).tobytes(),
+        ''.join(record.selected_option or '-' for record in records).encode('ascii'),
+        bytes(1 if record.is_correct else 0 for record in records),
+        _little_endian(array('f', (record.time_taken for record in records))).tobytes(),
+    ])
+    return zlib.compress(payload, 9)
+
+
+def unpack(blob):
+    """The AnswerRecords packed by pack()"""
+    payload = zlib.decompress(bytes(blob))
+    version, count = _HEADER.unpack_from(payload)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unknown archived attempt format {version}")
+    offset = _HEADER.size
+    deltas = array('q')
+    deltas.frombytes(payload[offset:offset + 8 * count])
+    offset += 8 * count
+    selected = payload[offset:offset + count].decode('ascii')
+    offset += count
+    correct = payload[offset:offset + count]
+    offset += count
+    timings = array('f')
+    timings.frombytes(payload[offset:offset + 4 * count])
+    _little_endian(deltas)
+    _little_endian(timings)
+
+    records, question_id = [], 0
+    for i, delta in enumerate(deltas):
+        question_id += delta
+        option = selected[i]
+        records.append(AnswerRecord(question_id, '' if option == '-' else option, bool(correct[i]), round(timings[i], 3)))
+    return records
+
+
+def load_answers(quiz_history):
+    """(answer records, ArchivedAttempt or None) of an attempt, from its rows or its archive"""
+    rows = list(
+        quiz_history.user_answers.order_by('id').values_list('question_id', 'selected_option', 'is_correct', 'time_taken')
+    )
+    if rows or quiz_history.completed_at is None:
+        return [AnswerRecord(*row) for row in rows], None
+    archived = ArchivedAttempt.objects.filter(history=quiz_history).first()
+    return (unpack(archived.answers), archived) if archived else ([], None)
+
+
+def answers_for(quiz_history):
+    """The attempt's answers as AnswerRecords, whether or not it has been archived"""
+    return load_answers(quiz_history)[0]
+
+
+def store(archived, records):
+    """Rewrite an archived attempt's answers, e.g. after re-grading"""
+    archived.answers = pack(records)
+    archived.answer_count = len(records)
+    archived.save(update_fields=['answers', 'answer_count', 'updated_at'])
+
+
+def recent_mistakes(user, limit):
+    """Up to `limit` (question, selected option) of the user's wrong answers in archived attempts, newest first"""
+    mistakes = []
+    for archived in ArchivedAttempt.objects.filter(history__user=user).order_by('-history_id')[:limit]:
+        mistakes.extend(
+            (record.question_id, record.selected_option)
+            for record in reversed(unpack(archived.answers)) if not record.is_correct and record.selected_option
+        )
+        if len(mistakes) >= limit:
+            break
+    mistakes = mistakes[:limit]
+    questions = Question.objects.in_bulk([question_id for question_id, _ in mistakes])
+    return [(questions[question_id], option) for question_id, option in mistakes if question_id in questions]
+
+
+def archivable(older_than_days=None):
+    """Completed attempts old enough to archive that still have their answer rows"""
+    days = settings.ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    return QuizHistory.objects.filter(
+        completed_at__lt=timezone.now() - timedelta(days=days), archive__isnull=True, user_answers__isnull=False,
+    ).distinct()
+
+
+def archive_batch(history_ids):
+    """
+    Archive a batch of attempts in one transaction: pack their answers, write the archive rows
+    and delete the answer rows. Returns (attempts archived, answer rows removed, packed bytes).
+    """
+    with transaction.atomic():
+        histories = list(
+            QuizHistory.objects.select_for_update(of=('self',))
+            .filter(pk__in=history_ids, completed_at__isnull=False, archive__isnull=True)
+        )
+        rows = {}
+        for question_id, history_id, option, is_correct, seconds in (
+            UserAnswer.objects.filter(history__in=histories).order_by('id')
+            .values_list('question_id', 'history_id', 'selected_option', 'is_correct', 'time_taken')
+        ):
+            rows.setdefault(history_id, []).append(AnswerRecord(question_id, option, is_correct, seconds))
+        archives = [
+            ArchivedAttempt(history_id=history_id, answer_count=len(records), answers=pack(records))
+            for history_id, records in rows.items()
+        ]
+        ArchivedAttempt.objects.bulk_create(archives)
+        removed, _ = UserAnswer.objects.filter(history_id__in=rows).delete()
+    return len(archives), removed, sum(len(archived.answers) for archived in archives)
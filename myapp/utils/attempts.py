@@ -0,0 +1,277 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from myapp.models import Question, QuizHistory, UserAnswer
+from myapp.utils import archive, chat, explanations, question_bank, recommendations, reviews, translations
+
+# Attempt lifecycle shared by the HTML views and the JSON API.
+
+
+QUESTION_FIELDS = ('id', 'quiz_id', 'text', 'option1', 'option2', 'option3', 'option4')
+GRADING_FIELDS = QUESTION_FIELDS + ('correct_answer', 'explanation_status', 'explanation_attempted_at')
+
+
+def attempt_questions(quiz_history, quiz, offset=0, limit=None, locale=None):
+    """
+    The attempt's questions in serving order, each with `shown_options` set to
+    [(letter, text), ...] as displayed. Randomized attempts fetch only the drawn ids.
+    With a translated `locale` the texts are shown in it (one more query; see translations).
+    """
+    if quiz_history.seed is None:
+        queryset = translations.with_translations(quiz.questions.order_by('id').only(*QUESTION_FIELDS), locale)
+        questions = list(queryset[offset:offset + limit] if limit is not None else queryset[offset:])
+    else:
+        ids = question_bank.attempt_ids(quiz_history, quiz)
+        ids = ids[offset:offset + limit] if limit is not None else ids[offset:]
+        queryset = translations.with_translations(Question.objects.filter(id__in=ids).only(*QUESTION_FIELDS), locale)
+        by_id = {question.id: question for question in queryset}
+        questions = [by_id[question_id] for question_id in ids if question_id in by_id]
+    for question in questions:
+        translations.localize(question)
+        order = question_bank.option_order(quiz_history.seed, question.id, quiz_history.options_shuffled)
+        question.shown_options = question_bank.shown_options(question, order)
+    return questions
+
+
+def start_or_resume_attempt(user, quiz, locale=None):
+    """
+    Return (attempt, questions, created) for `user` taking `quiz`. An in-progress attempt
+    younger than ATTEMPT_ABANDON_HOURS is resumed, so reloading the quiz page does not
+    start a new one. Questions are fetched once (in `locale`) and also give total_questions.
+    attempt is None when the quiz has no questions.
+    """
+    attempt = (
+        QuizHistory.objects.filter(
+            user=user, quiz=quiz, completed_at__isnull=True,
+            started_at__gte=timezone.now() - timedelta(hours=settings.ATTEMPT_ABANDON_HOURS),
+        )
+        .order_by('-started_at')
+        .first()
+    )
+    created = attempt is None
+    if created:
+        attempt = QuizHistory(
+            user=user,
+            quiz=quiz,
+            selected_difficulty=quiz.difficulty,
+            started_at=timezone.now(),
+            seed=question_bank.new_seed() if quiz.is_randomized else None,
+            options_shuffled=quiz.shuffle_options,
+        )
+        if attempt.seed is not None:
+            attempt.drawn_ids = question_bank.draw_ids(quiz, attempt.seed)
+
+    questions = attempt_questions(attempt, quiz, locale=locale)
+    if not questions:
+        return None, questions, False
+    if created:
+        attempt.total_questions = len(questions)
+        attempt.save()
+    return attempt, questions, created
+
+
+def sweep_abandoned_attempts(older_than_hours=None, dry_run=False):
+    """Delete attempts that were started but never submitted; returns how many matched"""
+    if older_than_hours is None:
+        older_than_hours = settings.ATTEMPT_ABANDON_HOURS
+    abandoned = QuizHistory.objects.filter(
+        completed_at__isnull=True,
+        started_at__lt=timezone.now() - timedelta(hours=older_than_hours),
+    )
+    if dry_run:
+        return abandoned.count()
+    deleted, per_model = abandoned.delete()
+    return per_model.get(QuizHistory._meta.label, 0)
+
+
+def _seconds(value):
+    """A time taken as sent by a client, or 0 if it is not a non-negative number"""
+    if isinstance(value, bool):
+        return 0
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        return 0
+    return seconds if 0 <= seconds < float('inf') else 0
+
+
+def grade_attempt(quiz_history, answers):
+    """
+    Grade `answers` ({question_id: {'selected_option': 'A', 'time_taken': 3.2}} or
+    {question_id: 'A'}) against the attempt's quiz and mark it completed.
+    Answers to questions outside the quiz are ignored. Returns the number of correct
+    answers, or None if the attempt was already submitted.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Claim the attempt first so a double submit cannot grade it twice
+        claimed = QuizHistory.objects.filter(pk=quiz_history.pk, completed_at__isnull=True).update(completed_at=now)
+        if not claimed:
+            return None
+
+        questions = _graded_questions(quiz_history)
+        correct_options = {question.id: question.correct_answer for question in questions}
+        user_answers = []
+        answered = set()
+        for question_id, answer_data in answers.items():
+            try:
+                question_id = int(question_id)
+            except (TypeError, ValueError):
+                continue
+            # Keys like "5" and "05" name the same question; one answer each (unique_answer_per_question)
+            if question_id not in correct_options or question_id in answered:
+                continue
+            answered.add(question_id)
+            if not isinstance(answer_data, dict):
+                answer_data = {'selected_option': answer_data}
+            # Stored letters refer to Question.option1..4, not to the shuffled order shown
+            order = question_bank.option_order(quiz_history.seed, question_id, quiz_history.options_shuffled)
+            selected_option = question_bank.to_stored_letter(order, answer_data.get('selected_option'))
+            if selected_option is None:
+                continue  # not a letter: left unanswered
+            user_answers.append(UserAnswer(
+                history=quiz_history,
+                question_id=question_id,
+                selected_option=selected_option,
+                is_correct=selected_option == correct_options[question_id],
+                time_taken=_seconds(answer_data.get('time_taken')),
+            ))
+        UserAnswer.objects.bulk_create(user_answers)
+        reviews.record_answers(
+            quiz_history.user_id, [(a.question_id, a.is_correct, a.time_taken) for a in user_answers], now,
+        )
+
+        correct_answers = sum(1 for answer in user_answers if answer.is_correct)
+        quiz_history.correct_answers = correct_answers
+        quiz_history.score = (correct_answers / quiz_history.total_questions) * 100 if quiz_history.total_questions > 0 else 0
+        quiz_history.completed_at = now
+        quiz_history.result_snapshot = build_snapshot(
+            quiz_history, questions, {answer.question_id: answer.selected_option for answer in user_answers},
+        )
+        quiz_history.save(update_fields=['correct_answers', 'score', 'completed_at', 'result_snapshot', 'updated_at'])
+        explanations.request_explanations(
+            row['id'] for row, question in zip(quiz_history.result_snapshot['questions'], questions)
+            if not row['is_correct']
+            and explanations.needs_explanation(question.explanation_status, question.explanation_attempted_at, now)
+        )
+        recommendations.record_completion(quiz_history.user_id, quiz_history.quiz_id)
+
+    chat.refresh_activity_summary(quiz_history.user)
+    return correct_answers
+
+
+def sync_answers(quiz_history_id, user, batch, submit=False):
+    """
+    Merge a batch of client answers ([{'q': question id, 'o': shown letter, 't': seconds,
+    's': client sequence}, ...]) into an open attempt's pending answers, and grade them if
+    `submit`. Batches may be retried or arrive out of order: per question the answer with
+    the highest sequence number wins, so replaying a batch changes nothing.
+    Returns (quiz_history, answers accepted); quiz_history is None if not the user's.
+    """
+    with transaction.atomic():
+        quiz_history = QuizHistory.objects.select_for_update().filter(pk=quiz_history_id, user=user).first()
+        if quiz_history is None or quiz_history.completed_at is not None:
+            return quiz_history, 0
+        pending = quiz_history.pending_answers or {}
+        accepted = 0
+        for item in batch:
+            try:
+                key, option, sequence = str(int(item['q'])), item['o'], int(item['s'])
+            except (KeyError, TypeError, ValueError, OverflowError):  # OverflowError: int(1e400) is int(inf)
+                continue
+            if not question_bank.is_letter(option):
+                continue
+            # NaN and infinity are not valid JSON, so pending_answers could not hold them
+            seconds = _seconds(item.get('t'))
+            if key not in pending or pending[key][2] <= sequence:
+                pending[key] = [option, round(seconds, 2), sequence]
+                accepted += 1
+        if submit:
+            grade_attempt(quiz_history, {
+                key: {'selected_option': option, 'time_taken': seconds} for key, (option, seconds, _) in pending.items()
+            })
+            # The graded snapshot and UserAnswer rows now hold them
+            QuizHistory.objects.filter(pk=quiz_history.pk).update(pending_answers=None)
+        elif accepted:
+            quiz_history.pending_answers = pending
+            quiz_history.save(update_fields=['pending_answers', 'updated_at'])
+    return quiz_history, accepted
+
+
+# ---------------- Results ----------------
+
+def _graded_questions(quiz_history):
+    """The attempt's questions in serving order with their answers; only the drawn ones for randomized attempts"""
+    if quiz_history.seed is None:
+        return list(Question.objects.filter(quiz_id=quiz_history.quiz_id).order_by('id').only(*GRADING_FIELDS))
+    ids = question_bank.attempt_ids(quiz_history)
+    by_id = {question.id: question for question in Question.objects.filter(id__in=ids).only(*GRADING_FIELDS)}
+    return [by_id[question_id] for question_id in ids if question_id in by_id]
+
+
+def build_snapshot(quiz_history, questions, selected):
+    """
+    The attempt's results as it showed them: per question the options in shown order and
+    the selected and correct letters as shown. `selected` maps question id -> stored letter.
+    """
+    rows = []
+    for question in questions:
+        order = question_bank.option_order(quiz_history.seed, question.id, quiz_history.options_shuffled)
+        picked = selected.get(question.id)
+        rows.append({
+            'id': question.id,
+            'text': question.text,
+            'options': question_bank.shown_options(question, order),
+            'selected': question_bank.to_shown_letter(order, picked) if picked else None,
+            'correct': question_bank.to_shown_letter(order, question.correct_answer),
+            'is_correct': picked is not None and picked == question.correct_answer,
+        })
+    return {'questions': rows}
+
+
+def result_snapshot(quiz_history):
+    """
+    The results snapshot written at grading; attempts graded before snapshots existed get
+    theirs built from their answers and stored on first view. None until graded.
+    """
+    if quiz_history.result_snapshot is None and quiz_history.completed_at is not None:
+        selected = {answer.question_id: answer.selected_option for answer in archive.answers_for(quiz_history)}
+        quiz_history.result_snapshot = build_snapshot(quiz_history, _graded_questions(quiz_history), selected)
+        QuizHistory.objects.filter(pk=quiz_history.pk).update(result_snapshot=quiz_history.result_snapshot)
+    return quiz_history.result_snapshot
+
+
+def regrade_attempt(quiz_history):
+    """
+    Re-mark a graded attempt against the current answer key, e.g. after a question's
+    correct answer was fixed. Returns how many answers changed.
+    """
+    questions = _graded_questions(quiz_history)
+    correct_options = {question.id: question.correct_answer for question in questions}
+    answers, archived = archive.load_answers(quiz_history)
+    regraded = [
+        answer._replace(is_correct=answer.selected_option == correct_options.get(answer.question_id))
+        for answer in answers
+    ]
+    changed = [answer for answer, old in zip(regraded, answers) if answer.is_correct != old.is_correct]
+
+    with transaction.atomic():
+        if archived is not None:
+            if changed:
+                archive.store(archived, regraded)
+        else:
+            for is_correct in (True, False):
+                question_ids = [answer.question_id for answer in changed if answer.is_correct is is_correct]
+                if question_ids:
+                    quiz_history.user_answers.filter(question_id__in=question_ids).update(
+                        is_correct=is_correct, updated_at=timezone.now())
+        quiz_history.correct_answers = sum(1 for answer in regraded if answer.is_correct)
+        quiz_history.score = (quiz_history.correct_answers / quiz_history.total_questions) * 100 if quiz_history.total_questions > 0 else 0
+        quiz_history.result_snapshot = build_snapshot(
+            quiz_history, questions, {answer.question_id: answer.selected_option for answer in regraded},
+        )
+        quiz_history.save(update_fields=['correct_answers', 'score', 'result_snapshot', 'updated_at'])
+    return len(changed)
@@ -0,0 +1,143 @@
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.templatetags.static import static
+from PIL import Image, ImageOps, features
+
+from myapp.utils import background
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+DEFAULT_AVATAR = 'default-avatar.jpeg'  # under STATICFILES_DIRS
+
+
+def output_format():
+    """WebP when this Pillow build supports it, JPEG otherwise"""
+    if settings.AVATAR_FORMAT == 'WEBP' and features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def rendition_name(content_hash, size):
+    """Storage name of a processed avatar; identical uploads map to the same files"""
+    return f"avatars/{content_hash[:2]}/{content_hash}_{size}.{output_format()[1]}"
+
+
+def avatar_url(obj, size):
+    """URL of `obj`'s avatar at `size` ('sm', 'md' or 'lg'), falling back to the raw upload or the default"""
+    if obj.avatar_hash:
+        return default_storage.url(rendition_name(obj.avatar_hash, size))
+    if obj.avatar:
+        return obj.avatar.url
+    return static(DEFAULT_AVATAR)
+
+
+def validate_avatar(upload):
+    """Cheap request-time checks; resizing happens later in process_avatar"""
+    if upload.size > settings.AVATAR_MAX_UPLOAD_BYTES:
+        raise ValidationError(f"Avatar must be smaller than {settings.AVATAR_MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+        image_format = image.format
+        width, height = image.size
+    except Exception:
+        raise ValidationError("Upload a valid image.")
+    finally:
+        upload.seek(0)
+    if image_format not in ALLOWED_FORMATS:
+        raise ValidationError("Avatar must be a JPEG, PNG, GIF or WebP image.")
+    if width * height > settings.AVATAR_MAX_SOURCE_PIXELS:
+        raise ValidationError("Avatar image dimensions are too large.")
+
+
+def _encode(image, size, crop):
+    image = image.copy()
+    if crop:
+        image = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    else:
+        image.thumbnail((size, size), Image.LANCZOS)
+    pil_format, _ = output_format()
+    if pil_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, pil_format, quality=85)
+    return buffer.getvalue()
+
+
+def _write_renditions(data, content_hash):
+    sizes = {'lg': (settings.AVATAR_MAX_DIMENSION, False)}
+    sizes.update({name: (px, True) for name, px in settings.AVATAR_THUMBNAIL_SIZES.items()})
+    missing = {name: spec for name, spec in sizes.items() if not default_storage.exists(rendition_name(content_hash, name))}
+    if not missing:
+        return  # the same image was uploaded before
+    image = ImageOps.exif_transpose(Image.open(BytesIO(data)))
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    for name, (px, crop) in missing.items():
+        default_storage.save(rendition_name(content_hash, name), ContentFile(_encode(image, px, crop)))
+
+
+def _referenced(name):
+    from myapp.models import CustomUser, Profile
+    return Profile.objects.filter(avatar=name).exists() or CustomUser.objects.filter(avatar=name).exists()
+
+
+def _hash_referenced(content_hash):
+    from myapp.models import CustomUser, Profile
+    return (
+        Profile.objects.filter(avatar_hash=content_hash).exists()
+        or CustomUser.objects.filter(avatar_hash=content_hash).exists()
+    )
+
+
+def delete_orphans(names=(), hashes=()):
+    """Delete avatar files (and renditions of content hashes) that no Profile/CustomUser still uses"""
+    for name in names:
+        if name and name not in settings.AVATAR_PROTECTED_FILES and not _referenced(name):
+            default_storage.delete(name)
+    for content_hash in hashes:
+        if content_hash and not _hash_referenced(content_hash):
+            for size in ['lg', *settings.AVATAR_THUMBNAIL_SIZES]:
+                default_storage.delete(rendition_name(content_hash, size))
+
+
+def process_avatar(model_label, pk, previous_name='', previous_hash=''):
+    """
+    Background job: downsize the raw upload and write content-addressed renditions,
+    point the row at them, then remove files nothing references any more.
+    """
+    from django.apps import apps
+    model = apps.get_model(model_label)
+    obj = model.objects.filter(pk=pk).only('avatar', 'avatar_hash').first()
+    if obj is None or not obj.avatar:
+        return
+    raw_name = obj.avatar.name
+    with obj.avatar.open('rb') as f:
+        data = f.read()
+    content_hash = hashlib.sha256(data).hexdigest()
+    _write_renditions(data, content_hash)
+
+    # Only swap if the user has not uploaded yet another avatar meanwhile
+    model.objects.filter(pk=pk, avatar=raw_name).update(avatar=rendition_name(content_hash, 'lg'), avatar_hash=content_hash)
+    delete_orphans(names=[raw_name, previous_name], hashes=[previous_hash])
+
+
+def schedule_avatar_processing(obj, previous_name='', previous_hash=''):
+    """
+    Call after saving `obj` (a Profile or CustomUser), passing its avatar name and hash from
+    before the edit; queues processing of a new upload or cleanup of a cleared avatar.
+    """
+    if obj.avatar and obj.avatar.name == previous_name:
+        return
+    if obj.avatar_hash:
+        # Serve the raw upload (or the default) until processing finishes
+        obj.avatar_hash = ''
+        type(obj).objects.filter(pk=obj.pk).update(avatar_hash='')
+    if obj.avatar:
+        background.submit(process_avatar, obj._meta.label, obj.pk, previous_name, previous_hash)
+    elif previous_name or previous_hash:
+        background.submit(delete_orphans, [previous_name], [previous_hash])
@@ -0,0 +1,39 @@
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+# Small in-process worker pool for jobs that must not run on the request thread.
+# Jobs are lost if the process exits before they run, so they must be safe to redo later.
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.BACKGROUND_WORKERS, thread_name_prefix='background')
+        return _executor
+
+
+def _run(fn, args, kwargs):
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        print(f"Background task {fn.__name__} failed: {e}")
+        traceback.print_exc()
+    finally:
+        close_old_connections()
+
+
+def submit(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) in the background once the current transaction commits"""
+    if settings.BACKGROUND_TASKS_EAGER:
+        transaction.on_commit(lambda: fn(*args, **kwargs))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_run, fn, args, kwargs))
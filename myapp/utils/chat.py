@@ -0,0 +1,159 @@
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from myapp.models import ChatSession, ChatMessage, QuizActivitySummary, QuizHistory, UserAnswer
+from myapp.utils import archive, background, prompts
+from myapp.utils.prompts import estimate_tokens
+
+# How many of the newest messages are considered when filling the context window
+RECENT_MESSAGES_LIMIT = 50
+
+
+async def get_or_create_session(user, session_id=None):
+    """Return the requested session if it belongs to the user, else the user's latest one"""
+    if session_id:
+        session = await ChatSession.objects.filter(id=session_id, user=user).afirst()
+        if session:
+            return session
+    session = await ChatSession.objects.filter(user=user).order_by('-id').afirst()
+    if session is None:
+        session = await ChatSession.objects.acreate(user=user)
+    return session
+
+
+async def add_message(session, role, content):
+    return await ChatMessage.objects.acreate(
+        session=session,
+        role=role,
+        content=content,
+        tokens=estimate_tokens(content)
+    )
+
+
+async def load_window(session):
+    """
+    The newest messages not yet summarized that fit CHAT_CONTEXT_TOKENS, oldest first.
+    Older unsummarized messages are folded into the summary by summarize_overflow.
+    """
+    rows = [
+        row async for row in ChatMessage.objects
+        .filter(session=session, id__gt=session.summarized_upto)
+        .order_by('-id')
+        .values('id', 'role', 'content', 'tokens')[:RECENT_MESSAGES_LIMIT]
+    ]
+    budget = settings.CHAT_CONTEXT_TOKENS
+    window = []
+    for row in rows:
+        if window and budget - row['tokens'] < 0:
+            break
+        budget -= row['tokens']
+        window.append(row)
+    window.reverse()
+    return window
+
+
+async def get_activity_summary(user):
+    summary = await QuizActivitySummary.objects.filter(user=user).values_list('text', flat=True).afirst()
+    return summary or ''
+
+
+def build_contents(session, window, activity_summary, system_prompt):
+    """Build the multi-turn Gemini `contents` for the current window"""
+    preamble = [system_prompt.render()]
+    if session.summary:
+        preamble.append(f"Summary of the earlier conversation:\n{session.summary}")
+    if activity_summary:
+        preamble.append(f"The user's recent quiz activity:\n{activity_summary}")
+
+    contents = [
+        {'role': 'user', 'parts': ["\n\n".join(preamble)]},
+        {'role': 'model', 'parts': ["Understood."]},
+    ]
+    for row in window:
+        contents.append({'role': row['role'], 'parts': [row['content']]})
+    return contents
+
+
+def build_summary_prompt(template, previous_summary, overflow):
+    transcript = "\n".join(f"{row['role']}: {row['content']}" for row in overflow)
+    return template.render(previous_summary=previous_summary or '(none)', transcript=transcript)
+
+
+async def summarize_overflow(session, window, generator):
+    """
+    Fold every unsummarized message older than `window` into the session summary, once
+    CHAT_SUMMARY_BATCH of them have piled up. They are read from the database, oldest
+    first and RECENT_MESSAGES_LIMIT per call, not from the capped window read, so none
+    drop out of the context unsummarized.
+    """
+    if not window:
+        return
+    older = ChatMessage.objects.filter(session=session, id__lt=window[0]['id']).order_by('id')
+    if await older.filter(id__gt=session.summarized_upto).acount() < settings.CHAT_SUMMARY_BATCH:
+        return
+    template = await prompts.aselect('chat_summary')
+    while True:
+        overflow = [
+            row async for row in older.filter(id__gt=session.summarized_upto)
+            .values('id', 'role', 'content')[:RECENT_MESSAGES_LIMIT]
+        ]
+        if not overflow:
+            return
+        summary = await generator.summarize_text_async(
+            build_summary_prompt(template, session.summary, overflow), session.user_id, template.id,
+        )
+        if not summary:
+            return
+        session.summary = summary
+        session.summarized_upto = overflow[-1]['id']
+        await session.asave(update_fields=['summary', 'summarized_upto', 'updated_at'])
+
+
+def summarize_in_background(session, window, generator):
+    """
+    Queue summarize_overflow on the background pool. Its Gemini calls (one per
+    RECENT_MESSAGES_LIMIT older messages) then neither keep the reply's stream open nor
+    hold its LLM slot.
+    """
+    background.submit(_summarize_overflow_job, session, window, generator)
+
+
+def _summarize_overflow_job(session, window, generator):
+    async_to_sync(summarize_overflow)(session, window, generator)
+
+
+def refresh_activity_summary(user, recent_attempts=5, recent_mistakes=5):
+    """Recompute the user's QuizActivitySummary; called once per graded attempt"""
+    histories = (
+        QuizHistory.objects.filter(user=user, completed_at__isnull=False)
+        .select_related('quiz')
+        .defer('result_snapshot')
+        .order_by('-created_at')[:recent_attempts]
+    )
+    mistakes = [
+        (answer.question, answer.selected_option)
+        for answer in UserAnswer.objects.filter(history__user=user, is_correct=False)
+        .select_related('question')
+        .order_by('-id')[:recent_mistakes]
+    ]
+    if len(mistakes) < recent_mistakes:
+        # Older attempts may have been archived (their answers packed, see myapp.utils.archive)
+        mistakes += archive.recent_mistakes(user, recent_mistakes - len(mistakes))
+
+    lines = []
+    for history in histories:
+        lines.append(
+            f"- {history.quiz.title} ({history.quiz.get_difficulty_display()}): "
+            f"{history.correct_answers}/{history.total_questions} correct"
+        )
+    mistake_lines = []
+    for question, selected_option in mistakes:
+        options = question.get_options_dict()
+        mistake_lines.append(
+            f"- \"{question.text[:200]}\" answered {selected_option}) {options.get(selected_option, '')}; "
+            f"correct is {question.correct_answer}) {question.get_correct_option()}"
+        )
+    if mistake_lines:
+        lines.append("Recently missed questions:")
+        lines.extend(mistake_lines)
+
+    QuizActivitySummary.objects.update_or_create(user=user, defaults={'text': "\n".join(lines)})
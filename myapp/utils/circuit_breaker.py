@@ -0,0 +1,82 @@
+import threading
+import time
+
+from myapp.utils import metrics
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency while its circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker. After `failure_threshold` consecutive failures the circuit
+    opens and calls are rejected for `reset_timeout` seconds; then a single trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+    CLOSED = 'closed'
+    HALF_OPEN = 'half_open'
+    OPEN = 'open'
+
+    STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        self._publish()
+
+    def allow(self):
+        """Whether a call may proceed now"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+        metrics.increment(f'{self.name}.short_circuited')
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def abandon(self):
+        """Forget an in-flight call without recording an outcome (e.g. the caller was cancelled)"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                if self.state != self.OPEN:
+                    metrics.increment(f'{self.name}.opened')
+                self._set_state(self.OPEN)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'open_for_seconds': round(time.monotonic() - self.opened_at, 1) if self.state == self.OPEN else 0,
+            }
+
+    def _set_state(self, state):
+        self.state = state
+        self._publish()
+
+    def _publish(self):
+        metrics.set_gauge(f'{self.name}.breaker_state', self.STATE_GAUGE[self.state])
@@ -0,0 +1,83 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from myapp.models import Question
+from myapp.utils import background
+from myapp.utils.gemini_helper import gemini_generator
+from myapp.utils.ratelimit import budget_retry_after
+
+# AI explanations of correct answers, generated once per Question in the background and
+# shared by every results page that shows it. A job claims a question with a conditional
+# UPDATE before calling Gemini, so concurrent requests for the same question make one call.
+# Failed or lost jobs become claimable again after EXPLANATION_RETRY_MINUTES.
+
+
+def _retry_cutoff(now):
+    return now - timedelta(minutes=settings.EXPLANATION_RETRY_MINUTES)
+
+
+def needs_explanation(status, attempted_at, now=None):
+    """Whether a question with this explanation state may be (re)claimed now"""
+    if status == Question.EXPLANATION_NONE:
+        return True
+    if status == Question.EXPLANATION_READY:
+        return False
+    return attempted_at is None or attempted_at < _retry_cutoff(now or timezone.now())
+
+
+def request_explanations(question_ids):
+    """Generate missing explanations after the current transaction commits"""
+    question_ids = sorted(set(question_ids))
+    if settings.QUESTION_EXPLANATIONS and question_ids:
+        background.submit(generate_explanations, question_ids)
+
+
+def generate_explanations(question_ids):
+    """Background job: claim each question that still needs an explanation and generate it"""
+    for question_id in question_ids:
+        now = timezone.now()
+        claimable = Q(explanation_status=Question.EXPLANATION_NONE) | Q(
+            ~Q(explanation_status=Question.EXPLANATION_READY),
+            Q(explanation_attempted_at__isnull=True) | Q(explanation_attempted_at__lt=_retry_cutoff(now)),
+        )
+        claimed = Question.objects.filter(claimable, pk=question_id).update(
+            explanation_status=Question.EXPLANATION_PENDING, explanation_attempted_at=now,
+        )
+        if not claimed:
+            continue
+        if budget_retry_after():
+            Question.objects.filter(pk=question_id).update(explanation_status=Question.EXPLANATION_FAILED)
+            return
+        question = Question.objects.only('text', 'option1', 'option2', 'option3', 'option4', 'correct_answer').get(pk=question_id)
+        try:
+            explanation = gemini_generator.generate_explanation(question)
+        except Exception as e:
+            print(f"Explanation for question {question_id} failed: {e}")
+            Question.objects.filter(pk=question_id).update(explanation_status=Question.EXPLANATION_FAILED)
+            continue
+        Question.objects.filter(pk=question_id).update(
+            explanation=explanation, explanation_status=Question.EXPLANATION_READY,
+        )
+
+
+def explanations_for(question_ids):
+    """
+    {question_id: explanation} for those of `question_ids` that have one; queues
+    generation for the others that are claimable. One query.
+    """
+    if not question_ids:
+        return {}
+    now = timezone.now()
+    explained, missing = {}, []
+    rows = Question.objects.filter(id__in=question_ids).values_list(
+        'id', 'explanation', 'explanation_status', 'explanation_attempted_at')
+    for question_id, explanation, status, attempted_at in rows:
+        if status == Question.EXPLANATION_READY:
+            explained[question_id] = explanation
+        elif needs_explanation(status, attempted_at, now):
+            missing.append(question_id)
+    request_explanations(missing)
+    return explained
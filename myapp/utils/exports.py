@@ -0,0 +1,183 @@
+import csv
+import os
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from myapp.models import ArchivedAttempt, ExportMark, Question, QuizHistory, UserAnswer
+from myapp.utils import archive
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # optional; without it only the csv format is available
+    pa = None
+
+# Columnar analytics export (the `export_attempts` command). Attempts and answers are read
+# in keyset-paginated chunks ordered by (updated_at, id), joined with their quiz/question
+# metadata in the same query, and written as one file per chunk and creation date:
+#   <output>/<dataset>/date=YYYY-MM-DD/part-<run>-<chunk>.parquet
+# Memory stays at one chunk, and each query is a short indexed range read, so SQLite is
+# never held by a long read transaction.
+# Incremental runs continue after the ExportMark of each dataset. A row changed since it
+# was exported (a regrade, an attempt completed later) is exported again into its original
+# date partition, so readers keep the row with the latest updated_at per id. Rows are only
+# exported once they are EXPORT_SAFETY_LAG_SECONDS old, so transactions still in flight when
+# a run starts cannot commit a row behind the mark.
+# Answers of archived attempts (myapp.utils.archive) no longer have rows. The
+# `archived_answers` dataset unpacks them from ArchivedAttempt, with the answers columns
+# except the row id: an answer is identified by (attempt_id, question_id) there, and may
+# appear in both datasets if it was exported before its attempt was archived. An archived
+# attempt is exported again when it is re-graded.
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow', 'csv': '.csv'}
+
+Column = namedtuple('Column', 'name path type')
+# `source` and `expand` are for datasets whose rows are not model rows: `source` (paths read
+# per model row) is turned into output rows in `columns` order by `expand(source rows)`
+Dataset = namedtuple('Dataset', 'name model columns source expand', defaults=(None, None))
+
+DATASETS = {
+    'attempts': Dataset('attempts', QuizHistory, [
+        Column('id', 'id', 'int'),
+        Column('user_id', 'user_id', 'int'),
+        Column('quiz_id', 'quiz_id', 'int'),
+        Column('quiz_title', 'quiz__title', 'str'),
+        Column('quiz_difficulty', 'quiz__difficulty', 'str'),
+        Column('category', 'quiz__category__name', 'str'),
+        Column('subcategory', 'quiz__subcategory__name', 'str'),
+        Column('topic_id', 'quiz__topic_id', 'int'),
+        Column('live_session_id', 'live_session_id', 'int'),
+        Column('selected_difficulty', 'selected_difficulty', 'str'),
+        Column('score', 'score', 'float'),
+        Column('correct_answers', 'correct_answers', 'int'),
+        Column('total_questions', 'total_questions', 'int'),
+        Column('started_at', 'started_at', 'timestamp'),
+        Column('completed_at', 'completed_at', 'timestamp'),
+        Column('created_at', 'created_at', 'timestamp'),
+        Column('updated_at', 'updated_at', 'timestamp'),
+    ]),
+    'answers': Dataset('answers', UserAnswer, [
+        Column('id', 'id', 'int'),
+        Column('attempt_id', 'history_id', 'int'),
+        Column('user_id', 'history__user_id', 'int'),
+        Column('quiz_id', 'history__quiz_id', 'int'),
+        Column('question_id', 'question_id', 'int'),
+        Column('question_difficulty', 'question__difficulty', 'str'),
+        Column('selected_option', 'selected_option', 'str'),
+        Column('correct_option', 'question__correct_answer', 'str'),  # the current answer key
+        Column('is_correct', 'is_correct', 'bool'),
+        Column('time_taken', 'time_taken', 'float'),
+        Column('created_at', 'created_at', 'timestamp'),
+        Column('updated_at', 'updated_at', 'timestamp'),
+    ]),
+}
+
+
+def _archived_answer_rows(rows):
+    """Answer rows, in the columns of `archived_answers`, of a chunk of ArchivedAttempt source rows"""
+    records = [(row, archive.unpack(row[3])) for row in rows]
+    questions = Question.objects.only('difficulty', 'correct_answer').in_bulk(
+        {record.question_id for _, unpacked in records for record in unpacked}
+    )
+    answer_rows = []
+    for (attempt_id, user_id, quiz_id, _, created_at, updated_at), unpacked in records:
+        for record in unpacked:
+            question = questions.get(record.question_id)
+            answer_rows.append((
+                attempt_id, user_id, quiz_id, record.question_id, question and question.difficulty,
+                record.selected_option, question and question.correct_answer, record.is_correct, record.time_taken,
+                created_at, updated_at,
+            ))
+    return answer_rows
+
+
+DATASETS['archived_answers'] = Dataset(
+    'archived_answers', ArchivedAttempt,
+    [column for column in DATASETS['answers'].columns if column.name != 'id'],
+    source=['history_id', 'history__user_id', 'history__quiz_id', 'answers', 'history__created_at', 'updated_at'],
+    expand=_archived_answer_rows,
+)
+
+
+def _arrow_schema(dataset):
+    types = {
+        'int': pa.int64(), 'float': pa.float64(), 'bool': pa.bool_(), 'str': pa.string(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([(column.name, types[column.type]) for column in dataset.columns])
+
+
+def _write(path, dataset, rows, fmt):
+    """Write rows (value tuples in column order) to `path`, via a temporary name so readers never see half a file"""
+    partial = path + '.partial'
+    if fmt == 'csv':
+        with open(partial, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow([column.name for column in dataset.columns])
+            writer.writerows(
+                [value.isoformat() if hasattr(value, 'isoformat') else value for value in row] for row in rows
+            )
+    else:
+        schema = _arrow_schema(dataset)
+        table = pa.Table.from_arrays(
+            [pa.array(values, type=schema.field(i).type) for i, values in enumerate(zip(*rows))], schema=schema,
+        )
+        if fmt == 'parquet':
+            pa.parquet.write_table(table, partial, compression='zstd')
+        else:
+            with pa.ipc.new_file(partial, schema) as writer:
+                writer.write_table(table)
+    os.replace(partial, path)
+
+
+def export(name, output_dir, fmt='parquet', chunk_size=None, full=False):
+    """
+    Export the rows of dataset `name` changed since its high-water mark (all rows with
+    `full`). Returns (rows, files) written. Safe to interrupt: the mark advances after
+    each chunk's files are in place.
+    """
+    if fmt != 'csv' and pa is None:
+        raise RuntimeError(f"The {fmt} format needs pyarrow (pip install pyarrow); use --format csv without it")
+    dataset = DATASETS[name]
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    paths = dataset.source or [column.path for column in dataset.columns]
+    id_index, updated_index = paths.index(dataset.model._meta.pk.attname), paths.index('updated_at')
+    created_index = [column.name for column in dataset.columns].index('created_at')
+
+    export_mark, _ = ExportMark.objects.get_or_create(name=name)
+    mark, last_id = (None, 0) if full else (export_mark.mark, export_mark.last_id)
+    until = timezone.now() - timedelta(seconds=settings.EXPORT_SAFETY_LAG_SECONDS)
+    queryset = dataset.model.objects.filter(updated_at__lte=until).order_by('updated_at', 'pk')
+    run = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+
+    rows_written = files_written = chunk = 0
+    while True:
+        page = queryset
+        if mark is not None:
+            # One range on the (updated_at, id) index, read in index order; an OR of the two
+            # cases would make the database sort everything after the mark for every chunk
+            page = page.filter(updated_at__gte=mark).exclude(updated_at=mark, pk__lte=last_id)
+        rows = list(page.values_list(*paths)[:chunk_size])
+        if not rows:
+            break
+        out = dataset.expand(rows) if dataset.expand else rows
+        partitions = defaultdict(list)
+        for row in out:
+            partitions[row[created_index].date()].append(row)
+        for day, day_rows in partitions.items():
+            directory = os.path.join(output_dir, name, f"date={day.isoformat()}")
+            os.makedirs(directory, exist_ok=True)
+            _write(os.path.join(directory, f"part-{run}-{chunk:05d}{FORMATS[fmt]}"), dataset, day_rows, fmt)
+            files_written += 1
+        rows_written += len(out)
+        chunk += 1
+        mark, last_id = rows[-1][updated_index], rows[-1][id_index]
+        ExportMark.objects.filter(pk=export_mark.pk).update(
+            mark=mark, last_id=last_id, rows_exported=(0 if full else export_mark.rows_exported) + rows_written,
+            updated_at=timezone.now(),
+        )
+    return rows_written, files_written
@@ -1,41 +1,251 @@
-import google.generativeai as genai
 from django.conf import settings
-from myapp.models import AIGenerationLog, Category, SubCategory
+from myapp.models import AIGenerationLog, Question
+from myapp.utils import metrics, prompts
+from myapp.utils.prompts import estimate_tokens
+from myapp.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, TimeoutError as FutureTimeoutError, wait
+import asyncio
+import json
 import re
 import time
 
 class GeminiQuizGenerator:
+    MODEL_NAME = 'models/gemini-2.5-pro'
+
     def __init__(self):
-        # Configure Gemini API
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('models/gemini-2.5-pro')
+        self._model = None
+        self.breaker = CircuitBreaker(
+            'gemini',
+            failure_threshold=settings.GEMINI_BREAKER_FAILURES,
+            reset_timeout=settings.GEMINI_BREAKER_RESET_SECONDS
+        )
+        self._hedge_pool = None
+
+    @property
+    def model(self):
+        # google.generativeai takes about a second to import, so it is loaded on first use
+        # (or by the deploy warm-up, see myapp.utils.warmup) rather than with this module
+        if self._model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+            self._model = genai.GenerativeModel(self.MODEL_NAME)
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+
+    def warm(self):
+        """Import and configure the Gemini client now instead of in the first request that needs it"""
+        self.model
+        from google.generativeai import client
+        client.get_default_generative_client()
+
+    # ---------------- Resilient model calls ----------------
+
+    def _hedge_delay(self):
+        """Delay before a hedged request: the observed p95 latency, never below the configured minimum"""
+        p95 = metrics.percentile('gemini.latency', 95, min_samples=20)
+        return max(p95 or 0, settings.GEMINI_HEDGE_MIN_DELAY_SECONDS)
+
+    def _record(self, started, error=None):
+        elapsed = time.monotonic() - started
+        if error is None:
+            self.breaker.record_success()
+            metrics.observe('gemini.latency', elapsed)
+        else:
+            self.breaker.record_failure()
+            metrics.increment('gemini.timeouts' if isinstance(error, (TimeoutError, FutureTimeoutError)) else 'gemini.failures')
+
+    def _call(self, contents, timeout):
+        return self.model.generate_content(contents, request_options={'timeout': timeout})
+
+    def _generate(self, contents):
+        """
+        Call Gemini with the circuit breaker, a hard per-call deadline and, if enabled,
+        a hedged second request. Raises CircuitOpenError without calling Gemini while the circuit is open.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("Gemini circuit is open")
+        metrics.increment('gemini.calls')
+        started = time.monotonic()
+        try:
+            if settings.GEMINI_HEDGE_REQUESTS:
+                response = self._hedged_call(contents)
+            else:
+                response = self._call(contents, settings.GEMINI_TIMEOUT_SECONDS)
+        except Exception as e:
+            self._record(started, e)
+            raise
+        self._record(started)
+        return response
+
+    def _hedged_call(self, contents):
+        if self._hedge_pool is None:
+            self._hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='gemini-hedge')
+        deadline = time.monotonic() + settings.GEMINI_TIMEOUT_SECONDS
+        first = self._hedge_pool.submit(self._call, contents, settings.GEMINI_TIMEOUT_SECONDS)
+        try:
+            return first.result(timeout=self._hedge_delay())
+        except FutureTimeoutError:
+            pass
+
+        metrics.increment('gemini.hedged')
+        second = self._hedge_pool.submit(self._call, contents, max(deadline - time.monotonic(), 1))
+        pending, error = {first, second}, None
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError("Gemini call exceeded its deadline")
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        metrics.increment('gemini.hedge_wins')
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _acall(self, contents, timeout, **kwargs):
+        return await asyncio.wait_for(
+            self.model.generate_content_async(contents, request_options={'timeout': timeout}, **kwargs),
+            timeout
+        )
+
+    async def _agenerate(self, contents):
+        """Async variant of _generate; a losing hedged request is cancelled"""
+        if not self.breaker.allow():
+            raise CircuitOpenError("Gemini circuit is open")
+        metrics.increment('gemini.calls')
+        started = time.monotonic()
+        try:
+            if settings.GEMINI_HEDGE_REQUESTS:
+                response = await self._ahedged_call(contents)
+            else:
+                response = await self._acall(contents, settings.GEMINI_TIMEOUT_SECONDS)
+        except asyncio.CancelledError:
+            self.breaker.abandon()  # a client disconnect says nothing about Gemini's health
+            raise
+        except Exception as e:
+            self._record(started, e)
+            raise
+        self._record(started)
+        return response
+
+    async def _ahedged_call(self, contents):
+        deadline = time.monotonic() + settings.GEMINI_TIMEOUT_SECONDS
+        tasks = [asyncio.ensure_future(self._acall(contents, settings.GEMINI_TIMEOUT_SECONDS))]
+        first = tasks[0]
+        # Every exit, including the caller being cancelled while waiting, cancels what still runs
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self._hedge_delay())
+            if done:
+                return first.result()
+
+            metrics.increment('gemini.hedged')
+            second = asyncio.ensure_future(self._acall(contents, max(deadline - time.monotonic(), 1)))
+            tasks.append(second)
+            pending, error = {first, second}, None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(deadline - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise TimeoutError("Gemini call exceeded its deadline")
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            metrics.increment('gemini.hedge_wins')
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    # ---------------- Quiz generation ----------------
     
-    def generate_quiz_questions(self, category, subcategory, difficulty, num_questions=10, user=None):
+    def request_quiz_questions(self, category, subcategory, difficulty, num_questions=10, user=None,
+                               category_id=None, subcategory_id=None):
+        """
+        Ask Gemini for quiz questions and return what parsed; no fallback data.
+        Errors (timeouts, open circuit) are raised to the caller.
+        """
+        template = prompts.select('quiz')
+        prompt = self._build_prompt(template, category, subcategory, difficulty, num_questions)
+        started = time.monotonic()
+        response = self._generate(prompt)
+        latency_ms = int((time.monotonic() - started) * 1000)
+        questions = self._parse_response(response.text, num_questions)
+        self._log_generation(category_id, subcategory_id, difficulty, num_questions, len(questions), user,
+                             template.id, self._usage(response, prompt), latency_ms)
+        return questions
+
+    def generate_quiz_questions(self, category, subcategory, difficulty, num_questions=10, user=None,
+                                category_id=None, subcategory_id=None):
         """
         Generate quiz questions using Gemini AI with fallback to dummy data
         """
-        prompt = self._build_prompt(category, subcategory, difficulty, num_questions)
-        
         try:
-            # Try to use Gemini API with timeout
-            response = self.model.generate_content(prompt)
-            print("=== GEMINI RESPONSE ===")
-            print(response.text)
-            print("======================")
-            
-            questions = self._parse_response(response.text, num_questions)
-            
+            questions = self.request_quiz_questions(category, subcategory, difficulty, num_questions, user,
+                                                    category_id, subcategory_id)
             if questions:
-                self._log_generation(category, subcategory, difficulty, num_questions, user, prompt)
                 return questions
             
         except Exception as e:
             print(f"Gemini API error: {e}")
-            # Fallback to dummy data
-            return self._generate_fallback_questions(num_questions, category, subcategory, difficulty)
+            # Reuse existing questions for the topic, else fall back to dummy data
+            pool = self._pool_questions(category, subcategory, difficulty, num_questions)
+            return pool or self._generate_fallback_questions(num_questions, category, subcategory, difficulty)
         
         # If Gemini returns no questions, use fallback
         return self._generate_fallback_questions(num_questions, category, subcategory, difficulty)
+
+    async def generate_quiz_questions_async(self, category, subcategory, difficulty, num_questions=10, user=None,
+                                            category_id=None, subcategory_id=None):
+        """
+        Async variant of generate_quiz_questions for ASGI views.
+        Cancellation (e.g. the client disconnected) is propagated, not turned into fallback data.
+        """
+        try:
+            template = await prompts.aselect('quiz')
+            prompt = self._build_prompt(template, category, subcategory, difficulty, num_questions)
+            started = time.monotonic()
+            response = await self._agenerate(prompt)
+            latency_ms = int((time.monotonic() - started) * 1000)
+            questions = self._parse_response(response.text, num_questions)
+            await self._alog_generation(category_id, subcategory_id, difficulty, num_questions, len(questions), user,
+                                        template.id, self._usage(response, prompt), latency_ms)
+
+            if questions:
+                return questions
+
+        except asyncio.CancelledError:
+            print(f"Gemini request cancelled: {category} / {subcategory}")
+            raise
+        except Exception as e:
+            print(f"Gemini API error: {e}")
+            pool = await self._apool_questions(category, subcategory, difficulty, num_questions)
+            if pool:
+                return pool
+
+        return self._generate_fallback_questions(num_questions, category, subcategory, difficulty)
+
+    def _pool_queryset(self, category, subcategory, difficulty, num_questions):
+        return (
+            Question.objects.filter(quiz__category__name=category, quiz__subcategory__name=subcategory, difficulty=difficulty)
+            .order_by('-id')
+            .values('text', 'option1', 'option2', 'option3', 'option4', 'correct_answer')[:num_questions]
+        )
+
+    def _pool_questions(self, category, subcategory, difficulty, num_questions):
+        """Existing questions for the topic, used while Gemini is failing; [] unless the pool covers the request"""
+        questions = list(self._pool_queryset(category, subcategory, difficulty, num_questions))
+        return questions if len(questions) == num_questions else []
+
+    async def _apool_questions(self, category, subcategory, difficulty, num_questions):
+        questions = [q async for q in self._pool_queryset(category, subcategory, difficulty, num_questions)]
+        return questions if len(questions) == num_questions else []
     
     def _generate_fallback_questions(self, num_questions, category, subcategory, difficulty):
         """Generate fallback questions when Gemini fails"""
@@ -51,24 +261,11 @@ class GeminiQuizGenerator:
             })
         return questions
     
-    def _build_prompt(self, category, subcategory, difficulty, num_questions):
-        """Build the prompt for Gemini AI"""
-        return f"""
-Generate exactly {num_questions} multiple-choice quiz questions about {subcategory} under {category} category. Difficulty: {difficulty}.
-FORMAT REQUIREMENTS:
-- Each question must follow this EXACT format:
-Question: [question text here]
-A) [option A text]
-B) [option B text]
-C) [option C text]
-D) [option D text]
-Correct: [letter A-D]
-- Questions should be diverse and appropriate for {difficulty} level
-- Each question must have exactly 4 options
-- The correct answer must be one of A, B, C, or D
-- Do not include any additional text, explanations, or numbering
-- Make sure each option is a complete, meaningful answer
-"""
+    def _build_prompt(self, template, category, subcategory, difficulty, num_questions):
+        """Build the prompt for Gemini AI from the selected registry template"""
+        return template.render(
+            num_questions=num_questions, category=category, subcategory=subcategory, difficulty=difficulty
+        )
     
     def _parse_response(self, response_text, num_questions):
         """Parse Gemini response into structured questions"""
@@ -130,34 +327,154 @@ Correct: [letter A-D]
         
         return questions[:num_questions]
     
-    def _log_generation(self, category, subcategory, difficulty, num_questions, user, prompt):
-        """Log AI generation activity"""
+    def _usage(self, response, prompt):
+        """(tokens_in, tokens_out) from the response's usage metadata, estimated if it is missing"""
+        meta = getattr(response, "usage_metadata", None)
+        if meta and getattr(meta, "prompt_token_count", 0):
+            return meta.prompt_token_count, meta.candidates_token_count or 0
+        return estimate_tokens(str(prompt)), estimate_tokens(getattr(response, "text", "") or "")
+
+    def _log_generation(self, category_id, subcategory_id, difficulty, num_questions, questions_generated, user,
+                        prompt_template_id=None, usage=(0, 0), latency_ms=0):
+        """Log AI generation activity; the prompt is recorded as a reference to its template"""
         try:
-            cat_obj = Category.objects.filter(name=category).first()
-            subcat_obj = SubCategory.objects.filter(name=subcategory, category=cat_obj).first() if cat_obj else None
-            
             AIGenerationLog.objects.create(
-                category=cat_obj,
-                subcategory=subcat_obj,
+                category_id=category_id,
+                subcategory_id=subcategory_id,
+                difficulty=difficulty,
+                questions_requested=num_questions,
+                questions_generated=questions_generated,
+                generated_by=user,
+                prompt_template_id=prompt_template_id,
+                tokens_in=usage[0],
+                tokens_out=usage[1],
+                latency_ms=latency_ms
+            )
+        except Exception as e:
+            print(f"Error logging generation: {e}")
+
+    async def _alog_chat(self, user_id, usage, latency_ms, prompt_template_id=None):
+        """Log chatbot token usage so it counts against the daily LLM budget"""
+        try:
+            await AIGenerationLog.objects.acreate(
+                kind='chat',
+                generated_by_id=user_id,
+                prompt_template_id=prompt_template_id,
+                tokens_in=usage[0],
+                tokens_out=usage[1],
+                latency_ms=latency_ms
+            )
+        except Exception as e:
+            print(f"Error logging chat usage: {e}")
+
+    async def _alog_generation(self, category_id, subcategory_id, difficulty, num_questions, questions_generated, user,
+                               prompt_template_id=None, usage=(0, 0), latency_ms=0):
+        """Async variant of _log_generation"""
+        try:
+            await AIGenerationLog.objects.acreate(
+                category_id=category_id,
+                subcategory_id=subcategory_id,
                 difficulty=difficulty,
-                questions_generated=num_questions,
+                questions_requested=num_questions,
+                questions_generated=questions_generated,
                 generated_by=user,
-                prompt_used=prompt
+                prompt_template_id=prompt_template_id,
+                tokens_in=usage[0],
+                tokens_out=usage[1],
+                latency_ms=latency_ms
             )
         except Exception as e:
             print(f"Error logging generation: {e}")
 
 
+    def generate_explanation(self, question):
+        """Explanation of `question`'s correct answer; raises on failure so the caller can retry later"""
+        template = prompts.select('explanation')
+        prompt = template.render(
+            question=question.text, option1=question.option1, option2=question.option2,
+            option3=question.option3, option4=question.option4, correct_answer=question.correct_answer,
+        )
+        started = time.monotonic()
+        response = self._generate(prompt)
+        latency_ms = int((time.monotonic() - started) * 1000)
+        text = (response.text or "").strip()
+        usage = self._usage(response, prompt)
+        try:
+            AIGenerationLog.objects.create(
+                kind='explanation',
+                prompt_template_id=template.id,
+                tokens_in=usage[0],
+                tokens_out=usage[1],
+                latency_ms=latency_ms
+            )
+        except Exception as e:
+            print(f"Error logging explanation: {e}")
+        if not text:
+            raise ValueError("empty explanation")
+        return text
+
+    def translate_items(self, items, locale):
+        """
+        Translate `items` ([{'id': key, field: source text, ...}, ...]) into `locale` in one call.
+        Returns {key: {field: translated text}} for the items that came back complete; raises
+        on failure so the caller can retry later.
+        """
+        template = prompts.select('translation')
+        prompt = template.render(
+            source_language=settings.QUIZ_LOCALES.get(settings.QUIZ_SOURCE_LOCALE, settings.QUIZ_SOURCE_LOCALE),
+            language=settings.QUIZ_LOCALES.get(locale, locale),
+            items=json.dumps(items, ensure_ascii=False),
+        )
+        started = time.monotonic()
+        response = self._generate(prompt)
+        latency_ms = int((time.monotonic() - started) * 1000)
+        translated = self._parse_translations(response.text or "", items)
+        usage = self._usage(response, prompt)
+        try:
+            AIGenerationLog.objects.create(
+                kind='translation',
+                questions_requested=len(items),
+                questions_generated=len(translated),
+                prompt_template_id=template.id,
+                tokens_in=usage[0],
+                tokens_out=usage[1],
+                latency_ms=latency_ms
+            )
+        except Exception as e:
+            print(f"Error logging translation: {e}")
+        return translated
+
+    def _parse_translations(self, response_text, items):
+        """{id: {field: text}} for the returned objects that have every field of their source item"""
+        text = re.sub(r'^```(?:json)?\s*|\s*```$', '', response_text.strip())
+        try:
+            returned = json.loads(text)
+        except ValueError:
+            print(f"Could not parse translation response: {text[:200]}")
+            return {}
+        sources = {item['id']: item for item in items}
+        translated = {}
+        for obj in returned if isinstance(returned, list) else []:
+            source = sources.get(obj.get('id')) if isinstance(obj, dict) else None
+            if source is None:
+                continue
+            fields = {field: obj.get(field) for field in source if field != 'id'}
+            # Every field must come back as text, and only empty sources may translate to nothing
+            if all(isinstance(value, str) and (value.strip() or not source[field]) for field, value in fields.items()):
+                translated[source['id']] = {field: value.strip() for field, value in fields.items()}
+        return translated
+
     def generate_chat_response(self, user_message, user=None):
         """
         Generate a chatbot response using Gemini AI.
         Fallbacks to a default message if Gemini fails.
         """
         try:
-            prompt = f"You are a helpful quiz assistant. The user says: {user_message}"
+            system_prompt = prompts.select('chat_system', key=getattr(user, 'id', None))
+            prompt = f"{system_prompt.render()}\n\nThe user says: {user_message}"
 
             # Call Gemini API
-            response = self.model.generate_content(prompt)
+            response = self._generate(prompt)
 
             # Extract plain text
             reply_text = response.text if response and hasattr(response, "text") else None
@@ -168,5 +485,58 @@ Correct: [letter A-D]
             print(f"Gemini chat error: {e}")
             return "⚠️ Oops, something went wrong while generating a response."
 
+    async def stream_chat_response(self, contents, user_id=None, prompt_template_id=None):
+        """
+        Stream a chatbot reply for multi-turn `contents`, yielding text chunks as they arrive.
+        Yields a fallback message if Gemini fails before producing any text.
+        """
+        produced = []
+        last_chunk = None
+        started = time.monotonic()
+        if not self.breaker.allow():
+            yield "⚠️ The assistant is temporarily unavailable, please try again in a minute."
+            return
+        metrics.increment('gemini.calls')
+        try:
+            # The deadline covers the time to the first chunk; the breaker sees the whole stream
+            response = await self._acall(contents, settings.GEMINI_TIMEOUT_SECONDS, stream=True)
+            async for chunk in response:
+                last_chunk = chunk
+                text = getattr(chunk, "text", "")
+                if text:
+                    produced.append(text)
+                    yield text
+            self.breaker.record_success()
+            metrics.observe('gemini.stream_latency', time.monotonic() - started)
+
+        except asyncio.CancelledError:
+            self.breaker.abandon()
+            print("Gemini chat request cancelled")
+            raise
+        except Exception as e:
+            self._record(started, e)
+            print(f"Gemini chat error: {e}")
+
+        if last_chunk is not None:
+            usage = self._usage(last_chunk, contents)
+            if not getattr(getattr(last_chunk, "usage_metadata", None), "prompt_token_count", 0):
+                usage = (usage[0], estimate_tokens("".join(produced)))
+            await self._alog_chat(user_id, usage, int((time.monotonic() - started) * 1000), prompt_template_id)
+
+        if not produced:
+            yield "⚠️ Oops, something went wrong while generating a response."
+
+    async def summarize_text_async(self, prompt, user_id=None, prompt_template_id=None):
+        """Single-shot generation used to compact chat history; returns '' on failure"""
+        try:
+            started = time.monotonic()
+            response = await self._agenerate(prompt)
+            await self._alog_chat(user_id, self._usage(response, prompt), int((time.monotonic() - started) * 1000),
+                                  prompt_template_id)
+            return (response.text or "").strip()
+        except Exception as e:
+            print(f"Gemini summary error: {e}")
+            return ""
+
 # Singleton instance
 gemini_generator = GeminiQuizGenerator()
\ No newline at end of file
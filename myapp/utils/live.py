@@ -0,0 +1,346 @@
+import asyncio
+import heapq
+import json
+import secrets
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from myapp.models import LiveSession, Question, QuizHistory, UserAnswer
+from myapp.utils import attempts, question_bank, recommendations, reviews
+from myapp.utils.pubsub import get_broker
+
+# Live quiz sessions: a host paces a quiz and participants answer over WebSockets.
+# Each session has one runner task that owns its state: it grades answers in memory
+# against the answer key loaded at start, publishes a throttled leaderboard, and writes
+# every participant's QuizHistory/UserAnswer rows in bulk when the session ends.
+# Sockets and the runner only talk through the pub/sub broker:
+#   live:<code>               broadcast to everyone in the session
+#   live:<code>:user:<id>     one participant
+#   live:<code>:actions       joins, answers and host commands, consumed by the runner
+
+HOST_ACTIONS = {'start', 'reveal', 'next', 'end'}
+CODE_ALPHABET = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'  # no 0/O or 1/I
+# Broadcast by a runner when it starts, so sockets that joined before it re-send their join
+SYNC_MESSAGE = json.dumps({'type': 'sync'})
+
+
+def broadcast_channel(code):
+    return f"live:{code}"
+
+
+def user_channel(code, user_id):
+    return f"live:{code}:user:{user_id}"
+
+
+def actions_channel(code):
+    return f"live:{code}:actions"
+
+
+def new_code(length=6):
+    return ''.join(secrets.choice(CODE_ALPHABET) for _ in range(length))
+
+
+def create_session(quiz, host):
+    """A LiveSession in the lobby with a fresh join code"""
+    while True:
+        code = new_code()
+        if not LiveSession.objects.filter(code=code).exists():
+            return LiveSession.objects.create(code=code, quiz=quiz, host=host)
+
+
+# ---------------- Runner ----------------
+
+class Participant:
+    __slots__ = ('user_id', 'name', 'score', 'elapsed', 'answers')
+
+    def __init__(self, user_id, name):
+        self.user_id = user_id
+        self.name = name
+        self.score = 0
+        self.elapsed = 0.0  # seconds spent on correct answers, breaks ties
+        self.answers = {}  # question id -> (stored letter, is correct, seconds)
+
+    @property
+    def rank_key(self):
+        return (-self.score, self.elapsed)
+
+
+class LiveRunner:
+    def __init__(self, live_session, questions):
+        self.live_session = live_session
+        self.code = live_session.code
+        self.questions = questions
+        self.answer_key = {question.id: question.correct_answer for question in questions}
+        self.participants = {}
+        self.index = -1
+        self.is_open = False
+        self.opened_at = None
+        self.answered = 0
+        self.dirty = False
+        self.done = False
+        self.broker = get_broker()
+
+    @property
+    def current(self):
+        return self.questions[self.index] if 0 <= self.index < len(self.questions) else None
+
+    async def publish(self, payload, user_id=None):
+        channel = broadcast_channel(self.code) if user_id is None else user_channel(self.code, user_id)
+        await self.broker.publish(channel, json.dumps(payload))
+
+    async def run(self):
+        actions = self.broker.subscribe(actions_channel(self.code), maxsize=settings.LIVE_ACTION_QUEUE_SIZE)
+        ticker = asyncio.create_task(self._leaderboard_loop())
+        try:
+            await self.broker.publish(broadcast_channel(self.code), SYNC_MESSAGE)
+            while not self.done:
+                try:
+                    message = await asyncio.wait_for(actions.get(), settings.LIVE_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    print(f"Live session {self.code} idle, ending it")
+                    await self.finish()
+                    break
+                try:
+                    await self.handle(json.loads(message))
+                except Exception as e:
+                    print(f"Live session {self.code}: bad action {message[:200]}: {e}")
+        finally:
+            ticker.cancel()
+            self.broker.unsubscribe(actions_channel(self.code), actions)
+            _runners.pop(self.code, None)
+
+    async def handle(self, action):
+        kind, user_id = action.get('type'), action.get('user')
+        if kind in HOST_ACTIONS and user_id != self.live_session.host_id:
+            return
+        if kind == 'join':
+            await self.join(user_id, action.get('name', ''))
+        elif kind == 'answer':
+            await self.answer(user_id, action.get('question'), action.get('option'))
+        elif kind == 'reveal':
+            await self.reveal()
+        elif kind in ('start', 'next'):
+            await self.advance()
+        elif kind == 'end':
+            await self.finish()
+
+    async def join(self, user_id, name):
+        if user_id == self.live_session.host_id:
+            return
+        participant = self.participants.get(user_id)
+        if participant is None:
+            self.participants[user_id] = participant = Participant(user_id, name)
+            self.dirty = True
+        # Bring a (re)joining participant up to date
+        if self.is_open:
+            await self.publish(self._question_payload(answered=self.current.id in participant.answers), user_id)
+
+    async def answer(self, user_id, question_id, option):
+        participant = self.participants.get(user_id)
+        question = self.current
+        if (participant is None or not self.is_open or question_id != question.id
+                or question.id in participant.answers or not question_bank.is_letter(option)):
+            return
+        seconds = time.monotonic() - self.opened_at
+        is_correct = option == self.answer_key[question.id]
+        participant.answers[question.id] = (option, is_correct, round(seconds, 2))
+        if is_correct:
+            participant.score += 1
+            participant.elapsed += seconds
+        self.answered += 1
+        self.dirty = True
+        await self.publish({'type': 'answered', 'question': question.id, 'option': option}, user_id)
+
+    async def reveal(self):
+        if not self.is_open:
+            return
+        self.is_open = False
+        question = self.current
+        await self.publish({
+            'type': 'reveal', 'question': question.id, 'correct': self.answer_key[question.id],
+            'answered': self.answered,
+        })
+        await self.publish_leaderboard()
+
+    async def advance(self):
+        await self.reveal()
+        if self.index == -1:
+            self.live_session.started_at = timezone.now()
+            await LiveSession.objects.filter(pk=self.live_session.pk).aupdate(
+                status=LiveSession.STATUS_RUNNING, started_at=self.live_session.started_at)
+        self.index += 1
+        if self.current is None:
+            await self.finish()
+            return
+        self.is_open, self.opened_at, self.answered = True, time.monotonic(), 0
+        await self.publish(self._question_payload())
+
+    def _question_payload(self, answered=False):
+        question = self.current
+        return {
+            'type': 'question', 'index': self.index, 'total': len(self.questions), 'question': question.id,
+            'text': question.text, 'options': question_bank.shown_options(question, question_bank.IDENTITY_ORDER),
+            'answered': answered,
+        }
+
+    def standings(self, limit=None):
+        participants = self.participants.values()
+        if limit is None:
+            return sorted(participants, key=lambda participant: participant.rank_key)
+        return heapq.nsmallest(limit, participants, key=lambda participant: participant.rank_key)
+
+    async def publish_leaderboard(self):
+        self.dirty = False
+        await self.publish({
+            'type': 'leaderboard', 'participants': len(self.participants), 'answered': self.answered,
+            'top': [[participant.name, participant.score] for participant in self.standings(settings.LIVE_LEADERBOARD_SIZE)],
+        })
+
+    async def _leaderboard_loop(self):
+        # Answers only mark the board dirty; it goes out at most once per interval
+        while True:
+            await asyncio.sleep(settings.LIVE_LEADERBOARD_SECONDS)
+            if self.dirty:
+                await self.publish_leaderboard()
+
+    async def finish(self):
+        if self.done:
+            return
+        await self.reveal()
+        self.done = True
+        standings = self.standings()
+        attempt_ids = await sync_to_async(persist_results)(self.live_session, self.questions, standings)
+        for rank, participant in enumerate(standings, start=1):
+            await self.publish({
+                'type': 'result', 'rank': rank, 'score': participant.score, 'total': len(self.questions),
+                'attempt': attempt_ids.get(participant.user_id),
+            }, participant.user_id)
+        await self.publish({
+            'type': 'ended', 'participants': len(standings),
+            'top': [[participant.name, participant.score] for participant in standings[:settings.LIVE_LEADERBOARD_SIZE]],
+        })
+
+
+_runners = {}
+
+
+async def ensure_runner(live_session):
+    """The session's runner in this process, started on first use"""
+    runner = _runners.get(live_session.code)
+    if runner is None:
+        questions = [
+            question async for question in
+            Question.objects.filter(quiz_id=live_session.quiz_id).order_by('id').only(*attempts.GRADING_FIELDS)
+        ]
+        runner = _runners.get(live_session.code)
+        if runner is None:
+            runner = _runners[live_session.code] = LiveRunner(live_session, questions)
+            runner.task = asyncio.create_task(runner.run())
+    return runner
+
+
+# ---------------- Persistence ----------------
+
+def persist_results(live_session, questions, participants):
+    """
+    Write one completed QuizHistory (with its results snapshot) and its UserAnswers per
+    participant, in bulk. Returns {user_id: attempt id}.
+    """
+    now = timezone.now()
+    total = len(questions)
+    histories = []
+    for participant in participants:
+        history = QuizHistory(
+            user_id=participant.user_id,
+            quiz_id=live_session.quiz_id,
+            live_session=live_session,
+            total_questions=total,
+            correct_answers=participant.score,
+            score=participant.score / total * 100 if total else 0,
+            selected_difficulty=live_session.quiz.difficulty,
+            completed_at=now,
+        )
+        history.result_snapshot = attempts.build_snapshot(
+            history, questions, {question_id: answer[0] for question_id, answer in participant.answers.items()},
+        )
+        histories.append(history)
+
+    with transaction.atomic():
+        QuizHistory.objects.bulk_create(histories, batch_size=500)
+        if live_session.started_at:
+            # started_at is auto_now_add; the attempts began when the session did
+            QuizHistory.objects.filter(live_session=live_session).update(started_at=live_session.started_at)
+        UserAnswer.objects.bulk_create([
+            UserAnswer(history=history, question_id=question_id, selected_option=option, is_correct=is_correct,
+                       time_taken=seconds)
+            for participant, history in zip(participants, histories)
+            for question_id, (option, is_correct, seconds) in participant.answers.items()
+        ], batch_size=1000)
+        LiveSession.objects.filter(pk=live_session.pk).update(
+            status=LiveSession.STATUS_FINISHED, finished_at=now, participant_count=len(participants))
+        for participant in participants:
+            recommendations.record_completion(participant.user_id, live_session.quiz_id)
+
+    for participant in participants:
+        reviews.record_answers(
+            participant.user_id,
+            [(question_id, is_correct, seconds) for question_id, (_, is_correct, seconds) in participant.answers.items()],
+            now,
+        )
+    return {participant.user_id: history.pk for participant, history in zip(participants, histories)}
+
+
+# ---------------- Connections ----------------
+
+async def serve(live_session, user, receive, send):
+    """Run one accepted WebSocket: relay the session's messages out and the client's actions in"""
+    broker = get_broker()
+    is_host = user.id == live_session.host_id
+    if is_host:
+        await ensure_runner(live_session)
+    inbox = broker.subscribe(broadcast_channel(live_session.code))
+    broker.subscribe(user_channel(live_session.code, user.id), inbox)
+    join = json.dumps({'type': 'join', 'user': user.id, 'name': user.username})
+    actions = actions_channel(live_session.code)
+
+    async def writer():
+        while True:
+            message = await inbox.get()
+            if inbox.overflowed:
+                # Too slow to keep up: drop it, the client reconnects and gets the current state
+                await send({'type': 'websocket.close', 'code': 4008})
+                return
+            if message == SYNC_MESSAGE:
+                if not is_host:
+                    await broker.publish(actions, join)
+                continue
+            await send({'type': 'websocket.send', 'text': message})
+
+    writer_task = asyncio.create_task(writer())
+    try:
+        if not is_host:
+            await broker.publish(actions, join)
+        while True:
+            event = await receive()
+            if event['type'] == 'websocket.disconnect':
+                break
+            if event['type'] != 'websocket.receive' or len(event.get('text') or '') > 1024:
+                continue
+            try:
+                action = json.loads(event['text'])
+            except ValueError:
+                continue
+            if not isinstance(action, dict) or action.get('type') not in HOST_ACTIONS | {'answer'}:
+                continue
+            action['user'] = user.id
+            await broker.publish(actions, json.dumps(action))
+            if writer_task.done():
+                break
+    finally:
+        writer_task.cancel()
+        broker.unsubscribe(broadcast_channel(live_session.code), inbox)
+        broker.unsubscribe(user_channel(live_session.code, user.id), inbox)
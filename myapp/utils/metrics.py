@@ -0,0 +1,62 @@
+import threading
+from collections import deque
+
+# In-process metrics registry; each worker reports its own numbers through the metrics/ view.
+
+RESERVOIR_SIZE = 500
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_timings = {}
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, seconds):
+    """Record a duration; keeps count/sum and the most recent samples for percentiles"""
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = {'count': 0, 'sum': 0.0, 'recent': deque(maxlen=RESERVOIR_SIZE)}
+        timing['count'] += 1
+        timing['sum'] += seconds
+        timing['recent'].append(seconds)
+
+
+def percentile(name, q, min_samples=1):
+    """q-th percentile of recent samples, or None if fewer than `min_samples` were recorded"""
+    with _lock:
+        timing = _timings.get(name)
+        samples = sorted(timing['recent']) if timing else []
+    if len(samples) < min_samples or not samples:
+        return None
+    index = min(len(samples) - 1, int(round(q / 100 * (len(samples) - 1))))
+    return samples[index]
+
+
+def snapshot():
+    with _lock:
+        timings = {
+            name: {
+                'count': timing['count'],
+                'avg': timing['sum'] / timing['count'] if timing['count'] else 0,
+                'recent': sorted(timing['recent']),
+            }
+            for name, timing in _timings.items()
+        }
+        data = {'counters': dict(_counters), 'gauges': dict(_gauges), 'timings': {}}
+    for name, timing in timings.items():
+        recent = timing.pop('recent')
+        for q in (50, 95, 99):
+            timing[f'p{q}'] = recent[min(len(recent) - 1, int(round(q / 100 * (len(recent) - 1))))] if recent else 0
+        data['timings'][name] = timing
+    return data
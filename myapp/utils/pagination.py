@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+# COUNT(*) over a large table is a full scan on most databases and the admin runs one per
+# changelist view. This paginator uses the planner's row estimate for unfiltered lists and
+# stops counting filtered lists at ADMIN_EXACT_COUNT_LIMIT rows. An estimate can be high (on
+# SQLite it is the highest id, which deletes leave behind), so reaching a short last page
+# replaces it with the real count.
+
+
+def estimated_row_count(model, using='default'):
+    """Cheap approximate row count of `model`'s table, or None if the database offers none"""
+    connection = connections[using]
+    table = model._meta.db_table
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+        return row[0] if row and row[0] >= 0 else None
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+                [table],
+            )
+            row = cursor.fetchone()
+        return row[0] if row else None
+    if model._meta.pk.get_internal_type() in ('AutoField', 'BigAutoField'):
+        # Highest id: one index lookup, an upper bound that deletes make drift
+        return model._default_manager.using(using).aggregate(highest=Max('pk'))['highest'] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                self.estimated = True
+                return estimate
+        # COUNT over a LIMIT subquery stops scanning after `limit` rows; pages past it are not offered
+        return queryset.order_by()[:limit].count()
+
+    def page(self, number):
+        page = super().page(number)
+        if not self.estimated:
+            return page
+        page.object_list = list(page.object_list)
+        if len(page.object_list) < self.per_page:
+            # Past the real end: the rows run out before the estimate does
+            if not page.object_list and page.number > 1:
+                raise EmptyPage("That page contains no results")
+            self.count = page.start_index() - 1 + len(page.object_list) if page.object_list else 0
+            self.estimated = False
+            for name in ('num_pages', 'page_range'):
+                self.__dict__.pop(name, None)
+        return page
+
+
+class EstimatedCountChangeList(ChangeList):
+    """Shows the paginator's count as clamped by the page it just read"""
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_count = self.paginator.count
@@ -0,0 +1,169 @@
+import hashlib
+import random
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from myapp.models import PromptTemplate
+
+# Prompt registry. Prompts are PromptTemplate rows, versioned per name; a name's active
+# versions are A/B variants that split its traffic by weight, and every AI log row records
+# which one it used. The code defaults below are registered the first time a name is used,
+# so a fresh database behaves as before. Lookups are cached per process for PROMPT_CACHE_SECONDS.
+
+DEFAULT_TEMPLATES = {
+    'quiz': """
+Generate exactly {num_questions} multiple-choice quiz questions about {subcategory} under {category} category. Difficulty: {difficulty}.
+FORMAT REQUIREMENTS:
+- Each question must follow this EXACT format:
+Question: [question text here]
+A) [option A text]
+B) [option B text]
+C) [option C text]
+D) [option D text]
+Correct: [letter A-D]
+- Questions should be diverse and appropriate for {difficulty} level
+- Each question must have exactly 4 options
+- The correct answer must be one of A, B, C, or D
+- Do not include any additional text, explanations, or numbering
+- Make sure each option is a complete, meaningful answer
+""",
+    'chat_system': (
+        "You are a helpful quiz assistant for QuizGen. Answer concisely. "
+        "When the user asks about a question they got wrong, explain why the correct answer is right."
+    ),
+    'chat_summary': (
+        "Update the running summary of a conversation between a user and a quiz assistant. "
+        "Keep facts the assistant needs later (topics, mistakes, preferences) in under 150 words.\n\n"
+        "Current summary:\n{previous_summary}\n\nNew turns:\n{transcript}"
+    ),
+    'explanation': (
+        "Explain in at most three sentences why the correct answer to this multiple-choice question is right "
+        "and why the other options are not. Reply with the explanation only.\n\n"
+        "Question: {question}\nA) {option1}\nB) {option2}\nC) {option3}\nD) {option4}\nCorrect: {correct_answer}"
+    ),
+    'translation': (
+        "Translate the quiz content below from {source_language} into {language}. It is a JSON array of "
+        "objects; translate every field except \"id\". Keep facts, numbers, names, formulas and code unchanged, "
+        "and translate each option on its own so the options stay in the same order. Reply with the JSON "
+        "array only: the same objects, ids and fields, in the same order.\n\n{items}"
+    ),
+}
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) used for window budgeting"""
+    return len(text) // 4 + 1
+
+
+class Prompt(namedtuple('Prompt', 'id name version variant body tokens')):
+    """An immutable snapshot of a PromptTemplate row; `tokens` estimates the unfilled template"""
+
+    def render(self, **values):
+        return self.body.format(**values) if values else self.body
+
+
+_cache = {}  # name -> (expires_at, prompts, weights)
+_lock = threading.Lock()
+
+
+def _snapshot(row):
+    return Prompt(row.id, row.name, row.version, row.variant, row.body, estimate_tokens(row.body))
+
+
+def _content_hash(body):
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _store(name, rows):
+    prompts = [_snapshot(row) for row in rows]
+    weights = [max(row.weight, 1) for row in rows]
+    with _lock:
+        _cache[name] = (time.monotonic() + settings.PROMPT_CACHE_SECONDS, prompts, weights)
+    return prompts, weights
+
+
+def _cached(name):
+    entry = _cache.get(name)
+    if entry and entry[0] > time.monotonic():
+        return entry[1], entry[2]
+    return None
+
+
+def _active(name):
+    return PromptTemplate.objects.filter(name=name, is_active=True, weight__gt=0).order_by('version')
+
+
+def _default_fields(name):
+    return {'name': name, 'body': DEFAULT_TEMPLATES[name], 'is_active': True}
+
+
+def _load(name):
+    rows = list(_active(name))
+    if not rows:
+        # Nothing active: fall back to the code default, registering it on first use
+        row = PromptTemplate.objects.filter(content_hash=_content_hash(DEFAULT_TEMPLATES[name])).first()
+        if row is None:
+            row = PromptTemplate.objects.create(**_default_fields(name))
+        elif not row.name:
+            # Logged before the registry existed
+            row.name, row.is_active = name, True
+            row.save(update_fields=['name', 'is_active', 'updated_at'])
+        rows = [row]
+    return _store(name, rows)
+
+
+async def _aload(name):
+    rows = [row async for row in _active(name)]
+    if not rows:
+        row = await PromptTemplate.objects.filter(content_hash=_content_hash(DEFAULT_TEMPLATES[name])).afirst()
+        if row is None:
+            row = await PromptTemplate.objects.acreate(**_default_fields(name))
+        elif not row.name:
+            row.name, row.is_active = name, True
+            await row.asave(update_fields=['name', 'is_active', 'updated_at'])
+        rows = [row]
+    return _store(name, rows)
+
+
+def _choose(name, prompts, weights, key):
+    if len(prompts) == 1:
+        return prompts[0]
+    if key is None:
+        return random.choices(prompts, weights)[0]
+    # Stable per key (e.g. a user id), so a conversation does not flip between variants
+    point = int(hashlib.sha256(f"{name}:{key}".encode()).hexdigest()[:8], 16) % sum(weights)
+    for prompt, weight in zip(prompts, weights):
+        if point < weight:
+            return prompt
+        point -= weight
+    return prompts[-1]
+
+
+def select(name, key=None):
+    """Pick one of `name`'s active variants by weight; with `key`, the same key always gets the same one"""
+    prompts, weights = _cached(name) or _load(name)
+    return _choose(name, prompts, weights, key)
+
+
+async def aselect(name, key=None):
+    """Async variant of select"""
+    prompts, weights = _cached(name) or await _aload(name)
+    return _choose(name, prompts, weights, key)
+
+
+def clear_cache():
+    with _lock:
+        _cache.clear()
+
+
+@receiver(post_save, sender=PromptTemplate)
+@receiver(post_delete, sender=PromptTemplate)
+def _invalidate(sender, instance, **kwargs):
+    # Other processes pick the change up when their cache entry expires
+    with _lock:
+        _cache.pop(instance.name, None)
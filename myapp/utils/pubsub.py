@@ -0,0 +1,63 @@
+import asyncio
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Publish/subscribe for live sessions. Messages are already-encoded strings, so a broadcast
+# to a thousand subscribers serializes once. The in-memory broker serves one process; to
+# spread a session's participants over several nodes, point LIVE_PUBSUB_BACKEND at a class
+# with the same interface backed by a shared bus (e.g. Redis pub/sub).
+
+
+class Subscription:
+    """A subscriber's bounded inbox; a subscriber that falls too far behind is flagged, not waited on"""
+
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class InMemoryBroker:
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, channel, subscription=None, maxsize=None):
+        """Deliver `channel` into `subscription` (a new one by default), so one inbox can follow several channels"""
+        if subscription is None:
+            subscription = Subscription(maxsize or settings.LIVE_SEND_QUEUE_SIZE)
+        self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, channel, subscription):
+        subscribers = self._subscribers.get(channel)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[channel]
+
+    async def publish(self, channel, message):
+        for subscription in tuple(self._subscribers.get(channel, ())):
+            subscription.put(message)
+
+    def subscriber_count(self, channel):
+        return len(self._subscribers.get(channel, ()))
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = import_string(settings.LIVE_PUBSUB_BACKEND)()
+    return _broker
@@ -0,0 +1,100 @@
+import re
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+
+# Query-plan regression checks for tests. `audit()` records every SELECT issued inside it,
+# then asks the database for each one's plan (EXPLAIN QUERY PLAN on SQLite, EXPLAIN on
+# PostgreSQL) and reports full scans of the tables in QUERY_AUDIT_LARGE_MODELS: tables
+# that grow with users and attempts, where a missing index turns into a slow page.
+# Scans of small lookup tables (categories, prompt templates) are fine and not reported.
+
+# An index-ordered scan ("SCAN t USING INDEX i") still reads every row, so it counts too
+_SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?')
+_POSTGRES_SCAN = re.compile(r'Seq Scan on "?(\w+)"?(?: "?(\w+)"?)?')
+# Django aliases tables in subqueries and self-joins: "myapp_question" U0, "myapp_quiz" T3
+_ALIAS = re.compile(r'"(\w+)"\s+(?:AS\s+)?"?([A-Z]\d+)"?\b')
+
+
+class FullScan:
+    def __init__(self, table, sql, plan):
+        self.table = table
+        self.sql = sql
+        self.plan = plan
+
+    def __str__(self):
+        return f"full scan of {self.table}:\n  {self.sql}\n  plan: {' / '.join(self.plan)}"
+
+
+class Audit:
+    """The queries recorded by `audit()`; `full_scans` is filled in when the block exits"""
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.queries = []
+        self.full_scans = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip()[:6].upper() == 'SELECT':
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    def explain(self):
+        seen = set()
+        for sql, params in self.queries:
+            if sql in seen:
+                continue
+            seen.add(sql)
+            plan = explain(sql, params)
+            for table in scanned_tables(sql, plan):
+                if table in self.tables:
+                    self.full_scans.append(FullScan(table, sql, plan))
+
+
+def large_tables():
+    return {apps.get_model(label)._meta.db_table for label in settings.QUERY_AUDIT_LARGE_MODELS}
+
+
+def explain(sql, params):
+    """The plan of one query as a list of lines"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+        if connection.vendor == 'postgresql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            return [row[0] for row in cursor.fetchall()]
+    return []
+
+
+def scanned_tables(sql, plan):
+    """Tables the plan reads in full"""
+    aliases = {alias: table for table, alias in _ALIAS.findall(sql)}
+    tables = set()
+    for line in plan:
+        if connection.vendor == 'sqlite':
+            match = _SQLITE_SCAN.match(line.strip())
+            if match:
+                tables.add(aliases.get(match.group(1), match.group(1)))
+        else:
+            match = _POSTGRES_SCAN.search(line)
+            if match:
+                tables.add(match.group(1))
+    return tables
+
+
+@contextmanager
+def audit(tables=None):
+    """
+    Record the SELECTs run inside the block and check their plans on exit:
+
+        with query_audit.audit() as result:
+            client.get(url)
+        assert not result.full_scans
+    """
+    result = Audit(large_tables() if tables is None else set(tables))
+    with connection.execute_wrapper(result):
+        yield result
+    result.explain()
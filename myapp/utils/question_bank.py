@@ -0,0 +1,71 @@
+import random
+
+from myapp.models import Question, Quiz
+
+# Question-bank mode: an attempt of a randomized quiz draws draw_count of the quiz's
+# questions and/or shuffles each question's options. The drawn ids are stored on the
+# attempt when it starts (QuizHistory.drawn_ids), so resuming, grading and regrading see
+# the same questions however the bank is edited meanwhile. Option orders are derived
+# from the attempt's seed and the question id, so they need no per-attempt copy.
+
+OPTION_LETTERS = 'ABCD'
+IDENTITY_ORDER = (0, 1, 2, 3)
+
+
+def new_seed():
+    return random.SystemRandom().getrandbits(62)
+
+
+def bank_ids(quiz):
+    """The quiz's question ids, from the precomputed array on Quiz (rebuilt if it was reset)"""
+    if quiz.question_ids is None:
+        quiz.question_ids = list(Question.objects.filter(quiz_id=quiz.pk).order_by('id').values_list('id', flat=True))
+        Quiz.objects.filter(pk=quiz.pk).update(question_ids=quiz.question_ids)
+    return quiz.question_ids
+
+
+def draw_ids(quiz, seed):
+    """Ids of the questions drawn for an attempt, in the order they are served; O(K) sampling"""
+    ids = bank_ids(quiz)
+    k = min(quiz.draw_count or len(ids), len(ids))
+    return random.Random(seed).sample(ids, k)
+
+
+def attempt_ids(quiz_history, quiz=None):
+    """The attempt's drawn ids; drawn again from the seed for attempts started before they were stored"""
+    if quiz_history.drawn_ids is None:
+        return draw_ids(quiz or quiz_history.quiz, quiz_history.seed)
+    return quiz_history.drawn_ids
+
+
+def option_order(seed, question_id, shuffled):
+    """Permutation of option indexes as shown to the attempt: shown position -> stored position"""
+    if not shuffled or seed is None:
+        return IDENTITY_ORDER
+    order = list(IDENTITY_ORDER)
+    random.Random(f"{seed}:{question_id}").shuffle(order)
+    return tuple(order)
+
+
+def is_letter(value):
+    """Exactly one of OPTION_LETTERS (a plain `in` would also accept '' and 'AB')"""
+    return isinstance(value, str) and len(value) == 1 and value in OPTION_LETTERS
+
+
+def to_stored_letter(order, shown_letter):
+    """Map the letter the user picked on screen back to the letter stored on Question; None if it is not a letter"""
+    if not is_letter(shown_letter):
+        return None
+    return OPTION_LETTERS[order[OPTION_LETTERS.index(shown_letter)]]
+
+
+def to_shown_letter(order, stored_letter):
+    if not is_letter(stored_letter):
+        return None
+    return OPTION_LETTERS[order.index(OPTION_LETTERS.index(stored_letter))]
+
+
+def shown_options(question, order):
+    """[(shown letter, option text), ...] in the order the attempt displays them"""
+    options = [question.option1, question.option2, question.option3, question.option4]
+    return [(OPTION_LETTERS[shown], options[stored]) for shown, stored in enumerate(order)]
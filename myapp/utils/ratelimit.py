@@ -0,0 +1,274 @@
+import math
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Sum
+from django.http import JsonResponse
+
+
+# ---------------- Token bucket ----------------
+
+def _refill(state, rate, capacity, now):
+    """Return the bucket's token count at `now`; `rate` is tokens per second"""
+    if state is None:
+        return capacity
+    tokens, last = state
+    return min(capacity, tokens + (now - last) * rate)
+
+
+class LocalMemoryBackend:
+    """Per-process buckets; exact, but each worker enforces its own limit"""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, rate, capacity, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens = _refill(self._buckets.get(key), rate, capacity, now)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                return True, 0
+            self._buckets[key] = (tokens, now)
+        return False, math.ceil((cost - tokens) / rate)
+
+    async def aconsume(self, key, rate, capacity, cost=1):
+        return self.consume(key, rate, capacity, cost)  # in memory, never blocks
+
+
+class CacheBackend:
+    """
+    Buckets stored in a Django cache shared by all workers.
+    Read-modify-write is not atomic, so concurrent requests may occasionally overdraw a bucket by one.
+    """
+
+    def __init__(self, alias='default'):
+        self.cache = caches[alias]
+        if isinstance(self.cache, LocMemCache):
+            raise ImproperlyConfigured(
+                f"RATE_LIMIT_BACKEND = 'cache' needs a cache shared between processes, but CACHES['{alias}'] "
+                "is the per-process LocMemCache; configure Redis, Memcached or the database cache"
+            )
+
+    @staticmethod
+    def _take(state, rate, capacity, cost):
+        """(new state, cache timeout, allowed, retry after)"""
+        now = time.time()
+        tokens = _refill(state, rate, capacity, now)
+        timeout = math.ceil(capacity / rate) + 1
+        if tokens >= cost:
+            return (tokens - cost, now), timeout, True, 0
+        return (tokens, now), timeout, False, math.ceil((cost - tokens) / rate)
+
+    def consume(self, key, rate, capacity, cost=1):
+        state, timeout, allowed, retry_after = self._take(self.cache.get(key), rate, capacity, cost)
+        self.cache.set(key, state, timeout)
+        return allowed, retry_after
+
+    async def aconsume(self, key, rate, capacity, cost=1):
+        """consume() for async views: the database cache cannot be called from the event loop"""
+        state, timeout, allowed, retry_after = self._take(await self.cache.aget(key), rate, capacity, cost)
+        await self.cache.aset(key, state, timeout)
+        return allowed, retry_after
+
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        if settings.RATE_LIMIT_BACKEND == 'cache':
+            _backend = CacheBackend()
+        else:
+            _backend = LocalMemoryBackend()
+    return _backend
+
+
+def too_many_requests(message, retry_after):
+    """429 response with a Retry-After hint (seconds)"""
+    retry_after = max(1, int(retry_after))
+    response = JsonResponse({'error': message, 'retry_after': retry_after}, status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def _bucket(scope, request, user):
+    """(key, rate, capacity) of the bucket a request draws from, or None if `scope` is not limited"""
+    limit = settings.RATE_LIMITS.get(scope)
+    if not limit:
+        return None
+    per_minute, burst = limit
+    ident = f"u{user.pk}" if user.is_authenticated else f"ip{request.META.get('REMOTE_ADDR', '')}"
+    return f"rl:{scope}:{ident}", per_minute / 60, burst
+
+
+def _limited(allowed, retry_after):
+    return None if allowed else too_many_requests("Too many requests, please slow down.", retry_after)
+
+
+def _check(scope, request, user):
+    bucket = _bucket(scope, request, user)
+    return bucket and _limited(*get_backend().consume(*bucket))
+
+
+async def _acheck(scope, request, user):
+    bucket = _bucket(scope, request, user)
+    return bucket and _limited(*await get_backend().aconsume(*bucket))
+
+
+def rate_limit(scope):
+    """
+    Throttle a view per user (or per IP for anonymous users) using the
+    (requests per minute, burst) pair configured in settings.RATE_LIMITS[scope].
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def _wrapped(request, *args, **kwargs):
+                limited = await _acheck(scope, request, await request.auser())
+                if limited:
+                    return limited
+                return await view_func(request, *args, **kwargs)
+        else:
+            @wraps(view_func)
+            def _wrapped(request, *args, **kwargs):
+                limited = _check(scope, request, request.user)
+                if limited:
+                    return limited
+                return view_func(request, *args, **kwargs)
+        return _wrapped
+    return decorator
+
+
+# ---------------- LLM concurrency (per process) ----------------
+
+class Slot:
+    def __init__(self, limiter):
+        self._limiter = limiter
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._limiter._release()
+
+
+class ConcurrencyLimiter:
+    """
+    Non-blocking cap on in-flight LLM calls in this process (settings.LLM_MAX_CONCURRENCY_PER_PROCESS).
+    Not shared between worker processes: the site-wide cap is the setting times the workers.
+    """
+
+    def __init__(self):
+        self._active = 0
+        self._lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self._active
+
+    def acquire(self):
+        """Return a Slot, or None when the limit is reached"""
+        limit = settings.LLM_MAX_CONCURRENCY_PER_PROCESS
+        with self._lock:
+            if limit is not None and self._active >= limit:
+                return None
+            self._active += 1
+        return Slot(self)
+
+    def _release(self):
+        with self._lock:
+            self._active -= 1
+
+
+class ReleasingStream:
+    """Async iterable for StreamingHttpResponse that frees its slot when the response closes"""
+
+    def __init__(self, iterator, slot):
+        self.iterator = iterator
+        self.slot = slot
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        try:
+            async for chunk in self.iterator:
+                yield chunk
+        finally:
+            self.slot.release()
+
+    def close(self):
+        self.slot.release()
+
+
+llm_slots = ConcurrencyLimiter()
+
+
+# ---------------- Daily LLM budget ----------------
+
+_usage_cache = {'day': None, 'expires': 0, 'usage': (0, 0)}
+
+
+def _seconds_until_midnight_utc():
+    now = datetime.now(dt_timezone.utc)
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+
+def _today_queryset():
+    from myapp.models import AIGenerationLog
+    start = datetime.now(dt_timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return AIGenerationLog.objects.filter(created_at__gte=start)
+
+
+def _over_budget(tokens_in, tokens_out):
+    if settings.LLM_DAILY_TOKEN_BUDGET is not None and tokens_in + tokens_out >= settings.LLM_DAILY_TOKEN_BUDGET:
+        return True
+    cost = (
+        tokens_in / 1000 * settings.LLM_INPUT_COST_PER_1K_TOKENS
+        + tokens_out / 1000 * settings.LLM_OUTPUT_COST_PER_1K_TOKENS
+    )
+    return settings.LLM_DAILY_COST_BUDGET is not None and cost >= settings.LLM_DAILY_COST_BUDGET
+
+
+def _cached_usage():
+    day = datetime.now(dt_timezone.utc).date()
+    if _usage_cache['day'] == day and _usage_cache['expires'] > time.monotonic():
+        return _usage_cache['usage']
+    return None
+
+
+def _store_usage(totals):
+    usage = (totals['tokens_in'] or 0, totals['tokens_out'] or 0)
+    _usage_cache.update(
+        day=datetime.now(dt_timezone.utc).date(),
+        expires=time.monotonic() + settings.LLM_BUDGET_CACHE_SECONDS,
+        usage=usage,
+    )
+    return usage
+
+
+def budget_retry_after():
+    """Seconds until the daily budget resets if it is exhausted, else None"""
+    usage = _cached_usage()
+    if usage is None:
+        usage = _store_usage(_today_queryset().aggregate(tokens_in=Sum('tokens_in'), tokens_out=Sum('tokens_out')))
+    return _seconds_until_midnight_utc() if _over_budget(*usage) else None
+
+
+async def abudget_retry_after():
+    """Async variant of budget_retry_after"""
+    usage = _cached_usage()
+    if usage is None:
+        usage = _store_usage(await _today_queryset().aaggregate(tokens_in=Sum('tokens_in'), tokens_out=Sum('tokens_out')))
+    return _seconds_until_midnight_utc() if _over_budget(*usage) else None
@@ -0,0 +1,296 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count
+
+from myapp.models import QuizHistory, QuizRecommendation
+from myapp.utils import background
+
+try:
+    import numpy as np
+except ImportError:  # optional; scoring falls back to the pure-Python sparse path
+    np = None
+
+# Personalized dashboard suggestions, precomputed by build_recommendations into
+# QuizRecommendation so the dashboard reads them with one indexed query:
+#   next quiz:  item-item collaborative filtering. Two quizzes are similar when the same
+#               users complete both (cosine over the user×quiz matrix); a user's candidates
+#               are scored by their similarity to the quizzes the user completed recently.
+#   weak topic: subcategories where the user's average score, shrunk toward their overall
+#               average so one bad attempt does not dominate, is below RECOMMEND_WEAK_SCORE.
+# Completing a quiz updates that user's rows incrementally; similarities are only
+# recomputed by the periodic batch job.
+
+WEAK_TOPIC_PRIOR = 2  # attempts' worth of weight given to the user's overall average
+
+
+# ---------------- Input ----------------
+
+def load_attempts(exclude=None):
+    """
+    (user_quizzes, user_topics): per user the distinct quizzes completed, oldest first, and
+    per user {subcategory_id: (attempts, total score)}. `exclude` is a set of
+    (user_id, quiz_id) pairs left out, used by the offline evaluation.
+    """
+    user_quizzes = defaultdict(dict)
+    user_topics = defaultdict(dict)
+    rows = (
+        QuizHistory.objects.filter(completed_at__isnull=False)
+        .order_by('completed_at')
+        .values_list('user_id', 'quiz_id', 'quiz__subcategory_id', 'score')
+        .iterator(chunk_size=5000)
+    )
+    for user_id, quiz_id, subcategory_id, score in rows:
+        if exclude and (user_id, quiz_id) in exclude:
+            continue
+        user_quizzes[user_id].pop(quiz_id, None)  # keep the latest completion's position
+        user_quizzes[user_id][quiz_id] = True
+        if subcategory_id is not None:
+            attempts, total = user_topics[user_id].get(subcategory_id, (0, 0.0))
+            user_topics[user_id][subcategory_id] = (attempts + 1, total + score)
+    return {user_id: list(quizzes) for user_id, quizzes in user_quizzes.items()}, user_topics
+
+
+# ---------------- Next quiz ----------------
+
+def _recent(quizzes):
+    return quizzes[-settings.RECOMMEND_HISTORY:]
+
+
+def quiz_similarities(user_quizzes):
+    """Sparse cosine similarities {quiz: {other quiz: similarity}} and completion counts per quiz"""
+    completions = Counter()
+    together = defaultdict(Counter)
+    for quizzes in user_quizzes.values():
+        completions.update(quizzes)
+        recent = _recent(quizzes)
+        for quiz_id in recent:
+            row = together[quiz_id]
+            for other_id in recent:
+                if other_id != quiz_id:
+                    row[other_id] += 1
+    similarities = {
+        quiz_id: {other_id: count / math.sqrt(completions[quiz_id] * completions[other_id]) for other_id, count in row.items()}
+        for quiz_id, row in together.items()
+    }
+    return similarities, completions
+
+
+def next_quizzes(quizzes, similarities, popular, k):
+    """Top `k` (quiz_id, score, reason) for a user who completed `quizzes`; popular quizzes fill the gaps"""
+    taken = set(quizzes)
+    scores = Counter()
+    for quiz_id in _recent(quizzes):
+        for other_id, similarity in similarities.get(quiz_id, {}).items():
+            if other_id not in taken:
+                scores[other_id] += similarity
+    picks = [(quiz_id, score, 'similar') for quiz_id, score in heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))]
+    chosen = taken | {quiz_id for quiz_id, _, _ in picks}
+    for quiz_id in popular:
+        if len(picks) >= k:
+            break
+        if quiz_id not in chosen:
+            picks.append((quiz_id, 0.0, 'popular'))
+    return picks
+
+
+def _dense_next_quizzes(user_quizzes, popular, k):
+    """The same scores as next_quizzes() computed with NumPy matrix products, in blocks of users"""
+    quiz_ids = sorted({quiz_id for quizzes in user_quizzes.values() for quiz_id in quizzes})
+    column = {quiz_id: i for i, quiz_id in enumerate(quiz_ids)}
+    user_ids = list(user_quizzes)
+    block = 2048
+
+    def matrices(users):
+        taken = np.zeros((len(users), len(quiz_ids)), dtype=np.float32)
+        recent = np.zeros_like(taken)
+        for row, user_id in enumerate(users):
+            taken[row, [column[quiz_id] for quiz_id in user_quizzes[user_id]]] = 1
+            recent[row, [column[quiz_id] for quiz_id in _recent(user_quizzes[user_id])]] = 1
+        return taken, recent
+
+    together = np.zeros((len(quiz_ids), len(quiz_ids)), dtype=np.float32)
+    completions = np.zeros(len(quiz_ids), dtype=np.float32)
+    for start in range(0, len(user_ids), block):
+        taken, recent = matrices(user_ids[start:start + block])
+        together += recent.T @ recent
+        completions += taken.sum(axis=0)
+    np.fill_diagonal(together, 0)
+    norms = np.sqrt(completions)
+    similarities = together / np.outer(norms, norms)
+
+    results = {}
+    for start in range(0, len(user_ids), block):
+        users = user_ids[start:start + block]
+        taken, recent = matrices(users)
+        scores = recent @ similarities
+        scores[taken > 0] = 0
+        for row, user_id in enumerate(users):
+            candidates = np.nonzero(scores[row] > 0)[0]
+            best = candidates[np.argsort(-scores[row, candidates], kind='stable')][:k]
+            picks = [(quiz_ids[i], float(scores[row, i]), 'similar') for i in best]
+            chosen = set(user_quizzes[user_id]) | {quiz_id for quiz_id, _, _ in picks}
+            for quiz_id in popular:
+                if len(picks) >= k:
+                    break
+                if quiz_id not in chosen:
+                    picks.append((quiz_id, 0.0, 'popular'))
+            results[user_id] = picks
+    return results
+
+
+def all_next_quizzes(user_quizzes, k):
+    """{user_id: [(quiz_id, score, reason), ...]} for every user in `user_quizzes`"""
+    completions = Counter(quiz_id for quizzes in user_quizzes.values() for quiz_id in quizzes)
+    popular = [quiz_id for quiz_id, _ in completions.most_common(k * 4)]
+    quiz_count = len(completions)
+    if np is not None and 0 < quiz_count <= settings.RECOMMEND_DENSE_MAX_QUIZZES:
+        return _dense_next_quizzes(user_quizzes, popular, k)
+    similarities, _ = quiz_similarities(user_quizzes)
+    return {user_id: next_quizzes(quizzes, similarities, popular, k) for user_id, quizzes in user_quizzes.items()}
+
+
+# ---------------- Weak topics ----------------
+
+def weak_topics(topics, k):
+    """Top `k` (subcategory_id, adjusted score, reason) from {subcategory_id: (attempts, total score)}, weakest first"""
+    attempts = sum(count for count, _ in topics.values())
+    if not attempts:
+        return []
+    overall = sum(total for _, total in topics.values()) / attempts
+    adjusted = []
+    for subcategory_id, (count, total) in topics.items():
+        score = (total + WEAK_TOPIC_PRIOR * overall) / (count + WEAK_TOPIC_PRIOR)
+        if score < settings.RECOMMEND_WEAK_SCORE and total / count < settings.RECOMMEND_WEAK_SCORE:
+            adjusted.append((subcategory_id, score, f"Average {total / count:.0f}% over {count} attempt{'s' if count != 1 else ''}"))
+    return heapq.nsmallest(k, adjusted, key=lambda item: (item[1], item[0]))
+
+
+def _topic_rows(user_id):
+    """{subcategory_id: (attempts, total score)} of one user, from one aggregate query"""
+    rows = (
+        QuizHistory.objects.filter(user_id=user_id, completed_at__isnull=False, quiz__subcategory__isnull=False)
+        .values('quiz__subcategory_id')
+        .annotate(attempts=Count('id'), average=Avg('score'))
+    )
+    return {row['quiz__subcategory_id']: (row['attempts'], row['average'] * row['attempts']) for row in rows}
+
+
+# ---------------- Storage ----------------
+
+def _rows(user_id, next_picks, weak_picks):
+    rows = [
+        QuizRecommendation(user_id=user_id, kind=QuizRecommendation.KIND_NEXT_QUIZ, rank=rank, quiz_id=quiz_id,
+                           score=score, reason=reason)
+        for rank, (quiz_id, score, reason) in enumerate(next_picks, start=1)
+    ]
+    rows += [
+        QuizRecommendation(user_id=user_id, kind=QuizRecommendation.KIND_WEAK_TOPIC, rank=rank,
+                           subcategory_id=subcategory_id, score=score, reason=reason)
+        for rank, (subcategory_id, score, reason) in enumerate(weak_picks, start=1)
+    ]
+    return rows
+
+
+def build(k=None, chunk_size=500):
+    """Recompute every user's recommendations. Returns the number of users written."""
+    k = k or settings.RECOMMEND_TOP_K
+    user_quizzes, user_topics = load_attempts()
+    next_picks = all_next_quizzes(user_quizzes, k)
+    user_ids = sorted(user_quizzes)
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        rows = []
+        for user_id in chunk:
+            rows += _rows(user_id, next_picks[user_id], weak_topics(user_topics.get(user_id, {}), k))
+        with transaction.atomic():
+            QuizRecommendation.objects.filter(user_id__in=chunk).delete()
+            QuizRecommendation.objects.bulk_create(rows)
+    # Users whose attempts were all deleted keep no stale rows. A subquery, not the id list:
+    # one bound parameter per user would pass SQLite's variable limit
+    QuizRecommendation.objects.exclude(
+        user_id__in=QuizHistory.objects.filter(completed_at__isnull=False).values('user_id')
+    ).delete()
+    return len(user_ids)
+
+
+def for_user(user):
+    """(next quizzes, weak topics) for the dashboard: one query over the (user, kind, rank) index"""
+    rows = (
+        QuizRecommendation.objects.filter(user=user)
+        .select_related('quiz', 'subcategory__category')
+        .order_by('kind', 'rank')
+    )
+    next_quizzes, weak = [], []
+    for row in rows:
+        (next_quizzes if row.kind == QuizRecommendation.KIND_NEXT_QUIZ else weak).append(row)
+    return next_quizzes, weak
+
+
+def record_completion(user_id, quiz_id):
+    """Refresh a user's recommendations after the current transaction commits"""
+    background.submit(update_for_user, user_id, quiz_id)
+
+
+def update_for_user(user_id, quiz_id):
+    """
+    Incremental update after a completed attempt: the quiz stops being suggested and the
+    user's weak topics are recomputed from their attempts. Similar-quiz suggestions for
+    newly taken quizzes arrive with the next batch build.
+    """
+    weak_picks = weak_topics(_topic_rows(user_id), settings.RECOMMEND_TOP_K)
+    with transaction.atomic():
+        QuizRecommendation.objects.filter(
+            user_id=user_id, kind=QuizRecommendation.KIND_NEXT_QUIZ, quiz_id=quiz_id,
+        ).delete()
+        QuizRecommendation.objects.filter(user_id=user_id, kind=QuizRecommendation.KIND_WEAK_TOPIC).delete()
+        QuizRecommendation.objects.bulk_create(_rows(user_id, [], weak_picks))
+
+
+# ---------------- Offline evaluation ----------------
+
+def evaluate(k=None, min_history=2):
+    """
+    Leave-last-out evaluation of next-quiz suggestions: for every user with at least
+    `min_history` distinct completed quizzes, hide the most recent one, recommend from the
+    rest and check whether it comes back. Reports hit rate@k and MRR against a popularity
+    baseline, plus catalog coverage.
+    """
+    k = k or settings.RECOMMEND_TOP_K
+    user_quizzes, _ = load_attempts()
+    held_out = {user_id: quizzes[-1] for user_id, quizzes in user_quizzes.items() if len(quizzes) >= min_history}
+    if not held_out:
+        return None
+    training, _ = load_attempts(exclude=set(held_out.items()))
+    training = {user_id: quizzes for user_id, quizzes in training.items() if quizzes}
+    picks = all_next_quizzes(training, k)
+
+    completions = Counter(quiz_id for quizzes in training.values() for quiz_id in quizzes)
+    popular = [quiz_id for quiz_id, _ in completions.most_common(k * 4)]
+
+    def score(ranked_lists):
+        hits, reciprocal = 0, 0.0
+        for user_id, target in held_out.items():
+            ranked = ranked_lists(user_id)
+            if target in ranked:
+                hits += 1
+                reciprocal += 1 / (ranked.index(target) + 1)
+        return hits / len(held_out), reciprocal / len(held_out)
+
+    model_hit_rate, model_mrr = score(lambda user_id: [quiz_id for quiz_id, _, _ in picks.get(user_id, [])])
+    baseline_hit_rate, baseline_mrr = score(
+        lambda user_id: [quiz_id for quiz_id in popular if quiz_id not in set(training.get(user_id, []))][:k]
+    )
+    recommended = {quiz_id for user_picks in picks.values() for quiz_id, _, _ in user_picks}
+    return {
+        'users': len(held_out),
+        'k': k,
+        'hit_rate': model_hit_rate,
+        'mrr': model_mrr,
+        'baseline_hit_rate': baseline_hit_rate,
+        'baseline_mrr': baseline_mrr,
+        'coverage': len(recommended) / len(completions) if completions else 0,
+    }
@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from myapp.models import Question, ReviewState
+from myapp.utils import translations
+
+# Spaced repetition (SM-2) over graded answers. Each graded answer updates the
+# (user, question) ReviewState in place; due questions come from the (user, due_at)
+# index, so building a review never scans quiz history.
+
+MIN_EASE = 1.3
+
+
+def answer_quality(is_correct, time_taken):
+    """SM-2 grade 0-5 from correctness and, when the client reported it, answer time"""
+    if not is_correct:
+        return 1
+    if not time_taken:
+        return 4
+    if time_taken <= settings.REVIEW_FAST_SECONDS:
+        return 5
+    if time_taken >= settings.REVIEW_SLOW_SECONDS:
+        return 3
+    return 4
+
+
+def schedule(state, quality, now):
+    """Apply one review of `quality` to `state` (SM-2)"""
+    if quality < 3:
+        state.repetitions = 0
+        state.interval_days = 1
+        state.lapses += 1
+    else:
+        state.repetitions += 1
+        if state.repetitions == 1:
+            state.interval_days = 1
+        elif state.repetitions == 2:
+            state.interval_days = 6
+        else:
+            state.interval_days = round(state.interval_days * state.ease)
+    # Capped, or repeated correct answers grow the interval until due_at overflows
+    state.interval_days = min(state.interval_days, settings.REVIEW_MAX_INTERVAL_DAYS)
+    state.ease = max(MIN_EASE, state.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    state.due_at = now + timedelta(days=state.interval_days)
+    state.last_reviewed_at = now
+    return state
+
+
+def record_answers(user_id, answers, now=None):
+    """
+    Update review state for a batch of graded answers, given as
+    (question_id, is_correct, time_taken) tuples: one read, then one bulk insert and one bulk update.
+    New and due questions are rescheduled, and so is any question answered wrong. A correct
+    answer before the question is due (it was also in a quiz taken meanwhile, or twice in the
+    batch) just records when it was seen.
+    """
+    answers = list(answers)
+    if not answers:
+        return
+    now = now or timezone.now()
+    states = {
+        state.question_id: state
+        for state in ReviewState.objects.filter(user_id=user_id, question_id__in=[a[0] for a in answers])
+    }
+    created, updated = [], []
+    for question_id, is_correct, time_taken in answers:
+        state = states.get(question_id)
+        if state is None:
+            state = ReviewState(user_id=user_id, question_id=question_id)
+            states[question_id] = state
+            created.append(state)
+        elif state.pk and state not in updated:
+            state.updated_at = now  # bulk_update skips auto_now
+            updated.append(state)
+        quality = answer_quality(is_correct, time_taken)
+        if quality >= 3 and state.due_at is not None and state.due_at > now:
+            state.last_reviewed_at = now
+        else:
+            schedule(state, quality, now)
+
+    if created:
+        ReviewState.objects.bulk_create(created)
+    if updated:
+        ReviewState.objects.bulk_update(
+            updated, ['repetitions', 'interval_days', 'ease', 'lapses', 'due_at', 'last_reviewed_at', 'updated_at'],
+        )
+
+
+def due_count(user, now=None):
+    return ReviewState.objects.filter(user=user, due_at__lte=now or timezone.now()).count()
+
+
+def build_review(user, size=None, now=None, locale=None):
+    """
+    The user's most overdue questions, at most `size` (REVIEW_QUIZ_SIZE); two indexed queries,
+    three with the texts shown in a translated `locale`
+    """
+    size = size or settings.REVIEW_QUIZ_SIZE
+    due_ids = list(
+        ReviewState.objects.filter(user=user, due_at__lte=now or timezone.now())
+        .order_by('due_at')
+        .values_list('question_id', flat=True)[:size]
+    )
+    by_id = {
+        question.id: question
+        for question in translations.with_translations(
+            Question.objects.filter(id__in=due_ids).only('id', 'text', 'option1', 'option2', 'option3', 'option4'),
+            locale,
+        )
+    }
+    return [translations.localize(by_id[question_id]) for question_id in due_ids if question_id in by_id]
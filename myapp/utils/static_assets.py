@@ -0,0 +1,171 @@
+import gzip
+import mimetypes
+import os
+from email.utils import formatdate
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, StaticFilesStorage
+from django.core.files.storage import storages
+from django.http import HttpResponse, HttpResponseNotModified
+
+try:
+    import brotli
+except ImportError:  # optional; gzip variants are always written
+    brotli = None
+
+# collectstatic writes content-hashed copies plus .gz/.br variants into STATIC_ROOT;
+# StaticFilesMiddleware serves them so repeat page loads come from the browser cache.
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.json', '.map', '.svg', '.txt', '.html', '.xml', '.ico'}
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ManifestStaticFilesStorage that also writes precompressed variants of text assets"""
+
+    def url(self, name, force=False):
+        # No manifest yet (tests, or collectstatic has not run): serve the plain name
+        if not self.hashed_files and not force:
+            return StaticFilesStorage.url(self, name)
+        return super().url(name, force)
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(paths) | set(self.hashed_files.values()):
+            self._compress(name)
+
+    def _compress(self, name):
+        path = self.path(name)
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS or not os.path.exists(path):
+            return
+        with open(path, 'rb') as f:
+            data = f.read()
+        variants = {'.gz': lambda d: gzip.compress(d, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = lambda d: brotli.compress(d)
+        for suffix, compress in variants.items():
+            compressed = compress(data) if len(data) >= settings.STATIC_COMPRESS_MIN_BYTES else None
+            # Only keep variants that actually save bytes
+            if compressed is not None and len(compressed) < len(data) * 0.95:
+                with open(path + suffix, 'wb') as f:
+                    f.write(compressed)
+            elif os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def accepted_encodings(header):
+    """{coding: q} from an Accept-Encoding header; codings refused with q=0 are kept, with 0"""
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(available, header):
+    """The acceptable coding of `available` with the highest q (ties go to the earlier one), or None"""
+    accepted = accepted_encodings(header)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class StaticFilesMiddleware:
+    """
+    Serve files collected into STATIC_ROOT without a separate web server.
+    Content-hashed names get a one-year immutable Cache-Control; other names are
+    cached for STATIC_MAX_AGE seconds and revalidated with their ETag.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.prefix = '/' + settings.STATIC_URL.lstrip('/') if '://' not in settings.STATIC_URL else None
+        self.files = self._scan() if self.prefix and settings.STATIC_ROOT else {}
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+    def _scan(self):
+        """Index STATIC_ROOT once at startup; files collected later need a restart"""
+        root = str(settings.STATIC_ROOT)
+        if not os.path.isdir(root):
+            return {}
+        storage = storages['staticfiles']
+        hashed = set(getattr(storage, 'hashed_files', {}).values()) - set(getattr(storage, 'hashed_files', {}))
+        files = {}
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith(('.gz', '.br')):
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, root).replace(os.sep, '/')
+                content_type, _ = mimetypes.guess_type(filename)
+                if content_type is None:
+                    content_type = 'application/octet-stream'
+                elif content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+                    content_type += '; charset=utf-8'
+                stat = os.stat(path)
+                files[self.prefix + name] = {
+                    'path': path,
+                    'content_type': content_type,
+                    'etag': f'"{stat.st_size:x}-{int(stat.st_mtime):x}"',
+                    'last_modified': formatdate(stat.st_mtime, usegmt=True),
+                    'cache_control': IMMUTABLE_CACHE_CONTROL if name in hashed else f'public, max-age={settings.STATIC_MAX_AGE}',
+                    'encodings': [enc for enc, suffix in (('br', '.br'), ('gzip', '.gz')) if os.path.exists(path + suffix)],
+                }
+        return files
+
+    def serve(self, request):
+        if not self.files or request.method not in ('GET', 'HEAD'):
+            return None
+        entry = self.files.get(request.path_info)
+        if entry is None:
+            return None
+
+        encoding = choose_encoding(entry['encodings'], request.headers.get('Accept-Encoding', ''))
+        etag = entry['etag'][:-1] + f'-{encoding}"' if encoding else entry['etag']
+
+        if_none_match = {tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')}
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            path = entry['path'] + {'br': '.br', 'gzip': '.gz'}.get(encoding, '')
+            with open(path, 'rb') as f:
+                body = f.read() if request.method == 'GET' else b''
+            response = HttpResponse(body, content_type=entry['content_type'])
+            response['Content-Length'] = os.path.getsize(path)
+            response['Last-Modified'] = entry['last_modified']
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Cache-Control'] = entry['cache_control']
+        if entry['encodings']:
+            response['Vary'] = 'Accept-Encoding'
+        return response
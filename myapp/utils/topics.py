@@ -0,0 +1,124 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from myapp.models import Quiz, Topic
+
+# Topic tree. Topics are stored with a materialized path (see Topic), so in the database a
+# subtree is one `prefix <= path < prefix~` range scan on the unique path index, and the
+# ancestors are one primary-key lookup of the ids in the path.
+# Pages that show the taxonomy read the whole tree from memory instead: it is loaded in one
+# query and kept per process until the tree version changes. The version lives in
+# CACHES['default'] and is bumped by every topic save or delete, so with a shared cache all
+# processes reload on their next request; with the per-process default cache, other
+# processes pick changes up after TOPIC_TREE_MAX_AGE seconds.
+
+VERSION_KEY = 'topics:version'
+
+TopicNode = namedtuple('TopicNode', 'id name parent_id path depth category_id subcategory_id')
+
+
+class TopicTree:
+    """An immutable snapshot of all topics, ordered by path (parents before children, subtrees contiguous)"""
+
+    def __init__(self, nodes):
+        self.nodes = sorted(nodes, key=lambda node: node.path)
+        self.paths = [node.path for node in self.nodes]
+        self.by_id = {node.id: node for node in self.nodes}
+        self.by_category = {node.category_id: node for node in self.nodes if node.category_id}
+        self.by_subcategory = {node.subcategory_id: node for node in self.nodes if node.subcategory_id}
+        self.roots = [node for node in self.nodes if node.parent_id is None]
+
+    def subtree(self, topic_id, include_self=True):
+        """The topic and all its descendants, in path order"""
+        node = self.by_id[topic_id]
+        start = bisect_left(self.paths, node.path)
+        # Paths only contain digits and '/', which all sort before '~'
+        end = bisect_left(self.paths, node.path + '~', start)
+        return self.nodes[start if include_self else start + 1:end]
+
+    def subtree_ids(self, topic_id):
+        return [node.id for node in self.subtree(topic_id)]
+
+    def ancestors(self, topic_id):
+        """From the root down to the topic's parent"""
+        return [self.by_id[int(segment)] for segment in self.by_id[topic_id].path.split('/')[:-2]]
+
+    def children(self, topic_id):
+        depth = self.by_id[topic_id].depth + 1
+        return [node for node in self.subtree(topic_id, include_self=False) if node.depth == depth]
+
+    def label(self, topic_id, below=None):
+        """'Physics › Optics': the topic's names from below `below` (default: from the root)"""
+        names = [node.name for node in self.ancestors(topic_id) + [self.by_id[topic_id]]]
+        start = self.by_id[below].depth + 1 if below is not None else 0
+        return ' › '.join(names[start:])
+
+    def legacy_ids(self, topic_id):
+        """(category id, subcategory id) of the closest linked ancestors, for quizzes created under the topic"""
+        category_id = subcategory_id = None
+        for node in self.ancestors(topic_id) + [self.by_id[topic_id]]:
+            category_id = node.category_id or category_id
+            subcategory_id = node.subcategory_id or subcategory_id
+        return category_id, subcategory_id
+
+
+_tree = None  # (version, loaded_at, TopicTree)
+_lock = threading.Lock()
+
+
+def _version():
+    return caches['default'].get(VERSION_KEY, 0)
+
+
+def get_tree():
+    """The cached topic tree; reloaded (one query) when the version changes or it gets too old"""
+    global _tree
+    version = _version()
+    cached = _tree
+    if cached and cached[0] == version and time.monotonic() - cached[1] < settings.TOPIC_TREE_MAX_AGE:
+        return cached[2]
+    tree = TopicTree(TopicNode(*row) for row in Topic.objects.values_list(*TopicNode._fields))
+    with _lock:
+        _tree = (version, time.monotonic(), tree)
+    return tree
+
+
+def clear_cache():
+    global _tree
+    with _lock:
+        _tree = None
+
+
+def subtree(topic):
+    """The topic and its descendants, in one indexed query"""
+    # A range rather than path__startswith: SQLite cannot use an index for that LIKE
+    return Topic.objects.filter(path__gte=topic.path, path__lt=topic.path + '~').order_by('path')
+
+
+def ancestors(topic):
+    """The topic's ancestors from the root down, in one query"""
+    return Topic.objects.filter(pk__in=topic.ancestor_ids()).order_by('depth')
+
+
+def quizzes_under(topic_id):
+    """Quizzes filed under the topic or any of its descendants"""
+    return Quiz.objects.filter(topic_id__in=get_tree().subtree_ids(topic_id))
+
+
+@receiver(post_save, sender=Topic)
+@receiver(post_delete, sender=Topic)
+def _invalidate(sender, **kwargs):
+    cache = caches['default']
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # No version stored yet (or it was evicted): any new value invalidates
+        cache.set(VERSION_KEY, time.time_ns(), None)
+    clear_cache()
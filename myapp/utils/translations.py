@@ -0,0 +1,188 @@
+import hashlib
+from collections import namedtuple
+
+from django.conf import settings
+from django.db.models import Max, Prefetch
+
+from myapp.models import Profile, Question, QuestionTranslation, Quiz, QuizTranslation
+from myapp.utils import question_bank
+
+# Per-locale quiz content. Quizzes are generated and written once, in QUIZ_SOURCE_LOCALE; the
+# `translate_content` command translates them in batches into QuizTranslation and
+# QuestionTranslation rows, one per (object, locale), shared by every user and kept for good.
+# Each row records a hash of the source text it was made from. Once the source is edited the
+# row is stale: it is no longer shown, and the next run of the command translates it again.
+# Pages take the locale from the user's Profile (or ?locale=) and prefetch the translations
+# with one extra query per page, so a quiz renders in the same number of queries in any
+# locale. Anything without a current translation is shown in the source language.
+# Translations keep the option positions, so grading, stored answers and the answer key do
+# not depend on the locale.
+
+Kind = namedtuple('Kind', 'model translation_model source_field fields')
+
+KINDS = {
+    'quiz': Kind(Quiz, QuizTranslation, 'quiz', ('title', 'description')),
+    'question': Kind(Question, QuestionTranslation, 'question', ('text', 'option1', 'option2', 'option3', 'option4')),
+}
+_KIND_OF = {kind.model: kind for kind in KINDS.values()}
+
+
+def source_hash(values):
+    """Hash of the source texts a translation is made from, in field order"""
+    return hashlib.sha256('\x1f'.join(value or '' for value in values).encode()).hexdigest()
+
+
+def is_translated(locale):
+    """Whether `locale` is shown from translations (any configured locale but the source)"""
+    return locale != settings.QUIZ_SOURCE_LOCALE and locale in settings.QUIZ_LOCALES
+
+
+def user_locale(user):
+    """The locale picked on the user's profile, else the source locale"""
+    if not user.is_authenticated:
+        return settings.QUIZ_SOURCE_LOCALE
+    try:
+        locale = user.profile.locale  # cached on the user; base.html reads the profile anyway
+    except Profile.DoesNotExist:
+        return settings.QUIZ_SOURCE_LOCALE
+    return locale if locale in settings.QUIZ_LOCALES else settings.QUIZ_SOURCE_LOCALE
+
+
+def request_locale(request):
+    """?locale= when it is one of QUIZ_LOCALES, else the user's own"""
+    locale = request.GET.get('locale')
+    return locale if locale in settings.QUIZ_LOCALES else user_locale(request.user)
+
+
+# ---------------- Reading ----------------
+
+def with_translations(queryset, locale):
+    """A Quiz or Question queryset with each object's `locale` translation prefetched; as is for the source locale"""
+    if not is_translated(locale):
+        return queryset
+    kind = _KIND_OF[queryset.model]
+    return queryset.prefetch_related(Prefetch(
+        'translations', queryset=kind.translation_model.objects.filter(locale=locale), to_attr='locale_translations',
+    ))
+
+
+def localize(obj):
+    """
+    Show an object loaded through with_translations in its locale, if its translation is
+    current, by replacing the translated fields. For display only: never save it afterwards.
+    """
+    found = getattr(obj, 'locale_translations', None)
+    if found:
+        kind = _KIND_OF[type(obj)]
+        translation = found[0]
+        if translation.source_hash == source_hash(getattr(obj, field) for field in kind.fields):
+            for field in kind.fields:
+                setattr(obj, field, getattr(translation, field))
+    return obj
+
+
+def _current_questions(sources, locale):
+    """{question id: translation} for the {question id: source texts} whose translation is current; one query"""
+    translations = QuestionTranslation.objects.filter(question_id__in=list(sources), locale=locale)
+    return {
+        translation.question_id: translation
+        for translation in translations
+        if translation.source_hash == source_hash(sources[translation.question_id])
+    }
+
+
+def localize_question_rows(rows, locale):
+    """Question values() rows (id, text, option1..4) updated in place to `locale`; one query"""
+    if not is_translated(locale) or not rows:
+        return rows
+    fields = KINDS['question'].fields
+    current = _current_questions({row['id']: [row[field] for field in fields] for row in rows}, locale)
+    for row in rows:
+        translation = current.get(row['id'])
+        if translation is not None:
+            row.update({field: getattr(translation, field) for field in fields})
+    return rows
+
+
+def localize_quiz_row(row, locale):
+    """A quiz values() row (id, title, description) updated in place to `locale`; one query"""
+    if not is_translated(locale):
+        return row
+    fields = KINDS['quiz'].fields
+    translation = QuizTranslation.objects.filter(quiz_id=row['id'], locale=locale).first()
+    if translation is not None and translation.source_hash == source_hash(row[field] for field in fields):
+        row.update({field: getattr(translation, field) for field in fields})
+    return row
+
+
+def localize_snapshot(quiz_history, snapshot, locale):
+    """
+    A copy of a results snapshot with its questions in `locale`, where the translation was
+    made from exactly the text the attempt showed; one query.
+    """
+    if not is_translated(locale) or not snapshot['questions']:
+        return snapshot
+    orders, sources = {}, {}
+    for row in snapshot['questions']:
+        order = question_bank.option_order(quiz_history.seed, row['id'], quiz_history.options_shuffled)
+        stored = [None] * 4
+        for shown, (_, text) in enumerate(row['options']):
+            stored[order[shown]] = text
+        orders[row['id']], sources[row['id']] = order, [row['text'], *stored]
+    current = _current_questions(sources, locale)
+    questions = []
+    for row in snapshot['questions']:
+        translation = current.get(row['id'])
+        if translation is not None:
+            row = dict(row, text=translation.text, options=question_bank.shown_options(translation, orders[row['id']]))
+        questions.append(row)
+    return dict(snapshot, questions=questions)
+
+
+def quiz_stamp(quiz_id, locale):
+    """Changes whenever a `locale` translation of the quiz or one of its questions is written; for ETags"""
+    if not is_translated(locale):
+        return locale
+    quiz = QuizTranslation.objects.filter(quiz_id=quiz_id, locale=locale).values_list('updated_at', flat=True).first()
+    questions = (
+        QuestionTranslation.objects.filter(question__quiz_id=quiz_id, locale=locale)
+        .aggregate(latest=Max('updated_at'))['latest']
+    )
+    return f"{locale}-{quiz.timestamp() if quiz else 0:.6f}-{questions.timestamp() if questions else 0:.6f}"
+
+
+# ---------------- Writing (the `translate_content` command) ----------------
+
+def pending(kind, locale, queryset, chunk_size=500):
+    """Objects of `queryset` with no current `locale` translation, read in primary-key chunks"""
+    queryset = queryset.order_by('pk').only('pk', *kind.fields)
+    last_pk = 0
+    while True:
+        objects = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not objects:
+            return
+        last_pk = objects[-1].pk
+        stored = dict(
+            kind.translation_model.objects.filter(**{f'{kind.source_field}_id__in': [obj.pk for obj in objects]}, locale=locale)
+            .values_list(f'{kind.source_field}_id', 'source_hash')
+        )
+        for obj in objects:
+            if stored.get(obj.pk) != source_hash(getattr(obj, field) for field in kind.fields):
+                yield obj
+
+
+def store(kind, locale, objects, translated):
+    """Save `translated` ({object pk: {field: text}}) for `objects`, replacing stale rows; returns how many"""
+    rows = [
+        kind.translation_model(
+            **{f'{kind.source_field}_id': obj.pk, 'locale': locale},
+            **translated[obj.pk],
+            source_hash=source_hash(getattr(obj, field) for field in kind.fields),
+        )
+        for obj in objects if obj.pk in translated
+    ]
+    kind.translation_model.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=[kind.source_field, 'locale'],
+        update_fields=[*kind.fields, 'source_hash', 'updated_at'],
+    )
+    return len(rows)
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.template.loader import get_template
+from django.urls import get_resolver
+
+# Deploy-time warm-up. Before a worker reports ready it pays the one-off costs that would
+# otherwise land on its first users: database connections, importing every view (and with
+# them the LLM client), compiling templates, and loading the taxonomy, prompt registry and
+# the most-played quizzes (which also pulls their rows into the database's page cache).
+# - ASGI (quizgen/asgi.py): runs on lifespan startup, so the server accepts connections
+#   only once it is done.
+# - WSGI (quizgen/wsgi.py): runs when the worker imports the application.
+# - Anything else (runserver, tests): started by the first /readyz probe, in the background.
+# /readyz answers 503 until warm-up has finished; the per-stage timings are in its body and
+# printed at startup. Only a failing database stage keeps the worker not-ready; the other
+# stages are optimizations.
+
+StageResult = namedtuple('StageResult', 'name seconds error')
+
+IDLE, RUNNING, READY, FAILED = 'idle', 'running', 'ready', 'failed'
+
+_state = IDLE
+_results = []
+_lock = threading.Lock()
+
+
+def _warm_database():
+    for alias in connections:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+
+
+def _warm_urls():
+    # Imports every view module, and with them everything they import
+    get_resolver().url_patterns
+
+
+def _template_names():
+    # The project's own templates; the admin's are compiled when staff first use it
+    for engine in engines.all():
+        for directory in getattr(engine, 'template_dirs', []):
+            if not str(directory).startswith(str(settings.BASE_DIR)):
+                continue
+            for root, _, filenames in os.walk(directory):
+                for filename in filenames:
+                    if filename.endswith(('.html', '.txt', '.js')):
+                        yield os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, '/')
+
+
+def _warm_templates():
+    # With DEBUG off Django wraps the loaders in the cached loader, which keeps these compiled
+    for name in set(_template_names()):
+        try:
+            get_template(name)
+        except Exception as e:
+            print(f"warmup: could not compile template {name}: {e}")
+
+
+def _warm_taxonomy():
+    from myapp.utils import topics
+    topics.get_tree()
+
+
+def _warm_prompts():
+    from myapp.utils import prompts
+    for name in prompts.DEFAULT_TEMPLATES:
+        prompts.select(name)
+
+
+def _warm_quizzes():
+    from myapp.models import Question, Quiz, QuizHistory
+    from myapp.utils import attempts, question_bank
+    # The most-played quizzes among the latest attempts: a bounded primary-key range, not a count over all history
+    recent = QuizHistory.objects.order_by('-id').values_list('quiz_id', flat=True)[:settings.WARMUP_RECENT_ATTEMPTS]
+    popular = [quiz_id for quiz_id, _ in Counter(recent).most_common(settings.WARMUP_POPULAR_QUIZZES)]
+    for quiz in Quiz.objects.filter(pk__in=popular):
+        question_bank.bank_ids(quiz)
+        list(Question.objects.filter(quiz_id=quiz.pk).order_by('id').only(*attempts.GRADING_FIELDS))
+
+
+def _warm_llm():
+    from myapp.utils.gemini_helper import gemini_generator
+    gemini_generator.warm()
+
+
+STAGES = [
+    ('database', _warm_database),
+    ('urls', _warm_urls),
+    ('templates', _warm_templates),
+    ('taxonomy', _warm_taxonomy),
+    ('prompts', _warm_prompts),
+    ('quizzes', _warm_quizzes),
+    ('llm', _warm_llm),
+]
+CRITICAL_STAGES = {'database'}
+
+
+def run():
+    """Run every stage once (later calls return at once); returns the StageResults"""
+    global _state
+    with _lock:
+        if _state in (RUNNING, READY, FAILED):
+            return list(_results)
+        _state = RUNNING
+    results, failed = [], False
+    started = time.monotonic()
+    for name, stage in STAGES:
+        stage_started = time.monotonic()
+        try:
+            stage()
+            error = None
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            failed = failed or name in CRITICAL_STAGES
+        results.append(StageResult(name, time.monotonic() - stage_started, error))
+        print(f"warmup: {name} {(time.monotonic() - stage_started) * 1000:.0f} ms" + (f" FAILED ({error})" if error else ""))
+    # Warm-up runs outside any request, so nothing else closes the connections it opened
+    connections.close_all()
+    print(f"warmup: {'failed' if failed else 'ready'} after {(time.monotonic() - started) * 1000:.0f} ms")
+    with _lock:
+        _results[:] = results
+        _state = FAILED if failed else READY
+    return results
+
+
+def start_background():
+    """Start warm-up in a thread unless it already ran or is running"""
+    if _state == IDLE:
+        threading.Thread(target=run, name='warmup', daemon=True).start()
+
+
+def run_on_startup():
+    """Called by the WSGI/ASGI entry points; WARMUP_ON_STARTUP turns it off"""
+    if settings.WARMUP_ON_STARTUP:
+        run()
+
+
+def status():
+    """(state, StageResults)"""
+    with _lock:
+        return _state, list(_results)
+
+
+def reset():
+    global _state
+    with _lock:
+        _state = IDLE
+        _results.clear()
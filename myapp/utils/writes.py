@@ -0,0 +1,87 @@
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.middleware import SessionMiddleware as DjangoSessionMiddleware
+from django.db import connections
+from django.utils import timezone
+
+# Write coalescing for per-login and per-request bookkeeping.
+# - last_login: logins are recorded in memory and written in one bulk UPDATE instead of one
+#   UPDATE per login. The first buffered login arms a timer, so every buffered time is written
+#   within LAST_LOGIN_FLUSH_SECONDS even if no one else logs in (and at exit). A crash loses at
+#   most that window of timestamps. Password-reset tokens include last_login, so a login
+#   invalidates outstanding tokens when the timer fires rather than immediately.
+# - Sessions: sliding expiry re-saves an unmodified session at most every
+#   SESSION_REFRESH_SECONDS instead of on every request (SESSION_SAVE_EVERY_REQUEST).
+
+_pending_logins = {}
+_lock = threading.Lock()
+_timer = None
+
+
+def defer_last_login(sender, user, **kwargs):
+    """user_logged_in receiver replacing django.contrib.auth.models.update_last_login"""
+    global _timer
+    now = timezone.now()
+    user.last_login = now
+    with _lock:
+        _pending_logins[user.pk] = now
+        if _timer is None:
+            _timer = threading.Timer(settings.LAST_LOGIN_FLUSH_SECONDS, _flush_on_timer)
+            _timer.daemon = True
+            _timer.start()
+
+
+def _flush_on_timer():
+    try:
+        flush_last_logins()
+    except Exception as e:
+        print(f"Could not write buffered last_login times: {e}")
+    finally:
+        connections.close_all()  # this thread's connections
+
+
+def flush_last_logins():
+    """Write the buffered last_login times in bulk; returns how many users were updated"""
+    global _timer
+    with _lock:
+        pending = dict(_pending_logins)
+        _pending_logins.clear()
+        if _timer is not None:
+            _timer.cancel()  # a no-op when called from the timer itself
+            _timer = None
+    if not pending:
+        return 0
+    User = get_user_model()
+    User.objects.bulk_update(
+        [User(pk=user_id, last_login=logged_in_at) for user_id, logged_in_at in pending.items()],
+        ['last_login'], batch_size=500,
+    )
+    return len(pending)
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush_last_logins()
+    except Exception as e:
+        print(f"Could not write buffered last_login times: {e}")
+
+
+SESSION_REFRESHED_KEY = '_refreshed'
+
+
+class SessionMiddleware(DjangoSessionMiddleware):
+    """SessionMiddleware with sliding expiry that writes an unchanged session at most every SESSION_REFRESH_SECONDS"""
+
+    def process_response(self, request, response):
+        session = getattr(request, 'session', None)
+        if session is not None and session.accessed and not session.is_empty():
+            now = int(time.time())
+            # A modified session is saved anyway; stamping it too costs nothing
+            if session.modified or now - session.get(SESSION_REFRESHED_KEY, 0) >= settings.SESSION_REFRESH_SECONDS:
+                session[SESSION_REFRESHED_KEY] = now
+        return super().process_response(request, response)
@@ -1,17 +1,32 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, get_object_or_404, aget_object_or_404
 from django.contrib.auth.forms import AuthenticationForm
-from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth import login, logout
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.views import View
+from django.urls import reverse
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from django.templatetags.static import static
+import asyncio
+import hashlib
+import logging
 import json
 from .forms import CustomUserCreationForm, ProfileForm
-from .models import Profile, Category, SubCategory, Quiz, Question, QuizHistory, UserAnswer
+from .models import Profile, Category, SubCategory, Quiz, Question, QuizHistory, LiveSession
 from myapp.utils.gemini_helper import gemini_generator
+from myapp.utils import (
+    attempts, chat, explanations, live, metrics, prompts, question_bank, recommendations, reviews, topics, translations,
+    warmup,
+)
+from myapp.utils.avatars import schedule_avatar_processing
+from myapp.utils.ratelimit import rate_limit, too_many_requests, abudget_retry_after, llm_slots, ReleasingStream
+
+logger = logging.getLogger(__name__)
 
 # ---------------- Landing Page ----------------
 def landing_view(request):
@@ -23,18 +38,10 @@ def register_view(request):
         form = CustomUserCreationForm(request.POST)
         if form.is_valid():
             user = form.save()
-            authenticated_user = authenticate(
-                request,
-                username=form.cleaned_data["username"],
-                password=form.cleaned_data["password1"]
-            )
-            if authenticated_user is not None:
-                login(request, authenticated_user)
-                messages.success(request, "Registration successful!")
-                return redirect("home")
-            else:
-                messages.error(request, "Authentication failed. Please login.")
-                return redirect("login")
+            # The password was just set, so skip authenticate() and its second password hash
+            login(request, user, backend='django.contrib.auth.backends.ModelBackend')
+            messages.success(request, "Registration successful!")
+            return redirect("home")
         else:
             messages.error(request, "Please correct the errors below.")
     else:
@@ -45,14 +52,11 @@ def register_view(request):
 # ---------------- Login ----------------
 def login_view(request):
     if request.method == 'POST':
-        form = AuthenticationForm(data=request.POST)
+        form = AuthenticationForm(request, data=request.POST)
+        # is_valid() has already authenticated; doing it again would hash the password twice
         if form.is_valid():
-            username = form.cleaned_data.get('username')
-            password = form.cleaned_data.get('password')
-            user = authenticate(username=username, password=password)
-            if user is not None:
-                login(request, user)
-                return redirect('dashboard')
+            login(request, form.get_user())
+            return redirect('dashboard')
         messages.error(request, "Invalid username or password.")
     else:
         form = AuthenticationForm()
@@ -68,22 +72,26 @@ def logout_view(request):
 # ---------------- Dashboard ----------------
 @login_required
 def dashboard_view(request):
-    categories = Category.objects.all()
-    return render(request, 'dashboard.html', {'categories': categories})
+    next_quizzes, weak_topics = recommendations.for_user(request.user)
+    return render(request, 'dashboard.html', {
+        'next_quizzes': next_quizzes,
+        'weak_topics': weak_topics,
+        'reviews_due': reviews.due_count(request.user),
+    })
 
 # ---------------- Profile ----------------
 @login_required
 def profile_view(request):
     profile = request.user.profile
-    avatar_url = profile.avatar.url if profile.avatar else '/static/default-avatar.jpeg'
-    return render(request, 'profile.html', {'profile': profile, 'avatar_url': avatar_url})
+    return render(request, 'profile.html', {'profile': profile, 'avatar_url': profile.avatar_md_url})
 
 # ---------------- Edit Profile ----------------
 @login_required
 def edit_profile(request):
     profile = request.user.profile
-    avatar_url = profile.avatar.url if profile.avatar else '/static/default-avatar.jpeg'
+    avatar_url = profile.avatar_md_url
     if request.method == 'POST':
+        previous_avatar, previous_hash = profile.avatar.name, profile.avatar_hash
         form = ProfileForm(request.POST, request.FILES, instance=profile)
         if form.is_valid():
             profile_obj = form.save(commit=False)
@@ -92,6 +100,8 @@ def edit_profile(request):
                 request.user.username = username
                 request.user.save()
             profile_obj.save()
+            # Resizing, thumbnails and cleanup of the replaced files happen off the request thread
+            schedule_avatar_processing(profile_obj, previous_avatar, previous_hash)
             messages.success(request, "Profile updated successfully.")
             return redirect('profile')
     else:
@@ -102,65 +112,92 @@ def edit_profile(request):
 # ---------------- Quiz Selection ----------------
 @login_required
 def quiz_selection_view(request):
-    categories = Category.objects.prefetch_related('subcategories').all()
+    # Top-level topics from the in-memory tree; no queries once it is loaded
+    categories = [node for node in topics.get_tree().roots if node.category_id]
     return render(request, 'quiz_selection.html', {'categories': categories})
 
 # ---------------- Get Subcategories ----------------
 @login_required
 def get_subcategories(request, category_id):
-    subcategories = SubCategory.objects.filter(category_id=category_id).values('id', 'name')
-    return JsonResponse(list(subcategories), safe=False)
+    # Every topic below the category, at any depth, labelled with its path ("Physics › Optics")
+    tree = topics.get_tree()
+    root = tree.by_category.get(category_id)
+    if root is None:
+        return JsonResponse([], safe=False)
+    return JsonResponse([
+        {'id': node.subcategory_id, 'topic_id': node.id, 'name': tree.label(node.id, below=root.id), 'depth': node.depth}
+        for node in tree.subtree(root.id, include_self=False)
+    ], safe=False)
 
 # ---------------- Generate Quiz ----------------
+# Async so that a single ASGI worker can hold many in-flight Gemini calls.
+# Under ASGI, Django cancels the view task when the client disconnects; the
+# CancelledError propagates out of the Gemini await before anything is saved.
 @method_decorator(csrf_exempt, name='dispatch')
-@method_decorator(login_required, name='dispatch')
+@method_decorator(login_required, name='post')
+@method_decorator(rate_limit('generate_quiz'), name='post')
 class GenerateQuizView(View):
-    def post(self, request):
+    async def post(self, request):
+        retry_after = await abudget_retry_after()
+        if retry_after:
+            return too_many_requests("Daily AI generation budget exhausted.", retry_after)
+        slot = llm_slots.acquire()
+        if slot is None:
+            return too_many_requests("AI generation is busy, please retry shortly.", 5)
+
         try:
             data = json.loads(request.body)
             category_id = data.get('category_id')
             subcategory_id = data.get('subcategory_id')
+            topic_id = data.get('topic_id')
             difficulty = data.get('difficulty', 'M')
             num_questions = data.get('num_questions', 10)
-            
-            category = get_object_or_404(Category, id=category_id)
-            subcategory = get_object_or_404(SubCategory, id=subcategory_id)
-            
-            questions_data = gemini_generator.generate_quiz_questions(
+
+            user = await request.auser()
+            topic_label = None
+            if topic_id is not None:
+                # Any depth of the topic tree; the quiz is filed under the closest category/subcategory
+                topic_id = int(topic_id)
+                tree = await sync_to_async(topics.get_tree)()
+                if topic_id not in tree.by_id:
+                    return JsonResponse({'error': 'Unknown topic'}, status=404)
+                category_id, subcategory_id = tree.legacy_ids(topic_id)
+                if subcategory_id is None:
+                    return JsonResponse({'error': 'Pick a topic below a subcategory'}, status=400)
+                topic_label = tree.label(topic_id, below=tree.by_category[category_id].id)
+            category = await aget_object_or_404(Category, id=category_id)
+            subcategory = await aget_object_or_404(SubCategory, id=subcategory_id)
+            topic_label = topic_label or subcategory.name
+
+            questions_data = await gemini_generator.generate_quiz_questions_async(
                 category.name,
-                subcategory.name,
+                topic_label,
                 difficulty,
                 num_questions,
-                request.user
+                user,
+                category_id=category.id,
+                subcategory_id=subcategory.id
             )
-            
+
             if not questions_data:
                 return JsonResponse({'error': 'Failed to generate questions'}, status=500)
-            
-            quiz = Quiz.objects.create(
-                title=f"AI Generated Quiz - {subcategory.name}",
-                description=f"Automatically generated quiz about {subcategory.name}",
+
+            quiz = await Quiz.objects.acreate(
+                title=f"AI Generated Quiz - {topic_label}",
+                description=f"Automatically generated quiz about {topic_label}",
                 category=category,
                 subcategory=subcategory,
+                topic_id=topic_id,
                 difficulty=difficulty,
                 is_ai_generated=True
             )
-            
-            print(f"=== SAVING {len(questions_data)} QUESTIONS TO DATABASE ===")
+
             for i, q_data in enumerate(questions_data):
-                print(f"Processing question {i+1}:")
-                print(f"  Text: {q_data['text']}")
-                print(f"  Option1: '{q_data.get('option1', '')}'")
-                print(f"  Option2: '{q_data.get('option2', '')}'")
-                print(f"  Option3: '{q_data.get('option3', '')}'")
-                print(f"  Option4: '{q_data.get('option4', '')}'")
-                print(f"  Correct Answer: '{q_data.get('correct_answer', '')}'")
-                
-                # Check if any option is empty
                 if not all([q_data.get('option1'), q_data.get('option2'), q_data.get('option3'), q_data.get('option4')]):
-                    print(f"  WARNING: Some options are empty for question {i+1}")
-                
-                question = Question.objects.create(
+                    logger.warning("Generated question %d of quiz %d has empty options", i + 1, quiz.id)
+
+            await Question.objects.abulk_create([
+                Question(
                     quiz=quiz,
                     text=q_data['text'],
                     option1=q_data.get('option1', ''),
@@ -171,27 +208,23 @@ class GenerateQuizView(View):
                     difficulty=difficulty,
                     is_ai_generated=True
                 )
-                
-                print(f"  Saved with ID {question.id}")
-                print(f"  Database values after save:")
-                print(f"    Option1: '{question.option1}'")
-                print(f"    Option2: '{question.option2}'")
-                print(f"    Option3: '{question.option3}'")
-                print(f"    Option4: '{question.option4}'")
-                print(f"    Correct Answer: '{question.correct_answer}'")
-                print("-----")
-            
+                for q_data in questions_data
+            ])
+
             return JsonResponse({
                 'success': True,
                 'quiz_id': quiz.id,
                 'message': f'Generated {len(questions_data)} questions'
             })
-            
+
+        except asyncio.CancelledError:
+            logger.info("Quiz generation cancelled: client disconnected")
+            raise
         except Exception as e:
-            print(f"ERROR in GenerateQuizView: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Quiz generation failed")
             return JsonResponse({'error': str(e)}, status=500)
+        finally:
+            slot.release()
 
 # ---------------- Get Next Question ----------------
 @login_required
@@ -220,48 +253,65 @@ def get_next_question(request, quiz_history_id):
 # ---------------- Take Quiz ----------------
 @login_required
 def take_quiz_view(request, quiz_id):
-    quiz = get_object_or_404(Quiz, id=quiz_id)
-    questions_queryset = quiz.questions.all()  # Fetch questions
-    
-    # DEBUG: Print to terminal
-    print(f"=== LOADING QUIZ {quiz_id} ===")
-    print(f"Number of questions: {questions_queryset.count()}")
-    
-    if not questions_queryset.exists():
+    locale = translations.request_locale(request)
+    quiz = get_object_or_404(translations.with_translations(Quiz.objects.all(), locale), id=quiz_id)
+    # Reloading the page resumes the open attempt instead of starting another one
+    quiz_history, questions, _ = attempts.start_or_resume_attempt(request.user, quiz, locale)
+    translations.localize(quiz)
+
+    if quiz_history is None:
         messages.error(request, "This quiz has no questions.")
         return redirect('quiz_selection')
-    
-    quiz_history = QuizHistory.objects.create(
-        user=request.user,
-        quiz=quiz,
-        total_questions=questions_queryset.count(),
-        selected_difficulty=quiz.difficulty,
-        started_at=timezone.now()
-    )
-    
-    # Convert queryset to list to ensure it's evaluated
-    questions_list = list(questions_queryset)
-    
-    # Print the options for each question
-    for q in questions_list:
-        print(f"Question from DB - ID: {q.id}")
-        print(f"  Text: {q.text}")
-        print(f"  Option1: '{q.option1}'")
-        print(f"  Option2: '{q.option2}'")
-        print(f"  Option3: '{q.option3}'")
-        print(f"  Option4: '{q.option4}'")
-        print(f"  Correct Answer: '{q.correct_answer}'")
-        print("-----")
-    
-    print(f"=== PREPARED {len(questions_list)} QUESTIONS FOR TEMPLATE ===")
-    print(f"Number of questions: {questions_queryset.count()}")
+
     return render(request, 'take_quiz.html', {
         'quiz': quiz,
         'quiz_history_id': quiz_history.id,
         'time_limit': quiz.time_limit_minutes * 60,
-        'questions': questions_list  # Pass the list directly
+        'questions': questions,
+        # Answers already synced from another tab or device, restored into the page
+        'pending_answers': quiz_history.pending_answers or {},
     })
-   
+
+
+# ---------------- Health ----------------
+def health_view(request):
+    """Liveness: the process answers requests"""
+    return JsonResponse({'status': 'ok'}, headers={'Cache-Control': 'no-store'})
+
+
+def ready_view(request):
+    """Readiness: 200 once the deploy warm-up has finished (see myapp.utils.warmup), 503 until then"""
+    state, results = warmup.status()
+    if state in (warmup.IDLE, warmup.FAILED):
+        # Not warmed by the server's startup hook (runserver), or the database was down: (re)try
+        warmup.reset()
+        warmup.start_background()
+    return JsonResponse({
+        'status': state,
+        'stages': [
+            {'name': result.name, 'ms': round(result.seconds * 1000), 'error': result.error} for result in results
+        ],
+    }, status=200 if state == warmup.READY else 503, headers={'Cache-Control': 'no-store'})
+
+
+# ---------------- Service Worker ----------------
+SERVICE_WORKER_ASSETS = ['myapp/js/take_quiz.js', 'myapp/css/take_quiz.css', 'myapp/css/base.css']
+
+
+def service_worker(request):
+    """Served from the site root so it can cache quiz pages for offline reloads"""
+    precache = [static(name) for name in SERVICE_WORKER_ASSETS]
+    # Hashed static URLs change with their content, and with them the cache name
+    version = hashlib.sha256('\n'.join(precache).encode()).hexdigest()[:12]
+    response = render(request, 'service_worker.js', {
+        'precache': json.dumps(precache),
+        'version': version,
+        'static_prefix': static(''),
+    }, content_type='application/javascript')
+    response['Service-Worker-Allowed'] = '/'
+    response['Cache-Control'] = 'no-cache'
+    return response
+
 
 # ---------------- Submit Quiz ----------------
 @csrf_exempt
@@ -286,34 +336,14 @@ def submit_quiz_view(request):
             time_taken = data.get('time_taken', 0)
 
             quiz_history = get_object_or_404(QuizHistory, id=quiz_history_id, user=request.user)
-            correct_answers = 0
-
-            for question_id, answer_data in answers.items():
-                question = get_object_or_404(Question, id=question_id)
-                selected_option = answer_data.get('selected_option')
-                is_correct = selected_option == question.correct_answer
-                if is_correct:
-                    correct_answers += 1
-                UserAnswer.objects.create(
-                    history=quiz_history,
-                    question=question,
-                    selected_option=selected_option,
-                    is_correct=is_correct,
-                    time_taken=answer_data.get('time_taken', 0)
-                )
-
-            quiz_history.correct_answers = correct_answers
-            quiz_history.score = (correct_answers / quiz_history.total_questions) * 100 if quiz_history.total_questions > 0 else 0
-            quiz_history.completed_at = timezone.now()
-            quiz_history.save()
+            # A repeated submit (double click, retry) keeps the first grading
+            attempts.grade_attempt(quiz_history, answers)
 
             # ✅ Instead of returning JSON, redirect to results page
             return redirect('quiz_results', quiz_history_id=quiz_history.id)
 
         except Exception as e:
-            print("Error in submit_quiz_view:", e)
-            import traceback
-            traceback.print_exc()
+            logger.exception("Quiz submission failed")
             return JsonResponse({'error': str(e)}, status=500)
 
     return JsonResponse({'error': 'Invalid request method'}, status=400)
@@ -321,17 +351,99 @@ def submit_quiz_view(request):
 @login_required
 def quiz_results_view(request, quiz_history_id):
     quiz_history = get_object_or_404(QuizHistory, id=quiz_history_id, user=request.user)
-    user_answers = quiz_history.user_answers.select_related('question')
-    
+    # Written at grading, so results are one row read plus the cached explanations of missed questions
+    snapshot = attempts.result_snapshot(quiz_history) or {'questions': []}
+    results = translations.localize_snapshot(quiz_history, snapshot, translations.request_locale(request))['questions']
+    explained = explanations.explanations_for([row['id'] for row in results if not row['is_correct']])
+    for row in results:
+        row['explanation'] = explained.get(row['id'], '')
+
     return render(request, 'quiz_results.html', {
         'quiz_history': quiz_history,
-        'user_answers': user_answers
+        'results': results
+    })
+
+# ---------------- Review ----------------
+@login_required
+def review_view(request):
+    questions = reviews.build_review(request.user, locale=translations.request_locale(request))
+    if not questions:
+        messages.info(request, "No questions are due for review. Come back later!")
+        return redirect('dashboard')
+    for question in questions:
+        question.shown_options = question_bank.shown_options(question, question_bank.IDENTITY_ORDER)
+
+    return render(request, 'take_quiz.html', {
+        'quiz': {'title': "Daily Review", 'description': "Questions you are due to revisit.",
+                 'get_difficulty_display': "Mixed"},
+        'questions': questions,
+        'form_action': reverse('submit_review'),
     })
 
+@login_required
+def submit_review_view(request):
+    if request.method != 'POST':
+        return redirect('review')
+    try:
+        answers = json.loads(request.POST.get('answers') or '{}')
+        answers = {int(question_id): data.get('selected_option') for question_id, data in answers.items()}
+    except (ValueError, AttributeError):
+        messages.error(request, "Could not read your answers.")
+        return redirect('dashboard')
+
+    # Only questions the user already has in review can be reviewed
+    correct_options = dict(
+        Question.objects.filter(id__in=answers, review_states__user=request.user).values_list('id', 'correct_answer')
+    )
+    graded = [(question_id, answers[question_id] == correct, 0) for question_id, correct in correct_options.items()]
+    reviews.record_answers(request.user.id, graded)
+
+    correct = sum(1 for _, is_correct, _ in graded if is_correct)
+    messages.success(request, f"Review complete: {correct}/{len(graded)} correct.")
+    return redirect('dashboard')
+
+# ---------------- Live Sessions ----------------
+@login_required
+def live_join_view(request):
+    code = request.GET.get('code', '').strip().upper()
+    if code:
+        if LiveSession.objects.filter(code=code).exclude(status=LiveSession.STATUS_FINISHED).exists():
+            return redirect('live_play', code=code)
+        messages.error(request, "No open live session has that code.")
+    recent_quizzes = (
+        Quiz.objects.filter(quiz_histories__user=request.user).distinct()
+        .only('id', 'title', 'difficulty').order_by('-id')[:10]
+    )
+    return render(request, 'live_join.html', {'recent_quizzes': recent_quizzes})
+
+@login_required
+def live_create_view(request, quiz_id):
+    if request.method != 'POST':
+        return redirect('live_join')
+    quiz = get_object_or_404(Quiz, pk=quiz_id)
+    live_session = live.create_session(quiz, request.user)
+    return redirect('live_host', code=live_session.code)
+
+def _live_session_page(request, code, is_host):
+    live_session = get_object_or_404(
+        LiveSession.objects.select_related('quiz').exclude(status=LiveSession.STATUS_FINISHED), code=code,
+    )
+    if is_host and live_session.host_id != request.user.id:
+        return redirect('live_play', code=code)
+    return render(request, 'live_session.html', {'live_session': live_session, 'is_host': is_host})
+
+@login_required
+def live_host_view(request, code):
+    return _live_session_page(request, code, is_host=True)
+
+@login_required
+def live_play_view(request, code):
+    return _live_session_page(request, code, is_host=False)
+
 # ---------------- Quiz History ----------------
 @login_required
 def quiz_history_view(request):
-    quiz_histories = QuizHistory.objects.filter(user=request.user).select_related('quiz').order_by('-created_at')
+    quiz_histories = QuizHistory.objects.filter(user=request.user).select_related('quiz').defer('result_snapshot').order_by('-created_at')
     return render(request, 'quiz_history.html', {'quiz_histories': quiz_histories})
 
 # ---------------- Home ----------------
@@ -339,29 +451,75 @@ def quiz_history_view(request):
 def home_view(request):
     return render(request, 'home.html')
 
+# ---------------- Metrics ----------------
+@staff_member_required
+def metrics_view(request):
+    data = metrics.snapshot()
+    data['gemini_breaker'] = gemini_generator.breaker.snapshot()
+    data['llm_slots_in_use'] = llm_slots.active
+    return JsonResponse(data)
+
 # ---------------- Chatbot API ----------------
+# Replies are streamed as plain text chunks; the session id is returned in the
+# X-Chat-Session header so the client can continue the same conversation.
 @csrf_exempt
 @login_required
-def chatbot_response(request):
+@rate_limit('chatbot')
+async def chatbot_response(request):
     if request.method == "POST":
         try:
             data = json.loads(request.body)
             user_message = data.get("message", "").strip()
+        except Exception:
+            logger.warning("Chatbot request with an unreadable body", exc_info=True)
+            return JsonResponse({"reply": "⚠️ Something went wrong on the server."}, status=500)
 
-            if not user_message:
-                return JsonResponse({"reply": "⚠️ Please type something."})
-
-            # Use gemini_generator (your helper) to get a response
-            bot_reply = gemini_generator.generate_chat_response(user_message, request.user)
+        if not user_message:
+            return JsonResponse({"reply": "⚠️ Please type something."})
 
-            # Fallback if bot gives empty
-            if not bot_reply:
-                bot_reply = "🤖 Sorry, I couldn’t generate a response right now."
+        retry_after = await abudget_retry_after()
+        if retry_after:
+            return too_many_requests("Daily AI budget exhausted, the assistant is back tomorrow.", retry_after)
+        slot = llm_slots.acquire()
+        if slot is None:
+            return too_many_requests("The assistant is busy, please retry shortly.", 5)
 
-            return JsonResponse({"reply": bot_reply})
+        try:
+            user = await request.auser()
+            session = await chat.get_or_create_session(user, data.get("session_id"))
+            await chat.add_message(session, 'user', user_message)
+            window = await chat.load_window(session)
+            activity_summary = await chat.get_activity_summary(user)
+            system_prompt = await prompts.aselect('chat_system', key=user.id)
+            contents = chat.build_contents(session, window, activity_summary, system_prompt)
 
-        except Exception as e:
-            print("Chatbot error:", e)
+        except Exception:
+            slot.release()
+            logger.exception("Chatbot request failed")
             return JsonResponse({"reply": "⚠️ Something went wrong on the server."}, status=500)
 
+        # The slot stays held until the streamed reply finishes or the response is closed
+        response = StreamingHttpResponse(
+            ReleasingStream(_stream_chat_reply(session, contents, window, system_prompt.id), slot),
+            content_type="text/plain; charset=utf-8"
+        )
+        response["X-Chat-Session"] = str(session.id)
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
     return JsonResponse({"reply": "Invalid request method."}, status=405)
+
+
+async def _stream_chat_reply(session, contents, window, prompt_template_id):
+    chunks = []
+    try:
+        async for chunk in gemini_generator.stream_chat_response(contents, session.user_id, prompt_template_id):
+            chunks.append(chunk)
+            yield chunk
+    except asyncio.CancelledError:
+        logger.info("Chatbot stream cancelled: client disconnected")
+        raise
+
+    await chat.add_message(session, 'model', "".join(chunks))
+    await sync_to_async(chat.summarize_in_background)(session, window, gemini_generator)
@@ -0,0 +1,57 @@
+import re
+from http.cookies import SimpleCookie
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import aget_user
+
+from .models import LiveSession
+from myapp.utils import live
+
+# WebSocket endpoint for live sessions, a plain ASGI app that quizgen/asgi.py routes
+# "websocket" connections to. Users are authenticated from the Django session cookie;
+# the Origin check stands in for CSRF protection, which does not cover WebSockets.
+
+LIVE_PATH = re.compile(r'/ws/live/(?P<code>[A-Z0-9]{4,8})/')
+
+
+def _headers(scope):
+    return {name.decode('latin1'): value.decode('latin1') for name, value in scope.get('headers', ())}
+
+
+def _same_origin(headers):
+    origin = headers.get('origin')
+    return origin is not None and urlsplit(origin).netloc == headers.get('host')
+
+
+async def _authenticate(headers):
+    """The user owning the connection's session cookie (AnonymousUser if none)"""
+    cookie = SimpleCookie(headers.get('cookie', ''))
+    morsel = cookie.get(settings.SESSION_COOKIE_NAME)
+    session = import_module(settings.SESSION_ENGINE).SessionStore(morsel.value if morsel else None)
+    return await aget_user(SimpleNamespace(session=session))
+
+
+async def websocket_application(scope, receive, send):
+    event = await receive()
+    if event['type'] != 'websocket.connect':
+        return
+    match = LIVE_PATH.fullmatch(scope['path'])
+    headers = _headers(scope)
+    live_session = user = None
+    if match and _same_origin(headers):
+        user = await _authenticate(headers)
+        if user.is_authenticated:
+            live_session = await (
+                LiveSession.objects.select_related('quiz')
+                .exclude(status=LiveSession.STATUS_FINISHED)
+                .filter(code=match['code'])
+                .afirst()
+            )
+    if live_session is None:
+        await send({'type': 'websocket.close', 'code': 4403})
+        return
+    await send({'type': 'websocket.accept'})
+    await live.serve(live_session, user, receive, send)
@@ -2,6 +2,8 @@
 ASGI config for quizgen project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django; WebSocket connections (live sessions) go to myapp.websocket.
+Lifespan startup runs the deploy warm-up, so the server takes traffic only once it is done.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,30 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quizgen.settings')
 
-application = get_asgi_application()
+# Set up Django before importing anything that touches models
+django_application = get_asgi_application()
+
+from asgiref.sync import sync_to_async  # noqa: E402
+
+from myapp.utils import warmup  # noqa: E402
+from myapp.websocket import websocket_application  # noqa: E402
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await sync_to_async(warmup.run_on_startup, thread_sensitive=False)()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        await websocket_application(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    else:
+        await django_application(scope, receive, send)
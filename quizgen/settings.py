@@ -31,7 +31,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'myapp.utils.static_assets.StaticFilesMiddleware',  # serves collected STATIC_ROOT files
+    'myapp.utils.writes.SessionMiddleware',  # sessions with throttled sliding-expiry writes
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -84,12 +85,77 @@ USE_TZ = True
 # Static files
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / "static"]
+STATIC_ROOT = BASE_DIR / 'staticfiles'  # populated by `manage.py collectstatic`
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    # Content-hashed file names plus .gz (and .br with the brotli package) variants
+    'staticfiles': {'BACKEND': 'myapp.utils.static_assets.CompressedManifestStaticFilesStorage'},
+}
+STATIC_MAX_AGE = 60  # seconds; names without a content hash
+STATIC_COMPRESS_MIN_BYTES = 256
+
+
+# JSON quiz API (myapp/api.py)
+API_PAGE_SIZE = 10  # questions per page
+API_MAX_PAGE_SIZE = 50
+
+
+# Quiz attempts
+ATTEMPT_ABANDON_HOURS = 24  # unsubmitted attempts older than this are not resumed and get swept
+ATTEMPT_SYNC_MAX_ANSWERS = 500  # answers accepted in one sync batch (api/v1/attempts/<id>/sync/)
+ATTEMPT_SYNC_MAX_BYTES = 256 * 1024  # sync body size limit, after gzip decoding
+
+# Answer explanations on results pages (myapp/utils/explanations.py)
+QUESTION_EXPLANATIONS = True  # generate an AI explanation for questions answered wrong, once per question
+EXPLANATION_RETRY_MINUTES = 30  # failed or lost generations become claimable again after this long
+
+
+# Spaced-repetition reviews (myapp/utils/reviews.py)
+REVIEW_QUIZ_SIZE = 10  # questions per review session
+REVIEW_FAST_SECONDS = 10  # correct answers at least this fast count as easy
+REVIEW_SLOW_SECONDS = 40  # correct answers this slow count as hard
+REVIEW_MAX_INTERVAL_DAYS = 365  # cap, so repeated correct answers cannot push due dates out of range
 
 # Media files (user uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 
+# Avatar processing
+AVATAR_MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+AVATAR_MAX_SOURCE_PIXELS = 40_000_000  # reject decompression bombs before decoding
+AVATAR_MAX_DIMENSION = 512  # full-size avatar is downsized to fit this box
+AVATAR_THUMBNAIL_SIZES = {'sm': 64, 'md': 160}  # square crops, in pixels
+AVATAR_FORMAT = 'WEBP'  # falls back to JPEG if Pillow lacks WebP support
+AVATAR_PROTECTED_FILES = ['avatars/logo.png', 'avatars/robot.jpg']  # site images that live under media/avatars/
+
+
+# Background jobs (in-process thread pool)
+BACKGROUND_WORKERS = 2
+BACKGROUND_TASKS_EAGER = False  # run jobs inline after commit, e.g. for debugging
+
+# Admin changelists over large tables (myapp/utils/pagination.py)
+ADMIN_EXACT_COUNT_LIMIT = 10_000  # filtered lists stop counting here; unfiltered lists use a table estimate above it
+
+# Recommendations (myapp/utils/recommendations.py, manage.py build_recommendations)
+RECOMMEND_TOP_K = 5  # suggestions of each kind kept per user
+RECOMMEND_HISTORY = 50  # most recent quizzes per user that count towards quiz similarity
+RECOMMEND_WEAK_SCORE = 70  # subcategories averaging below this (%) are weak topics
+RECOMMEND_DENSE_MAX_QUIZZES = 4000  # with numpy installed, score with dense matrices up to this many quizzes
+
+# Attempt archival (myapp/utils/archive.py, manage.py archive_attempts)
+ARCHIVE_AFTER_DAYS = 180  # completed attempts older than this get their answer rows packed into one row
+ARCHIVE_BATCH_SIZE = 500  # attempts per transaction
+
+# Live sessions (myapp/utils/live.py, served by quizgen/asgi.py)
+LIVE_PUBSUB_BACKEND = 'myapp.utils.pubsub.InMemoryBroker'  # single process; swap for a shared-bus broker across nodes
+LIVE_SEND_QUEUE_SIZE = 64  # messages buffered per socket before a slow client is disconnected
+LIVE_ACTION_QUEUE_SIZE = 10_000  # joins/answers buffered for a session's runner
+LIVE_LEADERBOARD_SECONDS = 1  # leaderboard broadcasts at most this often
+LIVE_LEADERBOARD_SIZE = 10
+LIVE_IDLE_SECONDS = 3600  # a session with no activity for this long is ended and saved
+
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -112,6 +178,44 @@ if not GEMINI_API_KEY:
     print("Warning: GEMINI_API_KEY not found in environment variables")
 
 
+# Gemini client resilience
+GEMINI_TIMEOUT_SECONDS = 60  # hard deadline per call
+GEMINI_BREAKER_FAILURES = 5  # consecutive failures/timeouts that open the circuit
+GEMINI_BREAKER_RESET_SECONDS = 30  # how long the circuit stays open before a trial call
+GEMINI_HEDGE_REQUESTS = False  # send a second request after the p95 latency and take the first success
+GEMINI_HEDGE_MIN_DELAY_SECONDS = 5  # hedge delay floor, also used until enough latencies are observed
+
+# Prompt registry (myapp/utils/prompts.py)
+PROMPT_CACHE_SECONDS = 60  # how long a process reuses the active variants of a prompt
+
+
+# Chatbot memory
+CHAT_CONTEXT_TOKENS = 1500  # token budget for recent turns sent with each message
+CHAT_SUMMARY_BATCH = 10  # fold older turns into the session summary once this many fall outside the window
+
+
+# Rate limiting: (requests per minute, burst) per user for each endpoint scope.
+# With the 'local' backend each worker process keeps its own buckets, so a user gets up to
+# N times these limits across N processes. 'cache' shares the buckets through
+# CACHES['default'], which must then be a shared cache (Redis, Memcached or the database
+# cache); no CACHES is configured here, and the per-process LocMem default is refused.
+RATE_LIMIT_BACKEND = 'local'  # 'local' (per process) or 'cache' (shared, see above)
+RATE_LIMITS = {
+    'generate_quiz': (5, 3),
+    'chatbot': (20, 5),
+}
+
+
+# LLM capacity and daily budget (None disables a limit)
+LLM_MAX_CONCURRENCY_PER_PROCESS = 32  # in-flight Gemini calls per worker process; the site-wide cap is this times the workers
+LLM_DAILY_TOKEN_BUDGET = 2_000_000
+LLM_DAILY_COST_BUDGET = 25.0  # USD
+LLM_INPUT_COST_PER_1K_TOKENS = 0.00125  # gemini-2.5-pro pricing, USD
+LLM_OUTPUT_COST_PER_1K_TOKENS = 0.01
+LLM_BUDGET_CACHE_SECONDS = 30  # how long today's usage total is reused before re-aggregating
+AI_LOG_RETENTION_DAYS = 30  # raw AIGenerationLog rows older than this are deleted by `rollup_ai_logs`
+
+
 # Login/Logout URLs
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
@@ -124,7 +228,56 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # Session settings
 SESSION_COOKIE_AGE = 1209600  # 2 weeks in seconds
-SESSION_SAVE_EVERY_REQUEST = True
+SESSION_SAVE_EVERY_REQUEST = False  # sliding expiry is handled by myapp.utils.writes.SessionMiddleware
+SESSION_REFRESH_SECONDS = 300  # re-save (and so extend) an unmodified session at most this often
+
+# Write coalescing (myapp/utils/writes.py)
+LAST_LOGIN_DEFERRED = True  # buffer last_login and write it in batches instead of once per login
+LAST_LOGIN_FLUSH_SECONDS = 60  # longest a login waits in the buffer; a timer writes it then
+
+# Deploy warm-up and readiness (myapp/utils/warmup.py)
+WARMUP_ON_STARTUP = True  # warm up in the WSGI/ASGI startup, before the worker takes traffic
+WARMUP_POPULAR_QUIZZES = 50  # preload this many of the most-played quizzes
+WARMUP_RECENT_ATTEMPTS = 5000  # ...counted over this many latest attempts
+
+# Analytics export (myapp/utils/exports.py, `export_attempts`)
+EXPORT_DIR = BASE_DIR / 'exports'
+EXPORT_CHUNK_SIZE = 50000  # rows read and written per file
+EXPORT_SAFETY_LAG_SECONDS = 60  # only export rows at least this old, so in-flight transactions are not skipped
+
+# Quiz content translation (myapp/utils/translations.py, `translate_content`)
+QUIZ_SOURCE_LOCALE = 'en'  # the language quizzes are generated and written in
+QUIZ_LOCALES = {  # languages users can pick on their profile
+    'en': 'English',
+    'es': 'Español',
+    'fr': 'Français',
+    'de': 'Deutsch',
+    'hi': 'हिन्दी',
+}
+TRANSLATION_BATCH_SIZE = 20  # questions per Gemini call
+
+# Topic tree (myapp/utils/topics.py)
+TOPIC_TREE_MAX_AGE = 300  # seconds a process keeps its in-memory tree without seeing a version bump
+
+# Query-plan checks in tests (myapp/utils/query_audit.py)
+QUERY_AUDIT_LARGE_MODELS = [  # full scans of these tables fail the plan tests
+    'myapp.QuizHistory', 'myapp.UserAnswer', 'myapp.Question', 'myapp.Quiz', 'myapp.ReviewState',
+    'myapp.AIGenerationLog', 'myapp.ChatMessage', 'myapp.QuizRecommendation', 'myapp.ArchivedAttempt',
+    'sessions.Session',
+]
+
+
+# Logging: myapp.* loggers (views' errors and cancellations) go to the console
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'myapp': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
 
 
 # Security settings for production (commented out for development)
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'quizgen.settings')
 
 application = get_wsgi_application()
+
+# Warm caches and connections before this worker serves its first request
+from myapp.utils import warmup  # noqa: E402
+
+warmup.run_on_startup()